@@ -0,0 +1,236 @@
+"""
+Ads Library network capture: full ad records from the page's own GraphQL
+responses, read through the Chrome DevTools Protocol performance log.
+"""
+import base64
+import datetime
+import json
+
+# Responses whose URL contains one of these are parsed for ads
+CAPTURE_URL_PATTERNS = ("/api/graphql",)
+
+# Chrome capability that makes Network.* events show up in driver.get_log("performance")
+PERFORMANCE_LOGGING_CAPABILITY = ("goog:loggingPrefs", {"performance": "ALL"})
+
+# Prefix Facebook puts in front of some JSON responses
+_JSON_GUARD = "for (;;);"
+
+# JS snippet returning the JSON payloads embedded in the page (first results page)
+embedded_payloads_script = """
+    let payloads = [];
+    for (let script of document.querySelectorAll('script[type="application/json"]')) {
+        if (script.textContent.includes('ad_archive_id')) payloads.push(script.textContent);
+    }
+    return payloads;
+"""
+
+
+def parse_payload(text):
+    """Parses a response body that holds one JSON document or one per line."""
+    text = (text or "").strip()
+    if text.startswith(_JSON_GUARD):
+        text = text[len(_JSON_GUARD):]
+    try:
+        return [json.loads(text)]
+    except ValueError:
+        pass
+    documents = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            documents.append(json.loads(line))
+        except ValueError:
+            continue
+    return documents
+
+
+def iter_ad_nodes(document):
+    """Yields every dict carrying an ad_archive_id, however deep it is nested."""
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if "ad_archive_id" in node:
+                yield node
+                continue
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def _format_start_date(value):
+    """Epoch seconds -> 'Dec 12, 2024', the text the page shows after 'Started running on'."""
+    try:
+        day = datetime.datetime.fromtimestamp(int(value), tz=datetime.timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return "N/A"
+    return f"{day:%b} {day.day}, {day.year}"
+
+
+def _first(items, *keys):
+    for item in items or []:
+        for key in keys:
+            if item.get(key):
+                return item[key]
+    return ""
+
+
+def ad_to_record(node):
+    """Scraper record (SCRAPED_FIELDNAMES) for one captured ad."""
+    return {
+        "libraryID": str(node.get("ad_archive_id")),
+        "startDate": _format_start_date(node.get("start_date")),
+        "Duplicates": int(node.get("collation_count") or 0),
+    }
+
+
+def ad_to_detail(node):
+    """Detail dict shaped like a getAdDetailsVirginia item, for the detail cache."""
+    snapshot = node.get("snapshot") or {}
+    cards = snapshot.get("cards") or []
+    videos = (snapshot.get("videos") or []) + cards
+    images = (snapshot.get("images") or []) + cards
+
+    creative = (
+        _first(videos, "video_hd_url", "video_sd_url")
+        or _first(images, "original_image_url", "resized_image_url")
+    )
+    preview = (
+        _first(videos, "video_preview_image_url")
+        or _first(images, "resized_image_url", "original_image_url")
+    )
+    body = snapshot.get("body") or {}
+    if isinstance(body, dict):
+        body = body.get("text") or (body.get("markup") or {}).get("__html") or ""
+
+    return {
+        "LibraryID": str(node.get("ad_archive_id")),
+        "link_url": snapshot.get("link_url") or _first(cards, "link_url"),
+        "cta_text": snapshot.get("cta_text") or "",
+        "cta_type": snapshot.get("cta_type") or "",
+        "__html": body,
+        "page_profile_uri": snapshot.get("page_profile_uri") or "",
+        "URLCreative": creative,
+        "url_preview_creative": preview,
+        "AdCreative": creative,
+        "profilePict": snapshot.get("page_profile_picture_url") or "",
+        "page_profile_picture_url": snapshot.get("page_profile_picture_url") or "",
+        "Active": bool(node.get("is_active")),
+        "pageName": node.get("page_name") or snapshot.get("page_name") or "",
+        "pageID": str(node.get("page_id") or snapshot.get("page_id") or ""),
+        "title": snapshot.get("title") or _first(cards, "title"),
+    }
+
+
+class AdsNetworkCapture:
+    """
+    Collects ads from the Ads Library's result payloads as they arrive.
+
+    The driver must be created with PERFORMANCE_LOGGING_CAPABILITY. Every
+    `poll` drains the performance log, fetches the bodies of finished
+    responses matching CAPTURE_URL_PATTERNS through Network.getResponseBody
+    and parses the ads out of them. `scan_page` does the same for the
+    payloads embedded in the HTML. Ads are kept in first-seen order and
+    de-duplicated by LibraryID.
+    """
+
+    def __init__(self, driver, url_patterns=CAPTURE_URL_PATTERNS):
+        self.driver = driver
+        self.url_patterns = tuple(url_patterns)
+        self.responses = 0
+        self.failed_bodies = 0
+        self._nodes = {}
+        self._pending = set()
+
+    def start(self):
+        """Drops log entries from earlier pages; call before navigating."""
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.get_log("performance")
+        except Exception as e:
+            print(f"Network capture unavailable: {e}")
+            return False
+        return True
+
+    def _add_document(self, document):
+        for node in iter_ad_nodes(document):
+            library_id = str(node.get("ad_archive_id") or "")
+            if library_id and library_id not in self._nodes:
+                self._nodes[library_id] = node
+
+    def _add_text(self, text):
+        for document in parse_payload(text):
+            self._add_document(document)
+
+    def scan_page(self):
+        """Parses the result payloads embedded in the current page."""
+        try:
+            for text in self.driver.execute_script(embedded_payloads_script) or []:
+                self._add_text(text)
+        except Exception as e:
+            print(f"Could not read embedded payloads: {e}")
+        return len(self._nodes)
+
+    def poll(self):
+        """Reads new network events; returns the number of ads captured so far."""
+        try:
+            entries = self.driver.get_log("performance")
+        except Exception as e:
+            print(f"Could not read performance log: {e}")
+            return len(self._nodes)
+
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            method = message.get("method")
+            params = message.get("params") or {}
+
+            if method == "Network.responseReceived":
+                url = (params.get("response") or {}).get("url", "")
+                if any(pattern in url for pattern in self.url_patterns):
+                    self._pending.add(params.get("requestId"))
+            elif method == "Network.loadingFinished" and params.get("requestId") in self._pending:
+                request_id = params["requestId"]
+                self._pending.discard(request_id)
+                self._read_body(request_id)
+            elif method == "Network.loadingFailed":
+                self._pending.discard(params.get("requestId"))
+
+        return len(self._nodes)
+
+    def _read_body(self, request_id):
+        try:
+            result = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        except Exception:
+            # Body already evicted by Chrome, or not a text response
+            self.failed_bodies += 1
+            return
+        body = result.get("body", "")
+        if result.get("base64Encoded"):
+            body = base64.b64decode(body).decode("utf-8", errors="replace")
+        self.responses += 1
+        self._add_text(body)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def library_ids(self):
+        return list(self._nodes)
+
+    def records(self, limit=None):
+        nodes = list(self._nodes.values())[:limit]
+        return [ad_to_record(node) for node in nodes]
+
+    def details(self, limit=None):
+        nodes = list(self._nodes.values())[:limit]
+        return {str(node.get("ad_archive_id")): ad_to_detail(node) for node in nodes}
+
+    def stats_line(self):
+        return (
+            f"Network capture: {len(self._nodes)} ads from {self.responses} responses"
+            f" ({self.failed_bodies} bodies unavailable)"
+        )
@@ -1,17 +1,57 @@
-import csv
 import requests
 import time
 import os
 import re
 from datetime import datetime
 import math
+from collections import deque
+
+import metrics
+from record_stream import iter_csv, chunked, tee_to_csv
+from detail_fetcher import DetailFetcher
+from http_client import DEFAULT_TIMEOUT
+from rate_limiter import get_limiter, request_with_retry
+from media_uploader import MediaUploader, OrderedUploadWriter
+from ttl_cache import PersistentTTLCache, CACHE_DIR
+from tech_cache import CachedTechnologyDetector
+from media_manifest import MediaManifest, MANIFEST_FILE
+from known_ids import KnownIdIndex, KNOWN_IDS_FILE
+from run_journal import RunJournal, batch_key
+from durable_writer import recover, rejournal
+from insertProcessedCsv import get_db_pool
+from schema import PROCESSED_FIELDNAMES
 
 # --- CONFIGURATION ---
 API_URL = "https://lylfy0m6gg.execute-api.us-east-1.amazonaws.com/testVirginiaUno/getAdDetailsVirginia"
+# Maximum concurrent requests to API_URL
+API_CONCURRENCY = 8
+# Requests/sec to API_URL: starting rate and ceiling (the limiter adapts in between)
+API_RATE = 10.0
+API_MAX_RATE = 40.0
+
+# On-disk cache of API_URL responses keyed by LibraryID (None disables it)
+DETAIL_CACHE_FILE = CACHE_DIR / "ad_details.sqlite3"
+DETAIL_CACHE_TTL = 24 * 3600  # seconds
+DETAIL_CACHE_MAX_ENTRIES = 200_000
+
+# Cross-run cache of detected technologies keyed by landing host/path (None disables it)
+TECH_CACHE_FILE = CACHE_DIR / "tech_detection.sqlite3"
+TECH_CACHE_TTL = 7 * 24 * 3600  # seconds
+TECH_CACHE_MAX_ENTRIES = 50_000
+# Detect each landing page (host + path, see tech_cache) once per batch instead of once per row
+TECH_GROUP_BY_DOMAIN = True
 
 # [IMPORTANT] REPLACE THIS WITH YOUR ACTUAL CLOUD FUNCTION URL
 # The provided JS file imported this from a constants file, so the value wasn't visible.
 CLOUD_FUNCTION_URL = "https://vsyvz3xevj.execute-api.us-east-1.amazonaws.com/GuardarEnBucket/GuardarAS3"
+# Maximum concurrent uploads to CLOUD_FUNCTION_URL
+UPLOAD_WORKERS = 8
+# Uploads/sec to CLOUD_FUNCTION_URL: starting rate and ceiling (above what
+# UPLOAD_WORKERS reach on their own, so only throttling slows them down)
+UPLOAD_RATE = 20.0
+UPLOAD_MAX_RATE = 40.0
+# Manifest of creatives already in S3, reused instead of re-uploading (None disables it)
+UPLOAD_MANIFEST_FILE = MANIFEST_FILE
 
 # Target technologies we want to track (case-insensitive matching)
 TARGET_TECHNOLOGIES = [
@@ -19,6 +59,10 @@ TARGET_TECHNOLOGIES = [
     "vturb", "pandavideo", "vidalytics", "atomicat", "vimeo", "youtube", "digistore24"
 ] 
 
+# Snapshot of adsdomains.LibraryID; known ads are dropped before any network work (None disables it)
+KNOWN_IDS_SNAPSHOT_FILE = KNOWN_IDS_FILE
+KNOWN_IDS_REFRESH_INTERVAL = 15 * 60  # seconds
+
 # --- TECHNOLOGY DETECTOR IMPORT ---
 # Trying to import as requested. If the file is missing, the script will warn you.
 try:
@@ -30,6 +74,9 @@ except Exception:
         print("Warning: 'tech_detector_new.py' not found. Using Mock Detector for demonstration.")
 
         class MockTechnologyDetector:
+            # Placeholder output must not end up in the persistent tech cache
+            persist_results = False
+
             def detect_technologies(self, url):
                 return ["Unknown-Tech"]
 
@@ -60,12 +107,14 @@ def is_detectable_tech(url):
             return False
     return True
 
-def upload_media_with_cloud_function(url_src, file_type="video", file_name="media"):
+def upload_media_with_cloud_function(url_src, file_type="video", file_name="media", session=None):
     """
     Refactored to mimic JS UploadMediaWhitCloudFunction logic:
     - Uses HTTP GET
     - Constructs query params for filename and URLCreative
     - Returns s3_url from response
+    Pass a pooled `session` to reuse connections across uploads.
+    Uploads are paced and retried on throttling (see rate_limiter).
     """
     if not url_src:
         return None
@@ -79,7 +128,8 @@ def upload_media_with_cloud_function(url_src, file_type="video", file_name="medi
         endpoint = f"{CLOUD_FUNCTION_URL}?filename={file_name_param}&URLCreative={url_creative_param}"
 
         headers = {'Content-Type': 'application/json'}
-        response = requests.get(endpoint, headers=headers)
+        limiter = get_limiter(CLOUD_FUNCTION_URL, rate=UPLOAD_RATE, max_rate=UPLOAD_MAX_RATE)
+        response = request_with_retry(session or requests, endpoint, limiter, headers=headers, timeout=DEFAULT_TIMEOUT)
 
         if response.status_code == 200:
             data = response.json()
@@ -126,6 +176,15 @@ def process_date_field(date_str):
     return 0, 0
 
 
+def apply_upload_result(row, s3_url):
+    """Fills AdCreative/AdMedia once the upload for the row has finished."""
+    original_creative_url = row['AdCreative']
+    # If upload failed or returned empty, we might want to keep original or leave empty.
+    # Prompt implies assigning the result.
+    row['AdCreative'] = s3_url if s3_url else original_creative_url
+    row['AdMedia'] = s3_url if s3_url else original_creative_url # Prompt asked for same value
+
+
 def extract_keyword_from_filename(input_file: str) -> str:
     """Extracts keyword from filenames like: YYYYMMDD_HHMMSS_<keyword>.csv"""
     base_name = os.path.basename(str(input_file or ""))
@@ -140,119 +199,176 @@ def extract_keyword_from_filename(input_file: str) -> str:
         return stem
     return ""
 
+def record_cache_metrics(cache, hits, misses):
+    metrics.inc("cache_lookups_total", hits, cache=cache, result="hit")
+    metrics.inc("cache_lookups_total", misses, cache=cache, result="miss")
+
 # --- MAIN PROCESSING ---
 
-def main(input_file: str):
-    print("Starting process...")
-    start_time = time.time()
+class _BatchDone:
+    """Marker queued behind a batch's rows; released once they all were."""
 
-    filename = os.path.basename(str(input_file or ""))
-    output_file = "processed_" + filename
+    def __init__(self, key):
+        self.key = key
 
-    keyword = extract_keyword_from_filename(input_file)
 
-    detector = TechnologyDetector()
+def _noop_finish(row, result):
+    pass
 
-    # Read Input CSV
-    rows = []
-    try:
-        with open(input_file, mode='r', encoding='utf-8-sig') as csvfile:
-            reader = csv.DictReader(csvfile)
-            rows = list(reader)
-    except FileNotFoundError:
-        print(f"Error: {input_file} not found.")
-        return
 
-    # Define all headers (Original + New)
-    fieldnames = [
-        # Original
-        "libraryID", "startDate", "Duplicates", "Keyword",
-        # New
-        "cta_text", "cta_type", "__html", "page_profile_uri", "publisherPlatform",
-        "URLCreative", "url_preview_creative", "AdCreative", "AdMedia",
-        "profilePict", "page_profile_picture_url", "Active", "Estatus",
-        "CollectionCount", "CollationID", "endDate", "LibraryID", "ahref",
-        "pageName", "pageID", "AdDescription", "AdTitle", "age", "gender",
-        "languages", "countries", "lazy_load", "contains_details", "domain",
-        "createdAt", "updatedAt", "AdDescription_plain", "AdTitle_plain",
-        "daysSincePublication", "codeBelongs"
-    ]
+def process_records(records, keyword="", skip_batches=None, on_batch_done=None, on_batch_failed=None):
+    """
+    Enriches scraped records (libraryID, startDate, Duplicates) and yields
+    the surviving rows with PROCESSED_FIELDNAMES, in input order.
+
+    Records are consumed lazily in batches, so rows start flowing before
+    the input is exhausted. Batches are identified by run_journal.batch_key
+    of their input rows (before known ads are dropped): keys in
+    `skip_batches` are not processed again, and `on_batch_done(key)` is
+    called once every surviving row of a batch has been consumed.
+
+    Rows whose detail lookup failed (after retries) are left out and
+    counted as lookup_failed; their batch calls `on_batch_failed(key)`
+    instead of `on_batch_done`, so it is not journaled and a later run
+    retries it.
+    """
+    print("Starting process...")
+    start_time = time.time()
 
-    # Process in batches of 5
+    tech_cache = None
+    if TECH_CACHE_FILE:
+        tech_cache = PersistentTTLCache(
+            TECH_CACHE_FILE, ttl_seconds=TECH_CACHE_TTL, max_entries=TECH_CACHE_MAX_ENTRIES
+        )
+    detector = CachedTechnologyDetector(TechnologyDetector(), persistent_cache=tech_cache)
+
+    skip_batches = skip_batches or set()
+    counts = {"read": 0, "known": 0, "written": 0, "resumed": 0, "no_target_tech": 0, "lookup_failed": 0}
+
+    def count_read(records):
+        for record in records:
+            counts["read"] += 1
+            yield record
+
+    records = count_read(records)
+
+    # Skip ads already stored in adsdomains before paying for API, detection and upload
+    known_ids = None
+    if KNOWN_IDS_SNAPSHOT_FILE:
+        known_ids = KnownIdIndex(KNOWN_IDS_SNAPSHOT_FILE)
+        known_ids.refresh_if_stale(get_db_pool(), KNOWN_IDS_REFRESH_INTERVAL)
+
+    def drop_known(batch):
+        if known_ids is None:
+            return batch
+        kept = [record for record in batch if record.get('libraryID') not in known_ids]
+        counts["known"] += len(batch) - len(kept)
+        return kept
+
+    # Process (and journal) in batches of 5; the detail requests merge
+    # consecutive batches into auto-sized ?ids= calls (see DetailFetcher)
     batch_size = 5
-    total_rows = len(rows)
-    
-    print(f"Found {total_rows} rows. Processing...")
-
-    # Open output file
-    with open(output_file, mode='w', newline='', encoding='utf-8') as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for i in range(0, total_rows, batch_size):
-            batch = rows[i:i + batch_size]
-            
-            # Extract IDs for query
-            # Filtering out empty IDs just in case
+
+    # Batches are cut from the input before the known-ID filter, so their keys
+    # stay the same on resume even if the known set changed in between.
+    # Filtering out empty IDs just in case
+    def iter_id_batches(records):
+        for batch in chunked(records, batch_size):
+            key = batch_key(row.get('libraryID') or '' for row in batch)
+            if key in skip_batches:
+                # Finished by an earlier, interrupted run
+                counts["resumed"] += len(batch)
+                continue
+            batch = drop_known(batch)
+            if not batch:
+                continue
             ids_list = [row['libraryID'] for row in batch if row.get('libraryID')]
-            
+            yield (batch, ids_list, key), ids_list
+
+    id_batches = iter_id_batches(records)
+
+    # Detail requests run concurrently; lookups come back in batch order.
+    # Only IDs missing from (or stale in) the detail cache hit the API.
+    detail_cache = None
+    if DETAIL_CACHE_FILE:
+        detail_cache = PersistentTTLCache(
+            DETAIL_CACHE_FILE, ttl_seconds=DETAIL_CACHE_TTL, max_entries=DETAIL_CACHE_MAX_ENTRIES
+        )
+    fetcher = DetailFetcher(API_URL, concurrency=API_CONCURRENCY, cache=detail_cache,
+                            limiter=get_limiter(API_URL, rate=API_RATE, max_rate=API_MAX_RATE))
+    # Uploads run in the background while later batches are fetched and detected
+    manifest = MediaManifest(UPLOAD_MANIFEST_FILE) if UPLOAD_MANIFEST_FILE else None
+    uploader = MediaUploader(upload_media_with_cloud_function, workers=UPLOAD_WORKERS, manifest=manifest)
+
+    # Rows are released in input order as soon as their upload resolves
+    ready = deque()
+    ordered_writer = OrderedUploadWriter(ready.append)
+
+    def release_ready():
+        while ready:
+            item = ready.popleft()
+            if isinstance(item, _BatchDone):
+                if on_batch_done is not None:
+                    on_batch_done(item.key)
+                continue
+            counts["written"] += 1
+            yield item
+
+    try:
+        for batch_index, ((batch, ids_list, key), api_lookup, failed_ids) in enumerate(fetcher.iter_lookups(id_batches)):
             if not ids_list:
                 continue
 
-            ids_query_string = ",".join(ids_list)
-            
-            print(f"Processing batch {i//batch_size + 1}: IDs {ids_query_string}")
+            print(f"Processing batch {batch_index + 1}: IDs {','.join(ids_list)}")
 
-            # Make API Request
-            try:
-                response = requests.get(f"{API_URL}?ids={ids_query_string}")
-                api_data = response.json()
-            except Exception as e:
-                print(f"API Request failed: {e}")
-                # We still write the rows, but with empty API data
-                api_data = []
-
-            # Create a lookup dictionary for API results
-            # The API returns 'LibraryID' (capital L) usually, or 'id'
-            api_lookup = {}
-            if isinstance(api_data, list):
-                for item in api_data:
-                    # Handle potential key differences
-                    lib_id = item.get('LibraryID') or item.get('id')
-                    if lib_id:
-                        api_lookup[str(lib_id)] = item
+            # Group the batch by landing page (host + path) so each one is detected once
+            grouped_tech = None
+            if TECH_GROUP_BY_DOMAIN:
+                link_urls = [api_lookup.get(row.get('libraryID'), {}).get('link_url', '') for row in batch]
+                with metrics.timed("tech_detection_batch_seconds"):
+                    grouped_tech = detector.detect_many(
+                        [url for url in link_urls if url and is_detectable_tech(url)]
+                    )
 
             # Update rows
             for row in batch:
                 lib_id = row.get('libraryID')
+                if lib_id in failed_ids:
+                    # No details because the request failed, not because there are none
+                    counts["lookup_failed"] += 1
+                    continue
                 json_obj = api_lookup.get(lib_id, {})
-                
+
                 # --- Tech Detection (Early filter to save S3 costs) ---
                 link_url = json_obj.get('link_url', '')
                 code_belongs = ""
-                
+
                 if link_url and is_detectable_tech(link_url):
                     try:
-                        technologies = detector.detect_technologies(link_url)
+                        if grouped_tech is not None:
+                            technologies = grouped_tech.get(link_url)
+                        else:
+                            technologies = detector.detect_technologies(link_url)
                         if technologies:
                             code_belongs = ','.join(technologies)
                     except Exception as e:
                         print(f"Tech detection failed for {link_url}: {e}")
-                
+
                 # Skip rows that don't have any target technology
                 if not code_belongs or not any(
                     target.lower() in code_belongs.lower() for target in TARGET_TECHNOLOGIES
                 ):
+                    counts["no_target_tech"] += 1
                     continue
-                
+
                 # --- Update Date Fields ---
                 epoch_date, days_since = process_date_field(row.get('startDate', ''))
-                
+
                 # --- Mappings ---
                 row['startDate'] = epoch_date # Updating existing field
                 row['daysSincePublication'] = days_since
                 row['Keyword'] = keyword
-                
+
                 # New Fields Mapping
                 row['cta_text'] = json_obj.get('cta_text', '')
                 row['cta_type'] = json_obj.get('cta_type', '')
@@ -261,28 +377,27 @@ def main(input_file: str):
                 row['publisherPlatform'] = "facebook"
                 row['URLCreative'] = json_obj.get('URLCreative', '')
                 row['url_preview_creative'] = json_obj.get('url_preview_creative', '')
-                
+
                 # AdCreative & AdMedia Logic (Upload to S3)
                 original_creative_url = json_obj.get('AdCreative', '') or json_obj.get('URLCreative', '')
-                
-                # Upload to S3
-                s3_url = ""
+
+                # Upload to S3 (in the background; see apply_upload_result)
+                upload_future = None
                 if original_creative_url:
                     # Determine type for the function based on AdMedia or URL extension
                     ftype = "video" if "mp4" in original_creative_url else "img"
                     # Use lib_id as file_name for uniqueness
-                    s3_url = upload_media_with_cloud_function(original_creative_url, ftype, str(lib_id) if lib_id else "media")
-                
-                # If upload failed or returned empty, we might want to keep original or leave empty.
-                # Prompt implies assigning the result.
-                row['AdCreative'] = s3_url if s3_url else original_creative_url
-                row['AdMedia'] = s3_url if s3_url else original_creative_url # Prompt asked for same value
-                
+                    upload_future = uploader.submit(
+                        original_creative_url, ftype, str(lib_id) if lib_id else "media", library_id=lib_id
+                    )
+                row['AdCreative'] = original_creative_url
+                row['AdMedia'] = original_creative_url
+
                 row['profilePict'] = json_obj.get('profilePict', '')
                 row['page_profile_picture_url'] = json_obj.get('page_profile_picture_url', '')
                 row['Active'] = json_obj.get('Active', '')
                 row['Estatus'] = json_obj.get('Active', '') # Prompt asks for Active value here too
-                
+
                 # Static/Zero values
                 row['CollectionCount'] = 0
                 row['CollationID'] = 0
@@ -300,24 +415,160 @@ def main(input_file: str):
                 row['lazy_load'] = True
                 row['contains_details'] = True
                 row['domain'] = ""
-                
+
                 # Timestamps
                 now_ts = get_current_timestamp_mariadb()
                 row['createdAt'] = now_ts
                 row['updatedAt'] = now_ts
-                
+
                 row['AdDescription_plain'] = ""
                 row['AdTitle_plain'] = ""
                 row['codeBelongs'] = code_belongs
 
-                # Write row and flush to disk immediately
-                writer.writerow(row)
-                outfile.flush()
-                os.fsync(outfile.fileno())
+                ordered_writer.add(row, upload_future, apply_upload_result)
+
+            if failed_ids:
+                print(f"Batch {batch_index + 1}: detail lookup failed for {len(failed_ids)} IDs; "
+                      f"leaving the batch for a later run.")
+                if on_batch_failed is not None:
+                    on_batch_failed(key)
+            else:
+                ordered_writer.add(_BatchDone(key), None, _noop_finish)
+            yield from release_ready()
+
+        # Wait for the remaining uploads
+        ordered_writer.flush()
+        yield from release_ready()
+
+    finally:
+        fetcher.close()
+        uploader.close()
+        uploader.print_stats()
+        print(fetcher.batcher.stats_line())
+        print(fetcher.limiter.stats_line())
+        print(get_limiter(CLOUD_FUNCTION_URL, rate=UPLOAD_RATE, max_rate=UPLOAD_MAX_RATE).stats_line())
+        if manifest is not None:
+            print(manifest.stats_line())
+            record_cache_metrics("media_manifest", manifest.hits, manifest.misses)
+            manifest.close()
+        if detail_cache is not None:
+            print(detail_cache.stats_line("Detail cache"))
+            record_cache_metrics("detail", detail_cache.hits, detail_cache.misses)
+            detail_cache.close()
+        print(detector.stats_line())
+        metrics.inc("cache_lookups_total", detector.memory_hits, cache="tech_memory", result="hit")
+        if tech_cache is not None:
+            record_cache_metrics("tech", tech_cache.hits, tech_cache.misses)
+            tech_cache.close()
+        for outcome, count in counts.items():
+            metrics.inc("processor_rows_total", count, outcome=outcome)
+        metrics.observe("process_records_seconds", time.time() - start_time)
+
+        print(
+            f"Read {counts['read']} rows: {counts['known']} already in adsdomains, "
+            f"{counts['resumed']} done in an earlier run, {counts['lookup_failed']} failed detail lookups, "
+            f"{counts['written']} kept."
+        )
+        elapsed = time.time() - start_time
+        print(f"Total processing time: {elapsed:.2f} seconds")
+
+
+def process_to_checkpoint(records, keyword, output_file, journal=None):
+    """
+    Processes records into the durable `output_file` and yields every row
+    written to it.
+
+    With a RunJournal, completed batches are journaled as their rows become
+    durable. If an earlier run over the same output was interrupted, or
+    finished with failed detail lookups, its committed rows are recovered
+    and yielded first and its completed batches skipped.
+    """
+    scope = f"process:{os.path.abspath(output_file)}"
+    skip_batches = set()
+    previous_rows = []
+    resume = False
+
+    if journal is not None:
+        skip_batches = journal.completed_batches(scope)
+        # A file that finished with failed batches was closed cleanly (no journal
+        # left); it is re-journaled so those batches can be appended to it
+        if skip_batches and (recover(output_file, PROCESSED_FIELDNAMES) is not None
+                             or rejournal(output_file) is not None):
+            previous_rows = list(iter_csv(output_file))
+            resume = True
+            print(f"Resuming {output_file}: {len(skip_batches)} batches, {len(previous_rows)} rows already done.")
+        else:
+            # Nothing recoverable on disk: start the file over
+            skip_batches = set()
+            journal.clear_scope(scope)
+
+    released = []
+
+    def journal_released():
+        # Called after a group commit: every released batch is now durable
+        journal.mark_batches(scope, list(released))
+        released.clear()
+
+    failed_batches = []
+    rows = process_records(
+        records, keyword,
+        skip_batches=skip_batches,
+        on_batch_done=released.append if journal is not None else None,
+        on_batch_failed=failed_batches.append,
+    )
+    if previous_rows:
+        # A group commit can end mid-batch: rows of the interrupted batch
+        # may already be on disk and come out again when it is redone
+        previous_ids = {row.get('libraryID') for row in previous_rows}
+        rows = (row for row in rows if row.get('libraryID') not in previous_ids)
+    rows = tee_to_csv(
+        rows, output_file, PROCESSED_FIELDNAMES, durable=True, resume=resume,
+        on_commit=journal_released if journal is not None else None,
+    )
+
+    yield from previous_rows
+    yield from rows
+
+    if failed_batches:
+        # Keep the journal: running over the same file again redoes only these batches
+        print(f"{len(failed_batches)} batches of {output_file} had failed detail lookups; "
+              f"run again to retry them.")
+    elif journal is not None:
+        # The file is complete; a later run over it starts fresh
+        journal.clear_scope(scope)
+
+
+def main(input_file: str, checkpoint=True, resume=True):
+    """
+    Processes a scraped CSV into processed_<input file>. With `checkpoint`
+    False the rows are consumed without writing the file (useful to
+    measure the processor alone). With `resume`, an interrupted earlier
+    run over the same file continues from its last durable batch.
+    Returns the output filename.
+    """
+    filename = os.path.basename(str(input_file or ""))
+    output_file = "processed_" + filename
+
+    keyword = extract_keyword_from_filename(input_file)
+
+    if not os.path.exists(str(input_file or "")):
+        print(f"Error: {input_file} not found.")
+        return
+
+    if checkpoint:
+        # Rows are made durable in journaled groups instead of one fsync each
+        journal = RunJournal() if resume else None
+        rows = process_to_checkpoint(iter_csv(input_file), keyword, output_file, journal=journal)
+    else:
+        journal = None
+        rows = process_records(iter_csv(input_file), keyword)
+    for _ in rows:
+        pass
+    if journal is not None:
+        journal.close()
+    metrics.export(entrypoint="ads_processor", file=str(input_file))
 
     print(f"Done. Results saved to {output_file}")
-    elapsed = time.time() - start_time
-    print(f"Total processing time: {elapsed:.2f} seconds")
     return output_file
 
 if __name__ == "__main__":
@@ -1,40 +1,248 @@
-"""Orchestration script: runs scraper then processor."""
+"""Orchestration script: runs scraper, processor and inserter as a pipeline."""
 import csv
 import os
+import threading
+from functools import partial
 
-from flashScraperGemini import main as scraper_main
-from ads_processor import main as processor_main
-from insertProcessedCsv import main as insert_main
+from flashScraperGemini import scrape as scrape_records, scrape_many, save_csv
+from ads_processor import process_records, process_to_checkpoint
+from insertProcessedCsv import insert_records
+import metrics
+from pipeline import Pipeline
+from browser_pool import BrowserPool
+from session_pool import SessionPool
+from record_stream import BackgroundIterator, iter_csv, chunked
+from run_journal import RunJournal
 
+# --- PIPELINE CONFIGURATION ---
+COUNTRY = "BR"
+# Each scrape worker leases its own Chrome window from the browser pool
+SCRAPE_WORKERS = 1
+# Keywords scraped at once in tabs of one browser, scrolling interleaved (1 = one tab)
+TABS_PER_BROWSER = 1
+# Spread browsers over the accounts in session_pool.ACCOUNTS_FILE (the .env account if absent)
+USE_SESSION_POOL = True
+# Scrapes served by one logged-in Chrome before it is restarted
+BROWSER_MAX_USES = 20
+# Each keyword is scraped down to its results_count, capped at this many ads
+MAX_SCRAPE_DEPTH = 100
+PROCESS_WORKERS = 2
+INSERT_WORKERS = 1
+# Maximum items waiting between two stages
+QUEUE_SIZE = 2
+# Processed rows buffered between a keyword's processor and its inserter
+ROW_BUFFER_SIZE = 200
+# Also write the scraped and processed_ CSV files (records always stream in memory)
+CSV_CHECKPOINTS = True
+# Journal completed stages/batches so a crashed run resumes where it stopped
+# (scrape and process resume need CSV_CHECKPOINTS)
+RESUME = True
 
-def run():
-    """Read keywords CSV, scrape each, then process the resulting CSV."""
-    keywords_file = "ads_keywords.csv"
 
+def read_keywords(keywords_file):
+    """Yields the keywords listed in the keywords CSV."""
+    for keyword, _ in read_keyword_depths(keywords_file):
+        yield keyword
+
+
+def read_keyword_depths(keywords_file, max_depth=MAX_SCRAPE_DEPTH):
+    """Yields (keyword, scrape depth): its results_count, capped at `max_depth`."""
     with open(keywords_file, mode='r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
-            keyword = row['keyword']
-            print(f"\n{'='*50}")
-            print(f"Processing keyword: {keyword}")
-            print(f"{'='*50}")
-
-            # Step 1: Scrape ads and get CSV filename
-            csv_file = scraper_main(keyword, country="BR")
-
-            if csv_file:
-                # Step 2: Process the scraped CSV
-                print(f"\n--- Running ads_processor on {csv_file} ---")
-                processed_file = processor_main(csv_file)
-                
-                # Step 3: Insert processed rows into database
-                if processed_file and os.path.exists(processed_file):
-                    print(f"\n--- Inserting {processed_file} into database ---")
-                    insert_main(processed_file)
-                else:
-                    print(f"Processed file not found, skipping database insert.")
+            try:
+                depth = min(int(row.get('results_count') or max_depth), max_depth)
+            except ValueError:
+                depth = max_depth
+            yield row['keyword'], depth
+
+
+def scrape_stage(keyword, pool, journal=None, run_id=None, depths=None):
+    """Step 1: Scrape ads with a pooled driver. Returns (keyword, records, csv_file)."""
+    print(f"\n{'='*50}")
+    print(f"Processing keyword: {keyword}")
+    print(f"{'='*50}")
+
+    if journal is not None:
+        if journal.stage_detail(run_id, keyword, "insert") is not None:
+            print(f"Keyword '{keyword}' already completed in this run, skipping.")
+            return None
+        csv_file = journal.stage_detail(run_id, keyword, "scrape")
+        if csv_file and os.path.exists(csv_file):
+            print(f"Reusing scrape checkpoint {csv_file}")
+            return keyword, list(iter_csv(csv_file)), csv_file
+
+    driver = pool.acquire()
+    if driver is None:
+        print(f"No authenticated browser available for keyword '{keyword}'.")
+        return None
+
+    records = None
+    try:
+        depth = (depths or {}).get(keyword, MAX_SCRAPE_DEPTH)
+        records = scrape_records(keyword, country=COUNTRY, driver=driver, depth=depth)
+    finally:
+        # A failed scrape may have left the browser in a bad state
+        pool.release(driver, failed=records is None)
+
+    if records is None:
+        print(f"Scraping failed for keyword '{keyword}', skipping processor.")
+        return None
+
+    csv_file = save_csv(records, keyword) if CSV_CHECKPOINTS else None
+    if journal is not None and csv_file:
+        journal.mark_stage(run_id, keyword, "scrape", csv_file)
+    return keyword, records, csv_file
+
+
+def scrape_group_stage(keywords, pool, journal=None, run_id=None, depths=None):
+    """
+    Step 1, multi-tab: scrape a group of keywords in tabs of one pooled
+    driver. Returns the (keyword, records, csv_file) items of the ones that
+    succeeded, for the process stage to take one by one.
+    """
+    print(f"\n{'='*50}")
+    print(f"Processing keywords: {', '.join(keywords)}")
+    print(f"{'='*50}")
+
+    items = []
+    pending = []
+    for keyword in keywords:
+        if journal is not None:
+            if journal.stage_detail(run_id, keyword, "insert") is not None:
+                print(f"Keyword '{keyword}' already completed in this run, skipping.")
+                continue
+            csv_file = journal.stage_detail(run_id, keyword, "scrape")
+            if csv_file and os.path.exists(csv_file):
+                print(f"Reusing scrape checkpoint {csv_file}")
+                items.append((keyword, list(iter_csv(csv_file)), csv_file))
+                continue
+        pending.append(keyword)
+    if not pending:
+        return items
+
+    driver = pool.acquire()
+    if driver is None:
+        print(f"No authenticated browser available for keywords {pending}.")
+        return items
+
+    results = {}
+    try:
+        group_depths = {kw: (depths or {}).get(kw, MAX_SCRAPE_DEPTH) for kw in pending}
+        results = scrape_many(pending, country=COUNTRY, driver=driver, depths=group_depths)
+    finally:
+        pool.release(driver, failed=not any(records is not None for records in results.values()))
+
+    for keyword in pending:
+        records = results.get(keyword)
+        if records is None:
+            print(f"Scraping failed for keyword '{keyword}', skipping processor.")
+            continue
+        csv_file = save_csv(records, keyword) if CSV_CHECKPOINTS else None
+        if journal is not None and csv_file:
+            journal.mark_stage(run_id, keyword, "scrape", csv_file)
+        items.append((keyword, records, csv_file))
+    return items
+
+
+def process_stage(item, slots, journal=None):
+    """
+    Step 2: Start processing the scraped records in the background.
+
+    Returns (keyword, rows) right away, where rows is an iterator the
+    insert stage consumes while processing is still running. `slots`
+    bounds how many keywords are processed at the same time.
+    """
+    keyword, records, csv_file = item
+    print(f"\n--- Running ads_processor for '{keyword}' ---")
+
+    slots.acquire()
+    try:
+        if csv_file:
+            processed_file = "processed_" + os.path.basename(csv_file)
+            rows = process_to_checkpoint(records, keyword, processed_file, journal=journal)
+        else:
+            rows = process_records(records, keyword)
+        rows = BackgroundIterator(
+            rows, maxsize=ROW_BUFFER_SIZE, on_finish=slots.release, name=f"process-{keyword}"
+        )
+    except Exception:
+        slots.release()
+        raise
+    return keyword, rows
+
+
+def insert_stage(item, journal=None, run_id=None):
+    """Step 3: Insert processed rows into database as they are produced."""
+    keyword, rows = item
+    print(f"\n--- Inserting rows for '{keyword}' into database ---")
+    scope = f"insert:{run_id}:{keyword}" if journal is not None else None
+    result = None
+    try:
+        result = insert_records(rows, journal=journal, scope=scope)
+    finally:
+        # Let the processor finish (and free its slot) even if the insert bailed out
+        for _ in rows:
+            pass
+    if result is None:
+        print(f"Insert for '{keyword}' did not complete; it will be retried on resume.")
+        return None
+    if journal is not None:
+        journal.mark_stage(run_id, keyword, "insert")
+    return keyword
+
+
+def run(keywords_file="ads_keywords.csv", scrape_workers=SCRAPE_WORKERS,
+        process_workers=PROCESS_WORKERS, insert_workers=INSERT_WORKERS,
+        queue_size=QUEUE_SIZE, browser_max_uses=BROWSER_MAX_USES, resume=RESUME,
+        max_depth=MAX_SCRAPE_DEPTH, tabs_per_browser=TABS_PER_BROWSER,
+        use_session_pool=USE_SESSION_POOL):
+    """
+    Read keywords CSV and push every keyword through scrape -> process -> insert.
+    With `resume`, a crashed run over the same keywords file continues where it stopped.
+    """
+    sessions = SessionPool() if use_session_pool else None
+    pool = BrowserPool(size=scrape_workers, max_uses=browser_max_uses, sessions=sessions)
+    process_slots = threading.BoundedSemaphore(process_workers)
+
+    journal = RunJournal() if resume else None
+    run_id = journal.start_run(os.path.abspath(keywords_file)) if journal is not None else None
+
+    depths = dict(read_keyword_depths(keywords_file, max_depth))
+
+    pipeline = Pipeline(queue_size=queue_size)
+    if tabs_per_browser > 1:
+        pipeline.add_stage("scrape", partial(scrape_group_stage, pool=pool, journal=journal,
+                                             run_id=run_id, depths=depths),
+                           workers=scrape_workers, fan_out=True)
+    else:
+        pipeline.add_stage("scrape", partial(scrape_stage, pool=pool, journal=journal, run_id=run_id,
+                                             depths=depths),
+                           workers=scrape_workers)
+    pipeline.add_stage("process", partial(process_stage, slots=process_slots, journal=journal),
+                       workers=process_workers)
+    pipeline.add_stage("insert", partial(insert_stage, journal=journal, run_id=run_id),
+                       workers=insert_workers)
+
+    keywords = list(read_keywords(keywords_file))
+    try:
+        if tabs_per_browser > 1:
+            pipeline.run(chunked(keywords, tabs_per_browser))
+        else:
+            pipeline.run(keywords)
+        if journal is not None:
+            pending = [kw for kw in keywords if journal.stage_detail(run_id, kw, "insert") is None]
+            if pending:
+                print(f"Run {run_id} incomplete ({len(pending)} keywords pending); run again to resume.")
             else:
-                print(f"Scraping failed for keyword '{keyword}', skipping processor.")
+                journal.finish_run(run_id)
+    finally:
+        pool.close()
+        if sessions is not None:
+            print(sessions.stats_line())
+        if journal is not None:
+            journal.close()
+        metrics.export(entrypoint="app", run_id=run_id, keywords_file=keywords_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+"""
+Benchmark: rows/sec of the insert modes of insertProcessedCsv.
+
+Usage:
+  python benchmarks/bench_bulk_insert.py [--rows 2000] [--rtt-ms 40]
+      Stand-in backend: a fake connection that charges --rtt-ms per round
+      trip (a typical remote link) plus upload time at 2 MB/s.
+  python benchmarks/bench_bulk_insert.py [--rows 2000] --mysql HOST USER PASSWORD DATABASE
+      Local MariaDB/MySQL. DATABASE must be a scratch database: the
+      benchmark creates an `adsdomains` table there if it is missing and
+      deletes its own rows afterwards.
+"""
+import argparse
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+import pymysql
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import insertProcessedCsv
+from db_pool import ConnectionPool
+from fixtures.db_standin import StandInConnection
+from insertProcessedCsv import DB_CONFIG, DB_FIELDS, INT_FIELDS, BOOL_FIELDS, insert_records
+
+FIRST_LIBRARY_ID = 9000000000000000
+
+
+def make_rows(count, offset=0):
+    rows = []
+    for i in range(offset, offset + count):
+        row = {}
+        for field in DB_FIELDS:
+            if field in INT_FIELDS:
+                row[field] = str(1733961600 + i)
+            elif field in BOOL_FIELDS:
+                row[field] = "True"
+            else:
+                row[field] = ""
+        row.update({
+            "libraryID": str(FIRST_LIBRARY_ID + i),
+            "Keyword": "benchmark",
+            "AdTitle": f'["Ad title {i}"]',
+            "AdDescription": f'["Description of ad {i} with a bit more text to look real"]',
+            "AdCreative": f"https://example-bucket.s3.amazonaws.com/{i}_1700000000000.mp4",
+            "ahref": f"https://shop{i % 50}.example.com/products/item-{i}",
+            "pageName": f"Page {i % 200}",
+            "domain": f"shop{i % 50}.example.com",
+            "codeBelongs": "Shopify,Hotmart",
+            "createdAt": "2026-02-04 17:21:39",
+            "updatedAt": "2026-02-04 17:21:39",
+        })
+        rows.append(row)
+    return rows
+
+
+def ensure_scratch_table(connection):
+    columns = []
+    for field in DB_FIELDS:
+        if field in INT_FIELDS or field in BOOL_FIELDS:
+            columns.append(f"`{field}` BIGINT NULL")
+        elif field == 'LibraryID':
+            columns.append("`LibraryID` VARCHAR(32) NULL")
+        else:
+            columns.append(f"`{field}` TEXT NULL")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS adsdomains ("
+            " id BIGINT AUTO_INCREMENT PRIMARY KEY, " + ", ".join(columns) + ","
+            " UNIQUE KEY uniq_library_id (LibraryID))"
+        )
+    connection.commit()
+
+
+def delete_bench_rows(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM adsdomains WHERE LibraryID >= %s", (str(FIRST_LIBRARY_ID),)
+        )
+    connection.commit()
+
+
+def run_mode(label, mode, duplicates, rows, connect_func):
+    insertProcessedCsv.BULK_DUPLICATES = duplicates
+    pool = ConnectionPool(partial(connect_func, local_infile=mode == "load_data"), size=1)
+    started = time.perf_counter()
+    result = insert_records(rows, mode=mode, pool=pool)
+    elapsed = time.perf_counter() - started
+    pool.close()
+    return label, elapsed, result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0], formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split("\n\n", 1)[1],
+    )
+    parser.add_argument("--rows", type=int, default=2000, help="rows inserted per mode")
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="stand-in round trip time")
+    parser.add_argument("--mysql", nargs=4, metavar=("HOST", "USER", "PASSWORD", "DATABASE"),
+                        help="benchmark a scratch MariaDB/MySQL database instead of the stand-in")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    count = args.rows
+
+    if args.mysql:
+        host, user, password, database = args.mysql
+        if database == DB_CONFIG['database']:
+            sys.exit("Refusing to benchmark against the production database.")
+        config = dict(host=host, user=user, password=password, database=database,
+                      charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor)
+        connect_func = lambda **overrides: pymysql.connect(**{**config, **overrides})
+        setup = connect_func()
+        ensure_scratch_table(setup)
+        delete_bench_rows(setup)
+        backend = f"MariaDB at {host}/{database}"
+        stand_in = None
+    else:
+        rtt_ms = args.rtt_ms
+        stand_in = StandInConnection(rtt=rtt_ms / 1000)
+        connect_func = lambda **overrides: stand_in
+        setup = None
+        backend = f"stand-in backend, {rtt_ms:.0f} ms round trip"
+
+    cases = [
+        ("batch (10 rows, SELECT+INSERT)", "batch", "check"),
+        ("bulk, SELECT check", "bulk", "check"),
+        ("bulk, INSERT IGNORE", "bulk", "ignore"),
+        ("load_data, IGNORE", "load_data", "ignore"),
+    ]
+    results = []
+    for index, (label, mode, duplicates) in enumerate(cases):
+        # Fresh LibraryIDs per case so every mode really inserts
+        rows = make_rows(count, offset=index * count)
+        if stand_in is not None:
+            stand_in.round_trips = stand_in.sent_bytes = 0
+        label, elapsed, result = run_mode(label, mode, duplicates, rows, connect_func)
+        trips = f"{stand_in.round_trips} round trips" if stand_in is not None else ""
+        results.append((label, elapsed, result, trips))
+
+    if setup is not None:
+        delete_bench_rows(setup)
+        setup.close()
+
+    print(f"\n{count} rows per mode, {backend}")
+    baseline = results[0][1]
+    for label, elapsed, result, trips in results:
+        print(f"{label:<32} {elapsed:8.3f}s  {count / elapsed:10.0f} rows/sec  "
+              f"x{baseline / elapsed:6.1f}  {result}  {trips}")
+
+
+if __name__ == "__main__":
+    main()
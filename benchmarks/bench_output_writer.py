@@ -0,0 +1,88 @@
+"""
+Benchmark: per-row fsync (previous ads_processor behavior) vs. the
+group-commit writer.
+
+Usage: python benchmarks/bench_output_writer.py [--rows 2000] [--target-dir DIR]
+Point --target-dir at network storage to see the difference that matters.
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from schema import PROCESSED_FIELDNAMES
+from durable_writer import GroupCommitCsvWriter
+
+
+def make_rows(count):
+    rows = []
+    for i in range(count):
+        row = {name: "" for name in PROCESSED_FIELDNAMES}
+        row.update({
+            "libraryID": str(1000000000000000 + i),
+            "LibraryID": str(1000000000000000 + i),
+            "startDate": 1733961600,
+            "Keyword": "benchmark",
+            "AdTitle": f"Ad title {i}",
+            "AdCreative": f"https://example-bucket.s3.amazonaws.com/{i}_1700000000000.mp4",
+            "codeBelongs": "Shopify,Hotmart",
+        })
+        rows.append(row)
+    return rows
+
+
+def per_row_fsync(rows, filepath):
+    with open(filepath, mode='w', newline='', encoding='utf-8') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=PROCESSED_FIELDNAMES)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+
+def group_commit(rows, filepath, group_rows):
+    with GroupCommitCsvWriter(filepath, PROCESSED_FIELDNAMES, group_rows=group_rows) as writer:
+        for row in rows:
+            writer.writerow(row)
+
+
+def timed(label, func, rows):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:8.3f}s  {len(rows) / elapsed:10.0f} rows/sec")
+    return elapsed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=2000, help="rows written per writer")
+    parser.add_argument("--target-dir", help="directory the files are written under (default: system temp)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    count = args.rows
+    rows = make_rows(count)
+
+    with tempfile.TemporaryDirectory(dir=args.target_dir) as tmp:
+        print(f"Writing {count} rows under {tmp}")
+        baseline = timed("per-row fsync", lambda: per_row_fsync(rows, os.path.join(tmp, "a.csv")), rows)
+        for group_rows in (10, 50, 200):
+            elapsed = timed(
+                f"group commit ({group_rows} rows)",
+                lambda: group_commit(rows, os.path.join(tmp, f"b{group_rows}.csv"), group_rows),
+                rows,
+            )
+            print(f"{'':<28} speedup x{baseline / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Offline benchmark suite: scraper -> processor -> inserter, end to end,
+against local stand-ins for every external dependency.
+
+- Facebook Ads Library: fixtures/ads_library_server.py, scrolled by headless Chrome
+  (flashScraperGemini.main). Without Chrome, the scrape CSV is generated from
+  the same fixture and the stage is reported as skipped.
+- API_URL / CLOUD_FUNCTION_URL: fixtures/external_apis.py (ads_processor.main),
+  with configurable latency, 502 and 429 rates; tech detection uses its
+  FixtureTechnologyDetector.
+- MariaDB: fixtures/db_standin.py (insertProcessedCsv.main).
+
+Each stage reports wall time, throughput and the latency histograms
+collected by `metrics`. With --baseline, a stage whose throughput fell by
+more than --tolerance against an earlier --output file fails the run.
+
+Usage:
+  python benchmarks/run_offline_suite.py [--ads 300] [--detail-latency-ms 200]
+      [--upload-latency-ms 500] [--error-rate 0.02] [--throttle-rate 0.02]
+      [--db-rtt-ms 40] [--scroll-latency-ms 300] [--insert-mode bulk] [--skip-scrape]
+      [--output results.json] [--baseline results.json] [--tolerance 0.2]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ads_processor
+import flashScraperGemini
+import insertProcessedCsv
+import metrics
+from ads_capture import ad_to_record, iter_ad_nodes
+from fixtures import ads_library_server, external_apis
+from fixtures.db_standin import StandInConnection
+from record_stream import iter_csv
+
+KEYWORD = "benchmark offer"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ads", type=int, default=300, help="ads served for the keyword")
+    parser.add_argument("--scroll-latency-ms", type=float, default=300.0)
+    parser.add_argument("--detail-latency-ms", type=float, default=200.0)
+    parser.add_argument("--upload-latency-ms", type=float, default=500.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 502 answers")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of 429 answers")
+    parser.add_argument("--db-rtt-ms", type=float, default=40.0)
+    parser.add_argument("--insert-mode", default=insertProcessedCsv.INSERT_MODE,
+                        choices=("batch", "bulk", "load_data"))
+    parser.add_argument("--skip-scrape", action="store_true", help="generate the scrape CSV instead")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed throughput drop against the baseline (0.2 = 20%%)")
+    return parser.parse_args()
+
+
+def counter(snapshot, name, **labels):
+    return sum(
+        c["value"] for c in snapshot["counters"]
+        if c["name"] == name and all(c["labels"].get(k) == str(v) for k, v in labels.items())
+    )
+
+
+def latencies(snapshot):
+    result = {}
+    for h in snapshot["histograms"]:
+        labels = ",".join(f"{k}={v}" for k, v in h["labels"].items())
+        key = f"{h['name']}{{{labels}}}" if labels else h["name"]
+        result[key] = {
+            "count": h["count"],
+            "avg": round(h["sum"] / h["count"], 4) if h["count"] else 0.0,
+            "p50": h["p50"],
+            "p95": h["p95"],
+            "max": h["max"],
+        }
+    return result
+
+
+def run_stage(name, func, count_items):
+    """Runs one stage with fresh metrics; returns (stage result dict, func's return value)."""
+    print(f"\n{'='*50}\nBenchmark stage: {name}\n{'='*50}")
+    metrics.REGISTRY.reset()
+    started = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - started
+    snapshot = metrics.REGISTRY.snapshot()
+    items = count_items(snapshot, value)
+    return {
+        "seconds": round(elapsed, 3),
+        "items": items,
+        "items_per_sec": round(items / elapsed, 2) if elapsed else 0.0,
+        "latency": latencies(snapshot),
+    }, value
+
+
+def fixture_scrape_csv(total_ads):
+    """The scrape CSV the stand-in page would yield, for runs without Chrome."""
+    records = []
+    for cursor in range(0, total_ads, ads_library_server.PAGE_SIZE):
+        page = ads_library_server.make_page(KEYWORD, cursor, total_ads)
+        records.extend(ad_to_record(node) for node in iter_ad_nodes(page))
+    return flashScraperGemini.save_csv(records, KEYWORD)
+
+
+def scrape_stage(args, results):
+    server, url = ads_library_server.start_server(total_ads=args.ads, latency=args.scroll_latency_ms / 1000)
+    flashScraperGemini.ADS_LIBRARY_URL = url
+    flashScraperGemini.SEEN_IDS_FILE = None
+    flashScraperGemini.HEADLESS = True
+
+    def scrape():
+        driver = None
+        if not args.skip_scrape:
+            try:
+                driver = flashScraperGemini.setup_driver()
+            except Exception as e:
+                print(f"Headless Chrome unavailable ({str(e).splitlines()[0][:120]}); generating the scrape CSV.")
+        if driver is None:
+            return fixture_scrape_csv(args.ads), False
+        try:
+            return flashScraperGemini.main(KEYWORD, driver=driver, depth=args.ads), True
+        finally:
+            driver.quit()
+
+    try:
+        stage, (csv_file, scraped) = run_stage(
+            "scrape (flashScraperGemini.main)", scrape,
+            lambda snapshot, value: sum(1 for _ in iter_csv(value[0])) if value[0] else 0,
+        )
+    finally:
+        server.shutdown()
+    stage["skipped"] = not scraped
+    results["scrape"] = stage
+    return csv_file
+
+
+def process_stage(args, results, workdir, scraped_csv):
+    server, base_url = external_apis.start_server(
+        detail_latency=args.detail_latency_ms / 1000,
+        upload_latency=args.upload_latency_ms / 1000,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+    )
+    ads_processor.API_URL = base_url + external_apis.DETAIL_PATH
+    ads_processor.CLOUD_FUNCTION_URL = base_url + external_apis.UPLOAD_PATH
+    ads_processor.TechnologyDetector = external_apis.FixtureTechnologyDetector
+    # Cold caches inside the work directory, so every run does the same work
+    ads_processor.DETAIL_CACHE_FILE = workdir / "ad_details.sqlite3"
+    ads_processor.TECH_CACHE_FILE = workdir / "tech_detection.sqlite3"
+    ads_processor.UPLOAD_MANIFEST_FILE = workdir / "media_manifest.sqlite3"
+    ads_processor.KNOWN_IDS_SNAPSHOT_FILE = workdir / "known_ids.sqlite3"
+
+    try:
+        stage, processed_csv = run_stage(
+            "process (ads_processor.main)",
+            lambda: ads_processor.main(scraped_csv, checkpoint=True, resume=False),
+            lambda snapshot, value: counter(snapshot, "processor_rows_total", outcome="read"),
+        )
+    finally:
+        server.shutdown()
+    stage["rows_written"] = sum(1 for _ in iter_csv(processed_csv)) if processed_csv else 0
+    stage["server_responses"] = dict(server.stats)
+    results["process"] = stage
+    return processed_csv
+
+
+def insert_stage(args, results, processed_csv):
+    stage, _ = run_stage(
+        f"insert (insertProcessedCsv.main, {args.insert_mode})",
+        lambda: insertProcessedCsv.main(processed_csv, resume=False, mode=args.insert_mode),
+        lambda snapshot, value: counter(snapshot, "db_rows_total", result="inserted"),
+    )
+    results["insert"] = stage
+
+
+def print_report(results):
+    print(f"\n{'='*72}\nOffline benchmark results\n{'='*72}")
+    for name, stage in results.items():
+        note = " (generated, Chrome unavailable)" if stage.get("skipped") else ""
+        print(f"{name:<8} {stage['seconds']:9.2f}s  {stage['items']:7} items  "
+              f"{stage['items_per_sec']:9.1f} items/sec{note}")
+        for key, h in sorted(stage["latency"].items()):
+            print(f"    {key:<58} n={h['count']:<5} avg {h['avg']:.3f}s  p95 <= {h['p95']}s  max {h['max']:.3f}s")
+
+
+def compare(results, baseline_file, tolerance):
+    """Returns the stages whose throughput dropped more than `tolerance`."""
+    with open(baseline_file, encoding="utf-8") as f:
+        baseline = json.load(f)["stages"]
+    regressions = []
+    for name, stage in results.items():
+        before = baseline.get(name)
+        if not before or stage.get("skipped") or before.get("skipped") or not before["items_per_sec"]:
+            continue
+        change = stage["items_per_sec"] / before["items_per_sec"] - 1
+        print(f"{name:<8} {before['items_per_sec']:9.1f} -> {stage['items_per_sec']:9.1f} items/sec ({change:+.1%})")
+        if change < -tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    args = parse_args()
+    workdir = Path(tempfile.mkdtemp(prefix="adscraper-bench-"))
+    output = Path(args.output).resolve() if args.output else None
+    baseline = Path(args.baseline).resolve() if args.baseline else None
+    os.chdir(workdir)
+    print(f"Working directory: {workdir}")
+
+    metrics.METRICS_JSONL_FILE = workdir / "metrics.jsonl"
+    metrics.PROMETHEUS_TEXTFILE = workdir / "adscraper.prom"
+    stand_in = StandInConnection(rtt=args.db_rtt_ms / 1000)
+    insertProcessedCsv.connect_db = lambda **overrides: stand_in
+
+    results = {}
+    scraped_csv = scrape_stage(args, results)
+    processed_csv = process_stage(args, results, workdir, scraped_csv)
+    insert_stage(args, results, processed_csv)
+    results["insert"]["db_round_trips"] = stand_in.round_trips
+
+    print_report(results)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "args": vars(args), "stages": results}, f, indent=2)
+        print(f"Results written to {output}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Throughput regression in: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
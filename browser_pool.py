@@ -0,0 +1,182 @@
+"""Pool of authenticated Chrome drivers shared across keywords."""
+import gc
+import queue
+import threading
+from contextlib import contextmanager
+
+from flashScraperGemini import setup_driver, authenticate
+
+# A driver is recycled after this many scrapes even if it never failed
+MAX_USES_PER_DRIVER = 20
+# Seconds a new driver waits for a free account before the lease fails
+SESSION_WAIT_TIMEOUT = 600
+
+
+class BrowserPool:
+    """
+    Hands out logged-in drivers and takes them back after each scrape.
+
+    Drivers are created lazily (up to `size`) and authenticated once when
+    created. A driver is only quit and replaced when a scrape reports a
+    failure or after `max_uses` leases.
+
+    With a SessionPool, every driver logs into the account the session pool
+    hands out and keeps it for its lifetime. Each lease counts as one use
+    of that account; a driver whose account becomes rate-limited or starts
+    cooling down is replaced by one on another account. An idle driver
+    keeps its account, so `size` is capped at what the accounts can serve.
+    """
+
+    def __init__(self, size=1, max_uses=MAX_USES_PER_DRIVER, driver_factory=setup_driver, sessions=None,
+                 session_timeout=SESSION_WAIT_TIMEOUT):
+        self.size = max(1, int(size))
+        if sessions is not None and self.size > sessions.capacity():
+            print(f"BrowserPool: {self.size} browsers requested, but the accounts serve "
+                  f"{sessions.capacity()} at a time; using {sessions.capacity()}.")
+            self.size = sessions.capacity()
+        self.session_timeout = session_timeout
+        self.max_uses = max(1, int(max_uses))
+        self.driver_factory = driver_factory
+        self.sessions = sessions
+        # id(driver) -> FacebookSession it is logged into
+        self._session_of = {}
+        self._idle = queue.LifoQueue()
+        self._uses = {}
+        self._created = 0
+        self._lock = threading.Lock()
+        # Only one window may go through (possibly interactive) login at a time
+        self._auth_lock = threading.Lock()
+        self._closed = False
+
+    def _create_driver(self):
+        session = None
+        if self.sessions is not None:
+            session = self.sessions.acquire(timeout=self.session_timeout)
+            if session is None:
+                print(f"BrowserPool: no account available after {self.session_timeout}s.")
+                return None
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            if session is not None:
+                self.sessions.release(session)
+            raise
+        with self._auth_lock:
+            if session is not None:
+                print(f"--- BrowserPool: authenticating new driver as {session.label} ---")
+                ok = authenticate(driver, session.auth(driver))
+            else:
+                print("--- BrowserPool: authenticating new driver ---")
+                ok = authenticate(driver)
+        if not ok:
+            driver.quit()
+            if session is not None:
+                self.sessions.report_throttled(session)
+                self.sessions.release(session)
+            return None
+        self._uses[id(driver)] = 0
+        if session is not None:
+            self._session_of[id(driver)] = session
+        return driver
+
+    def _discard(self, driver):
+        self._uses.pop(id(driver), None)
+        session = self._session_of.pop(id(driver), None)
+        if session is not None:
+            self.sessions.release(session)
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"BrowserPool: error quitting driver: {e}")
+        gc.collect()
+        with self._lock:
+            self._created -= 1
+
+    def acquire(self):
+        """Returns an authenticated driver, or None if login failed."""
+        if self._closed:
+            raise RuntimeError("BrowserPool is closed")
+
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                if self._session_usable(driver):
+                    return driver
+                print("--- BrowserPool: switching account (current one is rate-limited or cooling down) ---")
+                self._discard(driver)
+                continue
+
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+
+            if can_create:
+                break
+
+            # Every driver is busy; wait for one to come back (or be recycled)
+            try:
+                driver = self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+            self._idle.put(driver)
+
+        try:
+            driver = self._create_driver()
+        except Exception as e:
+            print(f"BrowserPool: could not start driver: {e}")
+            driver = None
+        if driver is None:
+            with self._lock:
+                self._created -= 1
+        return driver
+
+    def _session_usable(self, driver):
+        session = self._session_of.get(id(driver))
+        return session is None or self.sessions.usable(session)
+
+    def release(self, driver, failed=False):
+        """Returns a driver to the pool, recycling it on failure or when worn out."""
+        if driver is None:
+            return
+
+        self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+        session = self._session_of.get(id(driver))
+        if session is not None:
+            self.sessions.record_use(session, failed=failed)
+        if failed or self._closed or self._uses[id(driver)] >= self.max_uses:
+            reason = "failure" if failed else "max uses reached"
+            print(f"--- BrowserPool: recycling driver ({reason}) ---")
+            self._discard(driver)
+            return
+
+        self._idle.put(driver)
+
+    @contextmanager
+    def lease(self):
+        """
+        Context manager around acquire/release. An exception inside the
+        block marks the driver as failed.
+        """
+        driver = self.acquire()
+        failed = False
+        try:
+            yield driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(driver, failed=failed)
+
+    def close(self):
+        """Quits every idle driver. Leased drivers are quit when released."""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
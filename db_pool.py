@@ -0,0 +1,161 @@
+"""Pool of MariaDB connections shared by the inserter and other pipeline stages."""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from pymysql.constants.SERVER_STATUS import SERVER_STATUS_IN_TRANS
+
+DEFAULT_POOL_SIZE = 4
+# An idle connection is pinged before reuse once it sat this many seconds
+PING_AFTER = 30
+# Connections are reopened after this many seconds, before the server's wait_timeout
+MAX_LIFETIME = 3600
+
+
+class ConnectionPool:
+    """
+    Hands out open database connections and takes them back for reuse.
+
+    Connections are created lazily (up to `size`) with `connect_func`.
+    On acquire, a connection idle for more than `ping_after` seconds is
+    pinged, and one that fails the ping or is older than `max_lifetime`
+    is replaced with a new one. Releasing with `failed=True` closes the
+    connection instead of returning it.
+    """
+
+    def __init__(self, connect_func, size=DEFAULT_POOL_SIZE, ping_after=PING_AFTER,
+                 max_lifetime=MAX_LIFETIME):
+        self.connect_func = connect_func
+        self.size = max(1, int(size))
+        self.ping_after = ping_after
+        self.max_lifetime = max_lifetime
+        self._idle = queue.LifoQueue()
+        self._opened_at = {}
+        self._released_at = {}
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.connects = 0
+        self.reuses = 0
+        self.reconnects = 0
+
+    def _open(self):
+        connection = self.connect_func()
+        self.connects += 1
+        self._opened_at[id(connection)] = time.time()
+        return connection
+
+    def _discard(self, connection):
+        self._opened_at.pop(id(connection), None)
+        self._released_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def _healthy(self, connection):
+        now = time.time()
+        if now - self._opened_at.get(id(connection), now) >= self.max_lifetime:
+            return False
+        if now - self._released_at.get(id(connection), now) < self.ping_after:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception as e:
+            print(f"ConnectionPool: stale connection dropped ({e})")
+            return False
+
+    def acquire(self):
+        """Returns an open connection; raises if a new one cannot be opened."""
+        if self._closed:
+            raise RuntimeError("ConnectionPool is closed")
+
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = None
+
+            if connection is not None:
+                if self._healthy(connection):
+                    self.reuses += 1
+                    return connection
+                self._discard(connection)
+                self.reconnects += 1
+                continue
+
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                break
+
+            # Every connection is leased; wait for one to come back
+            try:
+                connection = self._idle.get(timeout=1)
+            except queue.Empty:
+                continue
+            self._idle.put(connection)
+
+        try:
+            return self._open()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def release(self, connection, failed=False):
+        """Returns a connection to the pool, closing it on failure."""
+        if connection is None:
+            return
+        if failed or self._closed:
+            self._discard(connection)
+            return
+
+        # Never hand an open transaction to the next borrower
+        if getattr(connection, "server_status", 0) & SERVER_STATUS_IN_TRANS:
+            try:
+                connection.rollback()
+            except Exception:
+                self._discard(connection)
+                return
+
+        self._released_at[id(connection)] = time.time()
+        self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager around acquire/release. An exception inside the
+        block closes the connection instead of returning it.
+        """
+        connection = self.acquire()
+        failed = False
+        try:
+            yield connection
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(connection, failed=failed)
+
+    def close(self):
+        """Closes every idle connection. Leased ones are closed when released."""
+        self._closed = True
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+    def stats_line(self, name="db pool"):
+        return (
+            f"{name}: {self.connects} connects, {self.reuses} reuses, "
+            f"{self.reconnects} stale reconnects"
+        )
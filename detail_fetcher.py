@@ -0,0 +1,282 @@
+"""Concurrent fetch engine for the getAdDetailsVirginia detail API."""
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import metrics
+from http_client import create_session, DEFAULT_TIMEOUT
+from rate_limiter import get_limiter, request_with_retry
+
+# Maximum detail requests in flight at the same time
+DEFAULT_CONCURRENCY = 8
+
+# IDs per ?ids= request: starting size and bounds the controller adapts within
+DEFAULT_BATCH_SIZE = 20
+MIN_BATCH_SIZE = 1
+MAX_BATCH_SIZE = 200
+# Longest request URL sent (API Gateway/CloudFront reject URLs around 8 KB)
+URL_LENGTH_BUDGET = 4000
+# Response time the batch size is tuned towards (API Gateway gives up at 29s)
+TARGET_LATENCY = 6.0  # seconds
+# Retries per half once a failing batch is being split to isolate bad IDs
+SPLIT_RETRIES = 0
+
+
+def build_lookup(api_data):
+    """
+    Create a lookup dictionary for API results.
+    The API returns 'LibraryID' (capital L) usually, or 'id'.
+    """
+    api_lookup = {}
+    if isinstance(api_data, list):
+        for item in api_data:
+            # Handle potential key differences
+            lib_id = item.get('LibraryID') or item.get('id')
+            if lib_id:
+                api_lookup[str(lib_id)] = item
+    return api_lookup
+
+
+def batch_specific_error(error):
+    """
+    True if the failure may come from the IDs in the request (a 4xx other
+    than 429, e.g. 400/413/414, or an invalid payload) rather than from
+    the service being unavailable, so splitting the batch can help.
+    """
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return 400 <= status < 500 and status != 429
+    return isinstance(error, ValueError)
+
+
+class BatchSizeController:
+    """
+    Picks how many LibraryIDs go into one detail request.
+
+    The size grows by a quarter after every response faster than
+    `target_latency`, shrinks in proportion when a response is slower, and
+    halves when a request fails. `plan` also keeps every request URL within
+    `url_budget` characters, whatever the size.
+    """
+
+    def __init__(self, base_url, initial=DEFAULT_BATCH_SIZE, min_size=MIN_BATCH_SIZE,
+                 max_size=MAX_BATCH_SIZE, url_budget=URL_LENGTH_BUDGET, target_latency=TARGET_LATENCY):
+        self.base_length = len(base_url) + len("?ids=")
+        self.min_size = max(1, int(min_size))
+        self.max_size = max(self.min_size, int(max_size))
+        self.url_budget = url_budget
+        self.target_latency = target_latency
+        self._size = float(min(max(initial, self.min_size), self.max_size))
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.ids_requested = 0
+        self.failures = 0
+
+    @property
+    def size(self):
+        return int(self._size)
+
+    def plan(self, ids):
+        """Splits `ids` into request-sized chunks (by count and URL length)."""
+        chunks = []
+        chunk = []
+        length = self.base_length
+        size = self.size
+        for lib_id in ids:
+            extra = len(lib_id) + (1 if chunk else 0)
+            if chunk and (len(chunk) >= size or length + extra > self.url_budget):
+                chunks.append(chunk)
+                chunk = []
+                length = self.base_length
+                extra = len(lib_id)
+            chunk.append(lib_id)
+            length += extra
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def record(self, count, latency):
+        """Feeds back one successful request of `count` IDs that took `latency` seconds."""
+        with self._lock:
+            self.requests += 1
+            self.ids_requested += count
+            # Only (nearly) full requests say something about the current size
+            if count < self.size * 0.75 and latency <= self.target_latency:
+                return
+            if latency <= self.target_latency:
+                self._size = min(self.max_size, self._size * 1.25 + 1)
+            else:
+                self._size = max(self.min_size, self._size * self.target_latency / latency)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._size = max(self.min_size, self._size / 2)
+
+    def stats_line(self):
+        with self._lock:
+            average = self.ids_requested / self.requests if self.requests else 0
+            return (
+                f"Detail batching: {self.requests} requests, {average:.1f} IDs/request, "
+                f"{self.failures} failed, current size {self.size}"
+            )
+
+
+class DetailFetcher:
+    """
+    Fetches ad details for batches of LibraryIDs over a pooled keep-alive
+    session, with at most `concurrency` requests in flight.
+
+    With a `cache` (see ttl_cache.PersistentTTLCache) only IDs that are
+    missing or stale are requested, and fresh responses are stored back.
+
+    Requests are paced by the endpoint's shared AdaptiveRateLimiter and
+    throttled ones are retried. The IDs of consecutive batches are merged
+    into requests sized by a BatchSizeController; a request rejected
+    because of its IDs (see batch_specific_error) is split in halves until
+    the IDs breaking it are isolated. Other failures are not split.
+    """
+
+    def __init__(self, api_url, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, cache=None,
+                 limiter=None, batcher=None):
+        self.api_url = api_url
+        self.limiter = limiter or get_limiter(api_url)
+        self.batcher = batcher or BatchSizeController(api_url)
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.cache = cache
+        self.session = create_session(pool_size=self.concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="detail-api"
+        )
+
+    def fetch_batch(self, ids_list):
+        """Returns the api_lookup dict for one batch. Failed IDs are left out."""
+        if not ids_list:
+            return {}
+
+        api_lookup = {}
+        missing = ids_list
+        if self.cache is not None:
+            api_lookup = self.cache.get_many(ids_list)
+            missing = [lib_id for lib_id in ids_list if lib_id not in api_lookup]
+        api_lookup.update(self._fetch_missing(missing)[0])
+        return api_lookup
+
+    def _fetch_missing(self, ids_list):
+        """
+        Requests IDs not in the cache, in controller-sized chunks, and caches
+        the results. Returns (fetched, failed): `failed` holds the IDs whose
+        request failed, as opposed to IDs the API simply has no details for.
+        """
+        fetched = {}
+        failed = set()
+        metrics.inc("detail_ids_requested_total", len(ids_list))
+        for chunk in self.batcher.plan(ids_list):
+            lookup, chunk_failed = self._request(chunk)
+            fetched.update(lookup)
+            failed.update(chunk_failed)
+        if self.cache is not None and fetched:
+            self.cache.set_many(fetched)
+        if failed:
+            metrics.inc("detail_ids_failed_total", len(failed))
+        return fetched, failed
+
+    def _request(self, ids_list, retries=None):
+        """Returns (api_lookup, failed IDs) for one ?ids= request, splitting it if its IDs break it."""
+        ids_query_string = ",".join(ids_list)
+        try:
+            kwargs = {"max_retries": retries} if retries is not None else {}
+            response = request_with_retry(
+                self.session, f"{self.api_url}?ids={ids_query_string}", self.limiter,
+                timeout=self.timeout, **kwargs
+            )
+            response.raise_for_status()
+            api_data = response.json()
+            if not isinstance(api_data, list):
+                raise ValueError(f"unexpected response {str(api_data)[:200]}")
+        except Exception as e:
+            if retries is None:
+                # Only the original request says something about the batch size
+                self.batcher.record_failure()
+            if not batch_specific_error(e):
+                # Throttling, 5xx or timeouts after every retry: splitting would only
+                # multiply the failing requests, so the batch goes without details
+                print(f"API Request failed for {len(ids_list)} IDs: {str(e)[:80]}")
+                return {}, list(ids_list)
+            if len(ids_list) > 1:
+                # Isolate the IDs that break the request; the rest still get details
+                print(f"API Request failed for {len(ids_list)} IDs ({str(e)[:80]}); splitting the batch.")
+                middle = len(ids_list) // 2
+                api_lookup, failed = self._request(ids_list[:middle], SPLIT_RETRIES)
+                more_lookup, more_failed = self._request(ids_list[middle:], SPLIT_RETRIES)
+                api_lookup.update(more_lookup)
+                return api_lookup, failed + more_failed
+            print(f"API Request failed for IDs {ids_query_string}: {str(e)[:80]}")
+            return {}, list(ids_list)
+
+        self.batcher.record(len(ids_list), response.elapsed.total_seconds())
+        return build_lookup(api_data), []
+
+    def iter_lookups(self, id_batches):
+        """
+        Takes `(tag, ids_list)` pairs and yields `(tag, api_lookup, failed)`
+        in the same order; `tag` is passed through untouched (e.g. the row
+        batch) and `failed` is the set of its IDs whose request failed.
+
+        Cache hits are looked up right away; the missing IDs of consecutive
+        batches are pooled until they fill a request of the controller's
+        current size. Each lookup is yielded as soon as it and every
+        earlier one are done, while requests for later batches keep running;
+        reading ahead only blocks once a window of requests is in flight, so
+        `id_batches` may be a lazy stream.
+        """
+        window = self.concurrency * 2
+        pending = deque()
+        group = []
+        missing = []
+        total = 0
+
+        def submit():
+            future = self._executor.submit(self._fetch_missing, missing) if missing else None
+            pending.append((group, future))
+
+        def done(entry):
+            return entry[1] is None or entry[1].done()
+
+        def resolve(entry):
+            batches, future = entry
+            fetched, failed = future.result() if future is not None else ({}, set())
+            for tag, ids_list, api_lookup in batches:
+                api_lookup.update((lib_id, fetched[lib_id]) for lib_id in ids_list if lib_id in fetched)
+                yield tag, api_lookup, {lib_id for lib_id in ids_list if lib_id in failed}
+
+        for tag, ids_list in id_batches:
+            cached = self.cache.get_many(ids_list) if self.cache is not None and ids_list else {}
+            group.append((tag, ids_list, cached))
+            missing.extend(lib_id for lib_id in ids_list if lib_id not in cached)
+            total += len(ids_list)
+            if len(missing) >= self.batcher.size or total >= self.batcher.max_size:
+                submit()
+                group, missing, total = [], [], 0
+            # Hand out finished lookups right away; only block once the window is full
+            while pending and (len(pending) >= window or done(pending[0])):
+                yield from resolve(pending.popleft())
+
+        if group:
+            submit()
+        while pending:
+            yield from resolve(pending.popleft())
+
+    def fetch_all(self, id_batches):
+        """Fetches every list of IDs concurrently and merges them into one api_lookup."""
+        api_lookup = {}
+        for _, lookup, _ in self.iter_lookups((None, ids_list) for ids_list in id_batches):
+            api_lookup.update(lookup)
+        return api_lookup
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
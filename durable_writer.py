@@ -0,0 +1,169 @@
+"""Group-commit CSV writer backed by an append-only journal."""
+import csv
+import json
+import os
+import time
+
+# Rows per group commit
+DEFAULT_GROUP_ROWS = 50
+# Maximum seconds a written row may wait for its group commit
+DEFAULT_GROUP_INTERVAL = 1.0
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def journal_path_for(filepath):
+    return f"{filepath}{JOURNAL_SUFFIX}"
+
+
+def recover(filepath, fieldnames):
+    """
+    Rebuilds `filepath` from its journal after a crash. Returns the number
+    of rows recovered, or None when there is no journal.
+
+    The journal holds every committed row since the CSV was created; a
+    torn last line (crash mid-append) was never acknowledged and is ignored.
+    """
+    journal_path = journal_path_for(filepath)
+    if not os.path.exists(journal_path):
+        return None
+
+    rows = []
+    with open(journal_path, mode='r', encoding='utf-8') as journal:
+        for line in journal:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+
+    # Drop the torn tail so later appends start on a clean line
+    tmp_journal = f"{journal_path}.tmp"
+    with open(tmp_journal, mode='w', encoding='utf-8') as journal:
+        journal.write("".join(json.dumps(row, default=str) + "\n" for row in rows))
+        journal.flush()
+        os.fsync(journal.fileno())
+    os.replace(tmp_journal, journal_path)
+
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, mode='w', newline='', encoding='utf-8') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(tmp_path, filepath)
+    return len(rows)
+
+
+def rejournal(filepath):
+    """
+    Rebuilds the journal of a cleanly closed CSV from its rows, so the pair
+    can be resumed (appended to) again. Returns the number of rows, or None
+    when the CSV does not exist.
+    """
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath, mode='r', newline='', encoding='utf-8') as infile:
+        rows = list(csv.DictReader(infile))
+    journal_path = journal_path_for(filepath)
+    tmp_journal = f"{journal_path}.tmp"
+    with open(tmp_journal, mode='w', encoding='utf-8') as journal:
+        journal.write("".join(json.dumps(row) + "\n" for row in rows))
+        journal.flush()
+        os.fsync(journal.fileno())
+    os.replace(tmp_journal, journal_path)
+    return len(rows)
+
+
+class GroupCommitCsvWriter:
+    """
+    CSV writer that makes rows durable in groups instead of one fsync per row.
+
+    Rows are buffered until `group_rows` are pending or `group_interval`
+    seconds passed since the oldest one, then committed: appended to the
+    journal as JSON lines with a single fsync, and written to the CSV.
+    A row is acknowledged once its group commit returns (`committed_rows`);
+    a crash loses no acknowledged rows because `recover` replays the
+    journal. A clean `close` syncs the CSV and removes the journal.
+
+    With `resume`, an existing CSV/journal pair is recovered and appended to.
+    `on_commit()` is called after every group commit, once its rows are durable.
+    """
+
+    def __init__(self, filepath, fieldnames, group_rows=DEFAULT_GROUP_ROWS,
+                 group_interval=DEFAULT_GROUP_INTERVAL, resume=False, on_commit=None):
+        self.filepath = filepath
+        self.on_commit = on_commit
+        self.fieldnames = fieldnames
+        self.group_rows = max(1, int(group_rows))
+        self.group_interval = group_interval
+        self.journal_path = journal_path_for(filepath)
+        self.committed_rows = 0
+        self.commits = 0
+        self._pending = []
+        self._oldest_pending = None
+
+        recovered = recover(filepath, fieldnames) if resume else None
+        if recovered is not None:
+            print(f"Recovered {recovered} rows of {filepath} from its journal.")
+            self.committed_rows = recovered
+            self._csv = open(filepath, mode='a', newline='', encoding='utf-8')
+            self._journal = open(self.journal_path, mode='a', encoding='utf-8')
+            self._writer = csv.DictWriter(self._csv, fieldnames=fieldnames)
+        else:
+            self._csv = open(filepath, mode='w', newline='', encoding='utf-8')
+            self._journal = open(self.journal_path, mode='w', encoding='utf-8')
+            self._writer = csv.DictWriter(self._csv, fieldnames=fieldnames)
+            self._writer.writeheader()
+
+    def writerow(self, row):
+        """Buffers a row; commits the group when it is full or old enough."""
+        if not self._pending:
+            self._oldest_pending = time.time()
+        self._pending.append(row)
+
+        if (len(self._pending) >= self.group_rows
+                or time.time() - self._oldest_pending >= self.group_interval):
+            self.commit()
+
+    def commit(self):
+        """Makes every pending row durable with one journal fsync."""
+        if not self._pending:
+            return
+
+        self._journal.write(
+            "".join(json.dumps(row, default=str) + "\n" for row in self._pending)
+        )
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+        self._writer.writerows(self._pending)
+        self._csv.flush()
+
+        self.committed_rows += len(self._pending)
+        self.commits += 1
+        self._pending = []
+        self._oldest_pending = None
+        if self.on_commit is not None:
+            self.on_commit()
+
+    def close(self):
+        """Commits the last group, syncs the CSV and drops the journal."""
+        self.commit()
+        self._csv.flush()
+        os.fsync(self._csv.fileno())
+        self._csv.close()
+        self._journal.close()
+        os.remove(self.journal_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Keep the journal so the committed rows can be recovered
+            self.commit()
+            self._csv.close()
+            self._journal.close()
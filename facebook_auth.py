@@ -21,6 +21,29 @@ load_dotenv()
 # Ruta para guardar cookies
 COOKIES_DIR = Path(__file__).parent / "cookies"
 COOKIES_FILE = COOKIES_DIR / "fb_cookies.json"
+# Última verificación completa de la sesión (para no repetirla en cada driver)
+SESSION_STATE_FILE = COOKIES_DIR / "fb_session.json"
+
+# Cookies sin las cuales no hay sesión de Facebook
+SESSION_COOKIES = ("c_user", "xs")
+# Tras una verificación completa exitosa, las mismas cookies se dan por válidas este tiempo
+SESSION_VERIFY_WINDOW = 30 * 60  # segundos
+# Selectores que solo aparecen con sesión activa
+LOGGED_IN_SELECTORS = [
+    (By.CSS_SELECTOR, "[aria-label='Facebook']"),
+    (By.CSS_SELECTOR, "[aria-label='Home']"),
+    (By.CSS_SELECTOR, "[aria-label='Your profile']"),
+    (By.CSS_SELECTOR, "[role='navigation']"),
+    (By.XPATH, "//a[contains(@href, '/me/')]"),
+]
+
+
+def session_state_file(cookies_file):
+    """Archivo con la última verificación de las cookies de `cookies_file`."""
+    cookies_file = Path(cookies_file)
+    if cookies_file == COOKIES_FILE:
+        return SESSION_STATE_FILE
+    return cookies_file.with_name(cookies_file.stem + "_session.json")
 
 
 class FacebookAuth:
@@ -28,15 +51,21 @@ class FacebookAuth:
     Clase para manejar autenticación de Facebook con persistencia de cookies.
     """
     
-    def __init__(self, driver=None):
-        self.email = os.getenv("FB_EMAIL")
-        self.password = os.getenv("FB_PASSWORD")
+    def __init__(self, driver=None, email=None, password=None, cookies_file=None):
+        """
+        Sin argumentos usa la cuenta de .env (FB_EMAIL, FB_PASSWORD) y
+        COOKIES_FILE; otra cuenta (ver session_pool) pasa los suyos.
+        """
+        self.email = email or os.getenv("FB_EMAIL")
+        self.password = password or os.getenv("FB_PASSWORD")
+        self.cookies_file = Path(cookies_file) if cookies_file else COOKIES_FILE
+        self.session_state_file = session_state_file(self.cookies_file)
         self.driver = driver
         self._ensure_cookies_dir()
     
     def _ensure_cookies_dir(self):
         """Asegura que el directorio de cookies exista."""
-        COOKIES_DIR.mkdir(parents=True, exist_ok=True)
+        self.cookies_file.parent.mkdir(parents=True, exist_ok=True)
     
     @staticmethod
     def create_driver_for_auth():
@@ -83,9 +112,9 @@ class FacebookAuth:
         
         try:
             cookies = driver.get_cookies()
-            with open(COOKIES_FILE, 'w') as f:
+            with open(self.cookies_file, 'w') as f:
                 json.dump(cookies, f, indent=2)
-            print(f"🍪 Cookies guardadas en: {COOKIES_FILE}")
+            print(f"🍪 Cookies guardadas en: {self.cookies_file}")
             return True
         except Exception as e:
             print(f"❌ Error al guardar cookies: {e}")
@@ -100,33 +129,155 @@ class FacebookAuth:
             print("❌ No hay driver disponible para cargar cookies.")
             return False
         
-        if not COOKIES_FILE.exists():
+        if not self.cookies_file.exists():
             print("ℹ️ No hay cookies guardadas previamente.")
             return False
         
         try:
-            # Primero navegar a Facebook para poder agregar cookies del dominio
-            driver.get("https://www.facebook.com/")
-            time.sleep(2)
-            
-            with open(COOKIES_FILE, 'r') as f:
+            with open(self.cookies_file, 'r') as f:
                 cookies = json.load(f)
             
-            for cookie in cookies:
-                # Algunos campos pueden causar problemas, los removemos
-                cookie.pop('sameSite', None)
-                cookie.pop('expiry', None)
-                try:
-                    driver.add_cookie(cookie)
-                except Exception:
-                    pass  # Ignorar cookies que no se puedan agregar
+            # Vía CDP se pueden agregar sin abrir facebook.com antes
+            if not self._set_cookies_cdp(driver, cookies):
+                # Primero navegar a Facebook para poder agregar cookies del dominio
+                driver.get("https://www.facebook.com/")
+                self._wait_page_ready(driver)
+                
+                for cookie in cookies:
+                    # Algunos campos pueden causar problemas, los removemos
+                    cookie.pop('sameSite', None)
+                    cookie.pop('expiry', None)
+                    try:
+                        driver.add_cookie(cookie)
+                    except Exception:
+                        pass  # Ignorar cookies que no se puedan agregar
             
-            print(f"🍪 Cookies cargadas desde: {COOKIES_FILE}")
+            print(f"🍪 Cookies cargadas desde: {self.cookies_file}")
             return True
         except Exception as e:
             print(f"❌ Error al cargar cookies: {e}")
             return False
     
+    @staticmethod
+    def _set_cookies_cdp(driver, cookies):
+        """Agrega las cookies con Network.setCookies. Retorna False si CDP no está disponible."""
+        params = []
+        for cookie in cookies:
+            param = {
+                "name": cookie["name"],
+                "value": cookie["value"],
+                "domain": cookie.get("domain", ".facebook.com"),
+                "path": cookie.get("path", "/"),
+                "secure": cookie.get("secure", True),
+                "httpOnly": cookie.get("httpOnly", False),
+            }
+            if cookie.get("expiry"):
+                param["expires"] = cookie["expiry"]
+            params.append(param)
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": params})
+            return True
+        except Exception:
+            return False
+    
+    @staticmethod
+    def _wait_page_ready(driver, timeout=10):
+        """Espera a que el documento termine de cargar (en lugar de un sleep fijo)."""
+        try:
+            WebDriverWait(driver, timeout).until(
+                lambda d: d.execute_script("return document.readyState") != "loading"
+            )
+        except TimeoutException:
+            pass
+    
+    def saved_session_valid(self, now=None):
+        """
+        Revisa fb_cookies.json sin abrir el navegador: las cookies de sesión
+        (SESSION_COOKIES) deben existir y no estar vencidas.
+        """
+        if not self.cookies_file.exists():
+            return False
+        try:
+            with open(self.cookies_file, 'r') as f:
+                cookies = {cookie["name"]: cookie for cookie in json.load(f)}
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        
+        now = now or time.time()
+        for name in SESSION_COOKIES:
+            cookie = cookies.get(name)
+            if not cookie or not cookie.get("value"):
+                return False
+            if cookie.get("expiry") and cookie["expiry"] <= now:
+                return False
+        return True
+    
+    def recently_verified(self, window=SESSION_VERIFY_WINDOW):
+        """True si las cookies guardadas pasaron la verificación completa hace menos de `window` segundos."""
+        try:
+            with open(self.session_state_file, 'r') as f:
+                state = json.load(f)
+            cookies_mtime = self.cookies_file.stat().st_mtime
+        except (OSError, ValueError):
+            return False
+        # Si las cookies cambiaron desde la verificación, esta ya no aplica
+        if state.get("cookies_mtime") != cookies_mtime:
+            return False
+        return time.time() - state.get("verified_at", 0) < window
+    
+    def mark_verified(self):
+        """Recuerda que las cookies guardadas acaban de pasar la verificación completa."""
+        try:
+            state = {"verified_at": time.time(), "cookies_mtime": self.cookies_file.stat().st_mtime}
+            with open(self.session_state_file, 'w') as f:
+                json.dump(state, f)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el estado de la sesión: {e}")
+    
+    @staticmethod
+    def driver_has_session(driver):
+        """True si el driver tiene las cookies de sesión, sin navegar."""
+        try:
+            result = driver.execute_cdp_cmd("Network.getCookies", {"urls": ["https://www.facebook.com/"]})
+            names = {cookie["name"] for cookie in result.get("cookies", [])}
+        except Exception:
+            try:
+                names = {cookie["name"] for cookie in driver.get_cookies()}
+            except Exception:
+                return False
+        return all(name in names for name in SESSION_COOKIES)
+    
+    def ensure_session(self, driver=None, verify_window=SESSION_VERIFY_WINDOW):
+        """
+        Deja el driver con sesión activa, haciendo la verificación más barata posible:
+        1. Si las cookies guardadas están vencidas o incompletas, login directo.
+        2. Si no, las carga; si fueron verificadas hace menos de `verify_window`, listo.
+        3. Si no, verificación completa en facebook.com (y se recuerda si pasa).
+        Retorna True si hay sesión activa.
+        """
+        driver = driver or self.driver
+        if not driver:
+            print("❌ No hay driver disponible.")
+            return False
+        
+        if self.saved_session_valid():
+            if self.load_cookies(driver):
+                if self.recently_verified(verify_window) and self.driver_has_session(driver):
+                    print("✅ Sesión verificada recientemente, se omite la verificación completa.")
+                    return True
+                if self.is_logged_in(driver):
+                    self.mark_verified()
+                    return True
+                print("⚠️ Cookies expiradas o inválidas. Se requiere nuevo login.")
+        else:
+            print("ℹ️ Cookies guardadas ausentes o vencidas.")
+        
+        print("🔑 Se requiere login interactivo...")
+        if not self.perform_login(driver):
+            return False
+        self.mark_verified()
+        return True
+    
     def is_logged_in(self, driver=None):
         """
         Verifica si el usuario está logueado en Facebook.
@@ -138,35 +289,25 @@ class FacebookAuth:
         try:
             # Navegar a Facebook y verificar elementos que solo aparecen logueado
             driver.get("https://www.facebook.com/")
-            time.sleep(3)
-            
-            # Lista de selectores que indican sesión activa
-            logged_in_selectors = [
-                (By.CSS_SELECTOR, "[aria-label='Facebook']"),
-                (By.CSS_SELECTOR, "[aria-label='Home']"),
-                (By.CSS_SELECTOR, "[aria-label='Your profile']"),
-                (By.CSS_SELECTOR, "[role='navigation']"),
-                (By.XPATH, "//a[contains(@href, '/me/')]"),
-            ]
             
-            for by, selector in logged_in_selectors:
-                try:
-                    WebDriverWait(driver, 5).until(
-                        EC.presence_of_element_located((by, selector))
-                    )
-                    print("✅ Sesión de Facebook activa.")
-                    return True
-                except TimeoutException:
-                    continue
+            # Una sola espera por cualquiera de los selectores (o el campo de login)
+            def session_state(d):
+                for by, selector in LOGGED_IN_SELECTORS:
+                    if d.find_elements(by, selector):
+                        return "logged_in"
+                if d.find_elements(By.ID, "email"):
+                    return "login_form"
+                return False
             
-            # Si llegamos aquí, verificar si hay campo de login (no logueado)
             try:
-                driver.find_element(By.ID, "email")
-                print("ℹ️ No hay sesión activa (campo de login encontrado).")
+                state = WebDriverWait(driver, 15).until(session_state)
+            except TimeoutException:
                 return False
-            except:
-                pass
             
+            if state == "logged_in":
+                print("✅ Sesión de Facebook activa.")
+                return True
+            print("ℹ️ No hay sesión activa (campo de login encontrado).")
             return False
             
         except Exception as e:
@@ -317,58 +458,39 @@ class FacebookAuth:
         
         print("🔐 Iniciando proceso de autenticación de Facebook...")
         
-        # Intentar cargar cookies existentes
-        if COOKIES_FILE.exists():
-            print("📂 Encontradas cookies guardadas, intentando cargar...")
-            if self.load_cookies(driver):
-                # Verificar si las cookies son válidas
-                driver.refresh()
-                time.sleep(3)
-                
-                if self.is_logged_in(driver):
-                    print("✅ Autenticación exitosa con cookies guardadas!")
-                    return driver
-                else:
-                    print("⚠️ Cookies expiradas o inválidas. Se requiere nuevo login.")
-        
-        # Si llegamos aquí, necesitamos hacer login
-        print("🔑 Se requiere login interactivo...")
-        
-        if not self.email or not self.password:
+        if not self.saved_session_valid() and (not self.email or not self.password):
             print("❌ Error: Credenciales no configuradas en .env (FB_EMAIL, FB_PASSWORD)")
             driver.quit()
             return None
         
-        if self.perform_login(driver):
+        if self.ensure_session(driver):
+            print("✅ Autenticación exitosa!")
             return driver
         else:
             driver.quit()
             return None
     
-    def open_new_tab_for_scraping(self, driver, url):
+    def open_new_tab_for_scraping(self, driver, url, wait_loaded=True, timeout=10):
         """
         Abre una nueva pestaña y navega a la URL especificada.
-        Retorna el handle de la nueva pestaña.
+        Retorna el handle de la nueva pestaña (la deja activa).
+        Con wait_loaded=False no espera la carga: la pestaña sigue cargando
+        mientras se abren otras.
         """
         try:
-            # Guardar handle original
-            original_handle = driver.current_window_handle
-            
-            # Abrir nueva pestaña
-            driver.execute_script("window.open('');")
-            time.sleep(1)
-            
-            # Cambiar a la nueva pestaña
-            new_handle = [h for h in driver.window_handles if h != original_handle][-1]
+            # window_handles no tiene un orden garantizado: la nueva pestaña es
+            # el handle que no existía antes de abrirla
+            before = set(driver.window_handles)
+            driver.execute_script("window.open(arguments[0], '_blank');", url)
+            WebDriverWait(driver, timeout).until(lambda d: set(d.window_handles) - before)
+            new_handle = (set(driver.window_handles) - before).pop()
             driver.switch_to.window(new_handle)
-            
-            # Navegar a la URL
             print(f"🌐 Navegando a: {url}")
-            driver.get(url)
-            time.sleep(3)
-            
+
+            if wait_loaded:
+                self._wait_page_ready(driver, timeout)
             return new_handle
-            
+
         except Exception as e:
             print(f"❌ Error abriendo nueva pestaña: {e}")
             return None
@@ -0,0 +1,150 @@
+"""
+Local stand-in for the Ads Library search page and its GraphQL endpoint.
+
+Serves fixtures/ads_library/index.html at /ads/library/ with the first
+results page embedded, and further pages from /api/graphql/ as the page
+scrolls, in the payload shape the real endpoint uses. Ads are generated
+deterministically per search keyword.
+
+Usage: python fixtures/ads_library_server.py [port] [total_ads] [latency_ms]
+Then point flashScraperGemini.ADS_LIBRARY_URL at http://127.0.0.1:<port>/ads/library/
+"""
+import hashlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "ads_library"
+
+DEFAULT_TOTAL_ADS = 300
+PAGE_SIZE = 30
+# Newest generated ad starts running at this epoch; each next one a day earlier
+LATEST_START = 1767225600
+
+
+def keyword_base_id(keyword):
+    digest = hashlib.sha1(keyword.encode("utf-8")).hexdigest()
+    return 1000000000000000 + (int(digest[:8], 16) % 10**9) * 1000
+
+
+def make_ad(keyword, index):
+    library_id = str(keyword_base_id(keyword) + index)
+    video = index % 3 == 0
+    snapshot = {
+        "body": {"text": f"{keyword} offer number {index}"},
+        "title": f"{keyword.title()} deal {index}",
+        "cta_text": "Shop now",
+        "cta_type": "SHOP_NOW",
+        "link_url": f"https://shop{index % 40}.example.com/products/{index}",
+        "page_profile_uri": f"https://www.facebook.com/page{index % 25}/",
+        "page_profile_picture_url": f"https://scontent.example.net/profile/{index % 25}.jpg",
+        "videos": [],
+        "images": [],
+        "cards": [],
+    }
+    if video:
+        snapshot["videos"].append({
+            "video_hd_url": f"https://video.example.net/{library_id}_hd.mp4",
+            "video_sd_url": f"https://video.example.net/{library_id}_sd.mp4",
+            "video_preview_image_url": f"https://scontent.example.net/preview/{library_id}.jpg",
+        })
+    else:
+        snapshot["images"].append({
+            "original_image_url": f"https://scontent.example.net/ads/{library_id}.jpg",
+            "resized_image_url": f"https://scontent.example.net/ads/{library_id}_600.jpg",
+        })
+    return {
+        "ad_archive_id": library_id,
+        "collation_count": 1 + index % 4,
+        "collation_id": str(9000 + index),
+        "start_date": LATEST_START - index * 86400,
+        "end_date": None,
+        "is_active": True,
+        "page_id": str(500000 + index % 25),
+        "page_name": f"Page {index % 25}",
+        "publisher_platform": ["FACEBOOK", "INSTAGRAM"],
+        "snapshot": snapshot,
+    }
+
+
+def make_page(keyword, cursor, total_ads, page_size=PAGE_SIZE):
+    start = int(cursor or 0)
+    end = min(start + page_size, total_ads)
+    edges = [{"node": {"collated_results": [make_ad(keyword, i)]}} for i in range(start, end)]
+    return {
+        "data": {
+            "ad_library_main": {
+                "search_results_connection": {
+                    "count": total_ads,
+                    "edges": edges,
+                    "page_info": {"end_cursor": str(end), "has_next_page": end < total_ads},
+                }
+            }
+        }
+    }
+
+
+class AdsLibraryHandler(BaseHTTPRequestHandler):
+    total_ads = DEFAULT_TOTAL_ADS
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type):
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _graphql(self):
+        query = parse_qs(urlsplit(self.path).query)
+        keyword = query.get("q", [""])[0]
+        cursor = query.get("cursor", ["0"])[0]
+        time.sleep(self.latency)
+        page = make_page(keyword, cursor, self.total_ads)
+        self._send("for (;;);" + json.dumps(page), "application/json")
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path.startswith("/api/graphql"):
+            return self._graphql()
+        if parts.path.rstrip("/") in ("", "/ads/library"):
+            keyword = parse_qs(parts.query).get("q", [""])[0]
+            first_page = json.dumps(make_page(keyword, 0, self.total_ads))
+            html = (FIXTURE_DIR / "index.html").read_text(encoding="utf-8")
+            return self._send(html.replace("__FIRST_PAGE__", first_page.replace("</", "<\\/")),
+                              "text/html; charset=utf-8")
+        self.send_error(404)
+
+    def do_POST(self):
+        if urlsplit(self.path).path.startswith("/api/graphql"):
+            return self._graphql()
+        self.send_error(404)
+
+
+def start_server(port=0, total_ads=DEFAULT_TOTAL_ADS, latency=0.0):
+    """Starts the stand-in on a background thread. Returns (server, base_url)."""
+    handler = type("Handler", (AdsLibraryHandler,), {"total_ads": total_ads, "latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, name="ads-library-standin", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/ads/library/"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_TOTAL_ADS
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server, url = start_server(port, total, latency_ms / 1000)
+    print(f"Ads Library stand-in at {url} ({total} ads per keyword)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,199 @@
+"""
+Local stand-in for the remote MariaDB behind insertProcessedCsv.DB_CONFIG.
+
+Every statement costs one simulated round trip of `rtt` seconds plus
+upload time at UPLOAD_BYTES_PER_SEC. That is what dominates insert
+throughput against the real, remote server. By default nothing is stored
+and SELECTs find no rows.
+
+With `store=True` the stand-in keeps the LibraryIDs of inserted rows with
+transaction semantics (commit, rollback, savepoints), and SELECT ... IN
+finds them, so tests can check what a run really committed. `fail_on(sql)`
+may return an exception to raise for a statement (a bad row, a lost
+connection); a failed statement changes nothing, as in InnoDB.
+
+    stand_in = StandInConnection(rtt=0.04)
+    insertProcessedCsv.connect_db = lambda **overrides: stand_in
+"""
+import os
+import time
+
+from pymysql.converters import escape_item
+
+from schema import DB_FIELDS
+
+LIBRARY_ID_INDEX = DB_FIELDS.index('LibraryID')
+
+
+def split_values(sql):
+    """Splits the VALUES (...),(...) of a multi-row INSERT into lists of literals."""
+    rows, values, token = [], [], []
+    depth = 0
+    quoted = escaped = False
+    for char in sql[sql.index(" VALUES ") + 8:]:
+        if quoted:
+            token.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == "'":
+                quoted = False
+        elif char == "'":
+            quoted = True
+            token.append(char)
+        elif char == "(":
+            depth += 1
+            if depth == 1:
+                values, token = [], []
+            else:
+                token.append(char)
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                values.append("".join(token).strip())
+                rows.append(values)
+            else:
+                token.append(char)
+        elif char == "," and depth == 1:
+            values.append("".join(token).strip())
+            token = []
+        elif depth >= 1:
+            token.append(char)
+        elif rows and depth == 0 and char.isalpha():
+            break  # ON DUPLICATE KEY UPDATE ...
+    return rows
+
+
+def _unquote(literal):
+    return literal[1:-1] if literal.startswith("'") else literal
+
+UPLOAD_BYTES_PER_SEC = 2 * 1024 * 1024
+
+
+class StandInCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._result = []
+
+    def _round_trip(self, sent_bytes):
+        self.connection.round_trips += 1
+        self.connection.sent_bytes += sent_bytes
+        time.sleep(self.connection.rtt + sent_bytes / UPLOAD_BYTES_PER_SEC)
+
+    def execute(self, sql, args=None):
+        if args is not None:
+            sql = sql % tuple(self.connection.literal(arg) for arg in args)
+        sent_bytes = len(sql.encode('utf-8'))
+        self._result = []
+        if "@@max_allowed_packet" in sql:
+            self._result = [{'max_packet': self.connection.max_packet}]
+        elif sql.startswith("LOAD DATA"):
+            sent_bytes += os.path.getsize(args[0])
+        self._round_trip(sent_bytes)
+        if self.connection.store:
+            return self.connection.apply(sql, self)
+        self.connection.check(sql)
+        return sql.count("),(") + 1 if sql.startswith("INSERT") else 0
+
+    def executemany(self, sql, args_list):
+        # pymysql folds INSERT ... VALUES executemany into one multi-row statement
+        values = ','.join(
+            '(' + ','.join(self.connection.literal(v) for v in args) + ')' for args in args_list
+        )
+        self._round_trip(len(sql) + len(values.encode('utf-8')))
+        statement = sql[:sql.index(" VALUES ") + 8] + values
+        if self.connection.store:
+            return self.connection.apply(statement, self)
+        self.connection.check(statement)
+        return len(args_list)
+
+    def fetchmany(self, size=1):
+        rows, self._result = self._result[:size], self._result[size:]
+        return rows
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+class StandInConnection:
+    """Stands in for a remote MariaDB: every statement costs one round trip."""
+
+    def __init__(self, rtt=0.0, max_packet=16 * 1024 * 1024, store=False, fail_on=None):
+        self.rtt = rtt
+        self.max_packet = max_packet
+        self.round_trips = 0
+        self.sent_bytes = 0
+        self.store = store
+        self.fail_on = fail_on
+        # LibraryIDs of committed rows (a list, so duplicate inserts show up)
+        self.committed = []
+        self.statements = []
+        self._pending = []
+        self._savepoints = {}
+
+    def check(self, sql):
+        """Raises what `fail_on` returns for the statement, if anything."""
+        error = self.fail_on(sql) if self.fail_on is not None else None
+        if error is not None:
+            raise error
+
+    def apply(self, sql, cursor):
+        """Runs a statement against the stored rows; returns the affected row count."""
+        self.statements.append(sql)
+        self.check(sql)
+        words = sql.split()
+        if sql.startswith("SAVEPOINT"):
+            self._savepoints[words[1]] = len(self._pending)
+        elif sql.startswith("ROLLBACK TO SAVEPOINT"):
+            del self._pending[self._savepoints[words[3]]:]
+        elif sql.startswith("RELEASE SAVEPOINT"):
+            self._savepoints.pop(words[2], None)
+        elif sql.startswith("SELECT") and " IN (" in sql:
+            wanted = {_unquote(v.strip()) for v in sql[sql.index(" IN (") + 5:sql.rindex(")")].split(",")}
+            stored = set(self.committed) | set(self._pending)
+            cursor._result = [{'LibraryID': lib_id} for lib_id in wanted & stored]
+        elif sql.startswith("INSERT"):
+            ignore = sql.startswith("INSERT IGNORE")
+            stored = set(self.committed) | set(self._pending)
+            added = 0
+            for values in split_values(sql):
+                lib_id = _unquote(values[LIBRARY_ID_INDEX])
+                if ignore and lib_id in stored:
+                    continue
+                self._pending.append(lib_id)
+                stored.add(lib_id)
+                added += 1
+            return added
+        return 0
+
+    def literal(self, value):
+        return escape_item(value, "utf8mb4")
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def commit(self):
+        self.cursor()._round_trip(6)
+        self.committed.extend(self._pending)
+        self._pending = []
+        self._savepoints.clear()
+
+    def ping(self, reconnect=False):
+        self.cursor()._round_trip(4)
+
+    def rollback(self):
+        self._pending = []
+        self._savepoints.clear()
+
+    def close(self):
+        self.rollback()
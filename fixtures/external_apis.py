@@ -0,0 +1,172 @@
+"""
+Local stand-ins for the HTTP services ads_processor depends on.
+
+- /getAdDetailsVirginia?ids=a,b,...   detail API (ads_processor.API_URL)
+- /GuardarAS3?filename=&URLCreative=  upload cloud function (ads_processor.CLOUD_FUNCTION_URL)
+
+Both answer after a configurable latency and fail with a configurable
+share of 502s and 429s; the failures are drawn from a seeded generator
+so a run is reproducible. A detail request naming one of `bad_ids` is
+rejected with a 400, as the real API does for malformed IDs. Details are generated deterministically from
+the LibraryID. FixtureTechnologyDetector stands in for
+tech_detector_new.TechnologyDetector (which fetches the landing pages).
+
+Usage: python fixtures/external_apis.py [port] [detail_latency_ms] [upload_latency_ms] [error_rate]
+"""
+import json
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+DETAIL_PATH = "/getAdDetailsVirginia"
+UPLOAD_PATH = "/GuardarAS3"
+
+# Technologies the fixture detector reports, a mix of tracked and untracked ones
+FIXTURE_TECHNOLOGIES = (
+    ["Shopify"], ["Hotmart"], ["Kiwify", "Vturb"], ["Stripe"],
+    ["WordPress"], ["Shopify", "Stripe"], ["Wix"], ["Panda"],
+)
+
+
+def make_detail(library_id):
+    """A getAdDetailsVirginia item for any LibraryID, stable across runs."""
+    n = zlib.crc32(library_id.encode("utf-8"))
+    video = n % 3 == 0
+    creative = (
+        f"https://video.example.net/{library_id}_hd.mp4" if video
+        else f"https://scontent.example.net/ads/{library_id}.jpg"
+    )
+    return {
+        "LibraryID": library_id,
+        "link_url": f"https://shop{n % 40}.example.com/products/{n % 1000}",
+        "cta_text": "Shop now",
+        "cta_type": "SHOP_NOW",
+        "__html": f"Offer {n % 997} for you",
+        "page_profile_uri": f"https://www.facebook.com/page{n % 25}/",
+        "URLCreative": creative,
+        "url_preview_creative": f"https://scontent.example.net/preview/{library_id}.jpg",
+        "AdCreative": creative,
+        "profilePict": f"https://scontent.example.net/profile/{n % 25}.jpg",
+        "page_profile_picture_url": f"https://scontent.example.net/profile/{n % 25}.jpg",
+        "Active": True,
+        "pageName": f"Page {n % 25}",
+        "pageID": str(500000 + n % 25),
+        "title": f"Deal {n % 500}",
+    }
+
+
+class FixtureTechnologyDetector:
+    """Same contract as TechnologyDetector, answering from the URL after `latency` seconds."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def detect_technologies(self, url):
+        time.sleep(self.latency)
+        return list(FIXTURE_TECHNOLOGIES[zlib.crc32(url.encode("utf-8")) % len(FIXTURE_TECHNOLOGIES)])
+
+
+class ExternalApiHandler(BaseHTTPRequestHandler):
+    # Per-request latency: base seconds, plus per requested ID for the detail API
+    detail_latency = 0.2
+    detail_latency_per_id = 0.005
+    upload_latency = 0.5
+    # Share of requests answered with 502 / 429
+    error_rate = 0.0
+    throttle_rate = 0.0
+    # LibraryIDs that make a detail request fail with 400
+    bad_ids = frozenset()
+    stats = None
+    rng = None
+    lock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _fault(self):
+        """Returns 502/429 for the configured share of requests, else None."""
+        with self.lock:
+            draw = self.rng.random()
+        if draw < self.error_rate:
+            return 502
+        if draw < self.error_rate + self.throttle_rate:
+            return 429
+        return None
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+
+        if parts.path.endswith(DETAIL_PATH):
+            ids = [i for i in query.get("ids", [""])[0].split(",") if i]
+            time.sleep(self.detail_latency + self.detail_latency_per_id * len(ids))
+            status = 400 if self.bad_ids.intersection(ids) else self._fault()
+            self._count(f"detail_{status or 200}")
+            if status:
+                return self._send(status, {"message": "fixture fault"})
+            return self._send(200, [make_detail(lib_id) for lib_id in ids])
+
+        if parts.path.endswith(UPLOAD_PATH):
+            time.sleep(self.upload_latency)
+            status = self._fault()
+            self._count(f"upload_{status or 200}")
+            if status:
+                return self._send(status, {"message": "fixture fault"})
+            filename = query.get("filename", ["media"])[0]
+            return self._send(200, {"s3_url": f"https://bench-bucket.s3.amazonaws.com/{filename}"})
+
+        self.send_error(404)
+
+
+def start_server(port=0, detail_latency=0.2, detail_latency_per_id=0.005, upload_latency=0.5,
+                 error_rate=0.0, throttle_rate=0.0, seed=7, bad_ids=()):
+    """
+    Starts both stand-ins on a background thread. Returns (server, base_url);
+    server.stats counts responses per endpoint and status.
+    """
+    stats = {}
+    handler = type("Handler", (ExternalApiHandler,), {
+        "detail_latency": detail_latency,
+        "detail_latency_per_id": detail_latency_per_id,
+        "upload_latency": upload_latency,
+        "error_rate": error_rate,
+        "throttle_rate": throttle_rate,
+        "bad_ids": frozenset(bad_ids),
+        "stats": stats,
+        "rng": random.Random(seed),
+        "lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, name="external-apis-standin", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8766
+    detail_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 200.0
+    upload_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 500.0
+    error_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+    server, url = start_server(port, detail_ms / 1000, upload_latency=upload_ms / 1000, error_rate=error_rate)
+    print(f"Detail API at {url}{DETAIL_PATH}, cloud function at {url}{UPLOAD_PATH}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
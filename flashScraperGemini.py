@@ -7,7 +7,10 @@ import datetime
 from urllib.parse import quote
 
 # 1. Start session implementing this libraries
+import metrics
 from facebook_auth import FacebookAuth
+from seen_ids import SeenIdIndex, SEEN_IDS_FILE
+from ads_capture import AdsNetworkCapture, PERFORMANCE_LOGGING_CAPABILITY
 
 # 9. Use this configuration for selenium
 from selenium import webdriver
@@ -20,201 +23,617 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
+# Ads Library search page (point it at fixtures/ads_library_server.py to test offline)
+ADS_LIBRARY_URL = "https://www.facebook.com/ads/library/"
+
+# Read full ad records from the page's own GraphQL responses (CDP network
+# events) instead of regexes over the rendered text. Captured details are
+# stored in the processor's detail cache, so those ads skip the detail API.
+CAPTURE_MODE = False
+
+# Run Chrome without a window (e.g. for benchmarks/run_offline_suite.py)
+HEADLESS = False
+
 def setup_driver():
     options = webdriver.ChromeOptions()
     options.page_load_strategy = 'eager'
     options.add_argument("--start-maximized")
     options.add_argument('--lang=en')
     options.add_argument("--disable-notifications")
+    # Keep background tabs loading at full speed (see scrape_many)
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-renderer-backgrounding")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+    if HEADLESS:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+    if CAPTURE_MODE:
+        # Network.* events are read back through driver.get_log("performance")
+        options.set_capability(*PERFORMANCE_LOGGING_CAPABILITY)
     
     # Initialize driver
     driver = webdriver.Chrome(options=options)
     return driver
 
-def main(keyword, country="ALL"):
-    driver = setup_driver()
-    
-    start_time = datetime.datetime.now()
-    try:
-        # 1.1 Authentication using FacebookAuth
-        print("--- 1. Starting Session ---")
-        auth = FacebookAuth(driver)
-        
-        # Try loading cookies first
-        cookies_loaded = auth.load_cookies(driver)
-        if cookies_loaded:
-            print("Cookies loaded successfully.")
-            driver.refresh()
-            time.sleep(2)
-        
-        # Verify if actually logged in
-        if not auth.is_logged_in(driver):
-            print("Not logged in. Attempting interactive login...")
-            if not auth.perform_login(driver):
-                print("Login failed. Cannot proceed without authentication.")
-                return None
-            print("Login successful!")
-        else:
-            print("Session is active.")
+def authenticate(driver, auth=None):
+    """
+    Starts a Facebook session on the driver: loads saved cookies and falls
+    back to interactive login. Returns True when the session is active.
+    `auth` selects the account (see session_pool); default is the .env one.
+    """
+    auth = auth or FacebookAuth(driver)
 
-        # 2. Navigate to URL
-        target_url = f"https://www.facebook.com/ads/library/?active_status=active&ad_type=all&country={country}&is_targeted_country=false&media_type=all&q={quote(keyword)}&search_type=keyword_unordered&sort_data[direction]=desc&sort_data[mode]=total_impressions"
-        print(f"--- 2. Navigating to: {target_url} ---")
-        driver.get(target_url)
+    # Saved cookies are checked offline; the full check on facebook.com only
+    # runs when they were not verified within SESSION_VERIFY_WINDOW
+    if not auth.ensure_session(driver):
+        print("Login failed. Cannot proceed without authentication.")
+        return False
+    print("Session is active.")
+    return True
 
-        # 3. Wait until it loads completely
-        print("--- 3. Waiting for page load ---")
-        
-        # JS snippet to count valid ads (used for both initial wait and scroll loop)
-        count_script = """
-            let divs = document.querySelectorAll('div.xh8yej3');
-            let count = 0;
-            for (let div of divs) {
-                // Check for direct child with class containing 'x1plvlek'
-                let child = div.querySelector(':scope > div[class*="x1plvlek"]');
-                if (child) count++;
+# Columns of the scraper output (records and CSV checkpoint)
+SCRAPED_FIELDNAMES = ["libraryID", "startDate", "Duplicates"]
+
+# Ads scraped per keyword; deep scrolls (thousands) stay memory-bounded
+# because ads are extracted after every scroll step and then pruned
+SCRAPE_DEPTH = 100
+
+# What happens to an ad's DOM node once it was extracted:
+# "hide" sets display:none, "clear" empties it (drops images/videos),
+# "remove" detaches it, None leaves it as rendered. "clear" and "remove"
+# edit nodes React owns and can break the feed when it re-renders them.
+PRUNE_PROCESSED = "hide"
+
+# Incremental mode: stop scrolling once this many consecutive loaded ads
+# were already seen for the same keyword/country (0 always scrolls to SCRAPE_DEPTH).
+# Off by default: search_url sorts by total impressions, not newest first, so
+# known ads at the top say nothing about new ones further down the feed.
+INCREMENTAL_KNOWN_RUN = 0
+
+# JS snippet extracting the ads rendered since the last call. Extracted
+# containers are marked (and pruned per arguments[0]) so every call only
+# touches new ads. A container whose Library ID has not rendered yet is
+# retried on the next calls before it is taken as "N/A".
+harvest_script = """
+    let pruneMode = arguments[0];
+    let results = [];
+
+    // Regex patterns in JS
+    let libIdRegex = /Library ID:\\s*(\\d+)/;
+    let dateRegex = /Started running on\\s+(.*)/;
+    let dupeRegex = /(\\d+)\\s+ads/;
+
+    for (let container of document.querySelectorAll('div.xh8yej3:not([data-scraped])')) {
+        // Filter Check (must have child with x1plvlek)
+        let child = container.querySelector(':scope > div[class*="x1plvlek"]');
+        if (!child) continue;
+
+        let textContent = container.innerText;
+        let libIdMatch = textContent.match(libIdRegex);
+        let attempts = parseInt(container.dataset.scrapeAttempts || "0") + 1;
+        if (!libIdMatch && attempts < 3) {
+            container.dataset.scrapeAttempts = attempts;
+            continue;
+        }
+
+        let startDate = "N/A";
+        let dateMatch = textContent.match(dateRegex);
+        if (dateMatch) startDate = dateMatch[1].trim();
+
+        // Look for strong tag specifically for duplicates
+        let duplicates = 0;
+        for (let strong of container.getElementsByTagName('strong')) {
+            let match = strong.innerText.match(dupeRegex);
+            if (match) {
+                duplicates = parseInt(match[1]);
+                break;
             }
-            return count;
-        """
-        
+        }
+
+        results.push({
+            "libraryID": libIdMatch ? libIdMatch[1] : "N/A",
+            "startDate": startDate,
+            "Duplicates": duplicates
+        });
+
+        container.dataset.scraped = "1";
+        if (pruneMode === "remove") container.remove();
+        else if (pruneMode === "clear") container.replaceChildren();
+        else if (pruneMode === "hide") container.style.display = "none";
+    }
+    return results;
+"""
+
+# Bounds of the per-scroll-step wait; within them it adapts to the observed load latency
+MIN_STEP_TIMEOUT = 1.5  # seconds
+MAX_STEP_TIMEOUT = 10.0  # seconds
+# A scroll step is done once no new ad node arrived for this long
+SETTLE_MS = 150
+# Consecutive empty steps with no loading indicator that mean the feed ended
+FEED_END_CONFIRMATIONS = 2
+
+# JS snippet installing a MutationObserver that counts ad containers as
+# they are added, and wakes up any waiting feed_wait_script
+feed_observer_script = """
+    if (window.__adsFeed) return true;
+    let feed = {added: 0, listeners: new Set()};
+    let selector = 'div.xh8yej3';
+    new MutationObserver((mutations) => {
+        let added = 0;
+        for (let mutation of mutations) {
+            for (let node of mutation.addedNodes) {
+                if (node.nodeType !== 1) continue;
+                if (node.matches(selector)) added++;
+                added += node.querySelectorAll(selector).length;
+            }
+        }
+        if (added) {
+            feed.added += added;
+            feed.listeners.forEach((listener) => listener());
+        }
+    }).observe(document.body, {childList: true, subtree: true});
+    window.__adsFeed = feed;
+    return true;
+"""
+
+# Async JS snippet: resolves once ads were added past arguments[0] and the
+# feed stayed quiet for arguments[2] ms, or after arguments[1] ms. `busy`
+# tells whether a loading indicator is still on the page.
+feed_wait_script = """
+    let since = arguments[0], timeoutMs = arguments[1], settleMs = arguments[2];
+    let done = arguments[arguments.length - 1];
+    let feed = window.__adsFeed;
+    if (!feed) { done(null); return; }
+
+    let started = performance.now();
+    let settleTimer = null, timeoutTimer = null;
+    function finish(timedOut) {
+        clearTimeout(settleTimer);
+        clearTimeout(timeoutTimer);
+        feed.listeners.delete(onChange);
+        let spinner = document.querySelector('[role="progressbar"]');
+        done({
+            added: feed.added,
+            timedOut: timedOut,
+            busy: !!(spinner && spinner.offsetParent !== null),
+            waitedMs: performance.now() - started
+        });
+    }
+    function onChange() {
+        if (feed.added <= since) return;
+        clearTimeout(settleTimer);
+        settleTimer = setTimeout(() => finish(false), settleMs);
+    }
+    feed.listeners.add(onChange);
+    timeoutTimer = setTimeout(() => finish(true), timeoutMs);
+    onChange();
+"""
+
+def install_feed_observer(driver):
+    """Installs the in-page ad observer; returns False when the page rejects it."""
+    try:
+        return bool(driver.execute_script(feed_observer_script))
+    except Exception as e:
+        print(f"Feed observer unavailable, falling back to polling: {e}")
+        return False
+
+def wait_for_new_ads(driver, since, timeout, settle_ms=SETTLE_MS):
+    """
+    Blocks until the observer saw ads added past `since` (then settled), or
+    `timeout` seconds passed. Returns the observer's report dict, or None.
+    """
+    driver.set_script_timeout(timeout + 5)
+    return driver.execute_async_script(feed_wait_script, since, int(timeout * 1000), settle_ms)
+
+def trailing_known_run(library_ids, known):
+    """Number of consecutive IDs at the end of `library_ids` that are in `known`."""
+    run = 0
+    for library_id in reversed(library_ids):
+        if library_id not in known:
+            break
+        run += 1
+    return run
+
+def store_captured_details(details):
+    """Writes captured ad details to the processor's detail cache."""
+    from ads_processor import DETAIL_CACHE_FILE, DETAIL_CACHE_TTL, DETAIL_CACHE_MAX_ENTRIES
+    from ttl_cache import PersistentTTLCache
+
+    if not DETAIL_CACHE_FILE or not details:
+        return
+    cache = PersistentTTLCache(
+        DETAIL_CACHE_FILE, ttl_seconds=DETAIL_CACHE_TTL, max_entries=DETAIL_CACHE_MAX_ENTRIES
+    )
+    try:
+        cache.set_many(details)
+    finally:
+        cache.close()
+
+def search_url(keyword, country="ALL"):
+    """Ads Library search for active ads matching `keyword`, sorted by total impressions."""
+    return f"{ADS_LIBRARY_URL}?active_status=active&ad_type=all&country={country}&is_targeted_country=false&media_type=all&q={quote(keyword)}&search_type=keyword_unordered&sort_data[direction]=desc&sort_data[mode]=total_impressions"
+
+class KeywordScrape:
+    """
+    Scroll and extraction state of one keyword search open in one tab.
+
+    After the page is loaded, `wait_first_ads` and `start_scrolling`
+    prepare it; then every scroll step is split into `begin_step` (scroll
+    down) and `finish_step` (wait for new ads and harvest them), so
+    several tabs of one browser can load at the same time. `done` turns
+    True on a stop condition; `result` returns the records.
+    """
+
+    max_stagnant_attempts = 5
+
+    def __init__(self, driver, keyword, country="ALL", depth=SCRAPE_DEPTH, known=None,
+                 known_run=INCREMENTAL_KNOWN_RUN, network=None, handle=None):
+        self.driver = driver
+        self.keyword = keyword
+        self.country = country
+        self.depth = depth
+        self.known = known or set()
+        self.known_run = known_run
+        self.network = network
+        self.handle = handle
+        self.done = False
+        # Records extracted so far, in page order
+        self.scraped_data = []
+        self._scraped_ids = set()
+        self.current_count = 0
+        self._last_count = 0
+        self._stagnant_attempts = 0
+        self._observed = False
+        self._feed_added = 0
+        self._end_signals = 0
+        # Average seconds a scroll step takes to bring new ads
+        self._step_latency = None
+        self._started = time.perf_counter()
+        self._step_started = None
+
+    def activate(self):
+        """Switches the driver to this search's tab."""
+        if self.handle is not None and self.driver.current_window_handle != self.handle:
+            self.driver.switch_to.window(self.handle)
+
+    def harvest(self, d=None):
+        """Extracts newly rendered ads; returns how many ads were collected so far."""
+        d = d or self.driver
+        for record in d.execute_script(harvest_script, PRUNE_PROCESSED) or []:
+            library_id = record["libraryID"]
+            if library_id != "N/A":
+                if library_id in self._scraped_ids:
+                    continue
+                self._scraped_ids.add(library_id)
+            self.scraped_data.append(record)
+        # Captured ads do not depend on the page's CSS classes
+        if self.network is not None:
+            return max(len(self.scraped_data), self.network.poll())
+        return len(self.scraped_data)
+
+    def wait_first_ads(self, timeout=30):
+        """Waits for the first rendered ads; returns False on timeout."""
+        network = self.network
         try:
-            # Wait for DOM element to be present first
-            WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "xh8yej3"))
-            )
-            # Then wait for at least 1 actual ad to be visible/rendered
-            WebDriverWait(driver, 30).until(
-                lambda d: d.execute_script(count_script) > 0
-            )
-            print("First ads loaded and visible.")
+            if network is not None:
+                WebDriverWait(self.driver, timeout).until(
+                    lambda d: network.scan_page() > 0 or self.harvest(d) > 0
+                )
+            else:
+                # Wait for DOM element to be present first
+                WebDriverWait(self.driver, timeout).until(
+                    EC.presence_of_element_located((By.CLASS_NAME, "xh8yej3"))
+                )
+                # Then wait for at least 1 actual ad to be visible/rendered
+                WebDriverWait(self.driver, timeout).until(lambda d: self.harvest(d) > 0)
         except TimeoutException:
-            print("Timeout waiting for ads to load. Exiting.")
+            print(f"[{self.keyword}] Timeout waiting for ads to load.")
+            metrics.inc("scrapes_total", result="no_ads")
+            return False
+        metrics.observe("scrape_first_ads_seconds", time.perf_counter() - self._started)
+        print(f"[{self.keyword}] First ads loaded and visible.")
+        return True
+
+    def start_scrolling(self):
+        # Ads are extracted after every scroll step, so no final extraction pass is needed
+        print(f"--- 4. Starting Scroll Loop for '{self.keyword}' (Target: {self.depth} ads) ---")
+        if self.known:
+            print(f"Incremental mode: {len(self.known)} ads seen before, "
+                  f"stopping after {self.known_run} known ads in a row.")
+        self.current_count = self.harvest()
+        # New ads are pushed by an in-page MutationObserver instead of polled
+        self._observed = install_feed_observer(self.driver)
+
+    def begin_step(self):
+        """Checks the stop conditions, then scrolls to the bottom."""
+        if self.current_count >= self.depth:
+            self.done = True
             return
+        if self.known:
+            if self.network is not None and len(self.network):
+                loaded_ids = self.network.library_ids()
+            else:
+                loaded_ids = [record["libraryID"] for record in self.scraped_data]
+            run = trailing_known_run(loaded_ids, self.known)
+            if run >= self.known_run:
+                print(f"[{self.keyword}] Reached {run} already-seen ads in a row. Stopping scroll.")
+                self.done = True
+                return
 
-        # 4. Scroll Loop (Optimized)
-        print("--- 4. Starting Scroll Loop (Target: 100 ads) ---")
-
-        current_count = driver.execute_script(count_script)
-        stagnant_attempts = 0
-        max_stagnant_attempts = 5
-
-        while current_count < 100:
-            last_count = current_count
-            
-            # Scroll to bottom
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            
+        self._last_count = self.current_count
+        self._step_started = time.perf_counter()
+        # Scroll to bottom
+        self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+
+    def _stagnant(self, feed_ended=False):
+        self._stagnant_attempts += 1
+        # Nothing arrived and nothing is loading: the feed has ended
+        self._end_signals = self._end_signals + 1 if feed_ended else 0
+        if self._end_signals >= FEED_END_CONFIRMATIONS:
+            print(f"[{self.keyword}] Reached the end of the results. Stopping scroll.")
+            self.done = True
+        elif self._stagnant_attempts >= self.max_stagnant_attempts:
+            print(f"[{self.keyword}] No new ads loaded after several attempts. Stopping scroll.")
+            self.done = True
+
+    def finish_step(self):
+        """Waits for the ads brought by the last scroll and harvests them."""
+        if self.done:
+            return
+        last_count = self._last_count
+
+        if self._observed:
+            # Wait for the observer's signal; the timeout follows the measured latency
+            if self._step_latency is None:
+                timeout = 5.0
+            else:
+                timeout = min(max(self._step_latency * 4, MIN_STEP_TIMEOUT), MAX_STEP_TIMEOUT)
+            report = wait_for_new_ads(self.driver, self._feed_added, timeout)
+            if report is None:
+                self._observed = install_feed_observer(self.driver)
+                return
+            self._feed_added = report["added"]
+            self.current_count = self.harvest()
+
+            if self.current_count > last_count:
+                waited = report["waitedMs"] / 1000
+                if self._step_latency is None:
+                    self._step_latency = waited
+                else:
+                    self._step_latency = 0.7 * self._step_latency + 0.3 * waited
+                self._stagnant_attempts = 0
+                self._end_signals = 0
+            else:
+                self._stagnant(feed_ended=not report["busy"])
+        else:
             # Wait for new content to appear (dynamic wait instead of fixed sleep)
             try:
-                WebDriverWait(driver, 5).until(
-                    lambda d: d.execute_script(count_script) > last_count
-                )
+                WebDriverWait(self.driver, 5).until(lambda d: self.harvest(d) > last_count)
                 # Small buffer to allow rendering to complete
                 time.sleep(0.3)
-                stagnant_attempts = 0
+                self._stagnant_attempts = 0
             except TimeoutException:
                 # No new content loaded within timeout
-                stagnant_attempts += 1
-                if stagnant_attempts >= max_stagnant_attempts:
-                    print("No new ads loaded after several attempts. Stopping scroll.")
-                    break
-            
-            current_count = driver.execute_script(count_script)
-            print(f"Current count: {current_count} ads")
-
-        print("--- 5. Executing High-Speed JS Extraction ---")
-        
-        # 5. HIGH SPEED EXTRACTION
-        # Instead of 100+ Python Selenium calls, we send ONE script to the browser.
-        # This script runs instantly inside the browser and returns the clean data.
-        extraction_script = """
-            let results = [];
-            let containers = document.querySelectorAll('div.xh8yej3');
-            
-            // Regex patterns in JS
-            let libIdRegex = /Library ID:\\s*(\\d+)/;
-            let dateRegex = /Started running on\\s+(.*)/;
-            let dupeRegex = /(\\d+)\\s+ads/;
-
-            for (let container of containers) {
-                if (results.length >= 100) break;
-
-                // 1. Filter Check (must have child with x1plvlek)
-                let child = container.querySelector(':scope > div[class*="x1plvlek"]');
-                if (!child) continue;
-
-                let textContent = container.innerText;
-                let htmlContent = container.innerHTML;
-
-                // 2. Extract Library ID
-                // Try finding specific span first for accuracy, fallback to regex on full text
-                let libId = "N/A";
-                let libIdMatch = textContent.match(libIdRegex);
-                if (libIdMatch) libId = libIdMatch[1];
-
-                // 3. Extract Date
-                let startDate = "N/A";
-                let dateMatch = textContent.match(dateRegex);
-                if (dateMatch) {
-                    // Clean up the date string (remove newlines if any)
-                    startDate = dateMatch[1].trim(); 
-                }
-
-                // 4. Extract Duplicates
-                let duplicates = 0;
-                // Look for strong tag specifically for duplicates as per requirement
-                let strongTags = container.getElementsByTagName('strong');
-                for (let strong of strongTags) {
-                    let match = strong.innerText.match(dupeRegex);
-                    if (match) {
-                        duplicates = parseInt(match[1]);
-                        break;
-                    }
-                }
-
-                results.push({
-                    "libraryID": libId,
-                    "startDate": startDate,
-                    "Duplicates": duplicates
-                });
-            }
-            return results;
-        """
+                self._stagnant()
+            self.current_count = self.harvest()
+
+        metrics.observe("scrape_step_seconds", time.perf_counter() - self._step_started)
+        print(f"[{self.keyword}] Current count: {self.current_count} ads")
+
+    def result(self, seen_index=None):
+        """Returns up to `depth` records and records their IDs as seen."""
+        if self.network is not None and len(self.network):
+            print(self.network.stats_line())
+            records = self.network.records(self.depth)
+            store_captured_details(self.network.details(self.depth))
+        else:
+            records = self.scraped_data[:self.depth]
+
+        print(f"[{self.keyword}] Extracted {len(records)} records.")
+        metrics.inc("scrapes_total", result="ok")
+        metrics.inc("ads_scraped_total", len(records))
+        metrics.observe("scrape_seconds", time.perf_counter() - self._started)
+        if seen_index is not None:
+            new_count = sum(1 for record in records if record["libraryID"] not in self.known)
+            print(f"{new_count} of them not seen in earlier scrapes.")
+            seen_index.record(self.keyword, self.country, [record["libraryID"] for record in records])
+        return records
+
+def scrape(keyword, country="ALL", driver=None, known_run=INCREMENTAL_KNOWN_RUN, capture=CAPTURE_MODE,
+           depth=SCRAPE_DEPTH):
+    """
+    Scrapes the Ads Library for `keyword` and returns up to `depth`
+    extracted records (dicts with SCRAPED_FIELDNAMES), [] when no ads
+    loaded, or None on failure.
+
+    When `driver` is given it must already be authenticated (e.g. leased
+    from a BrowserPool); it is reused as-is and left open for the caller.
 
-        scraped_data = driver.execute_script(extraction_script)
+    With `known_run` > 0, scrolling stops as soon as the last `known_run`
+    loaded ads were all seen by an earlier scrape of this keyword/country.
+    The extracted IDs are then recorded as seen.
 
-        print(f"Extracted {len(scraped_data)} records.")
+    With `capture`, records come from the page's result payloads (see
+    ads_capture) and their details are stored in the detail cache; the
+    DOM extraction is only used when nothing was captured. The driver must
+    have been created with CAPTURE_MODE enabled.
+    """
+    seen_index = SeenIdIndex(SEEN_IDS_FILE) if known_run and SEEN_IDS_FILE else None
+    known = seen_index.known(keyword, country) if seen_index is not None else set()
+    owns_driver = driver is None
+    if owns_driver:
+        driver = setup_driver()
+    
+    try:
+        # 1.1 Authentication using FacebookAuth
+        if owns_driver:
+            print("--- 1. Starting Session ---")
+            if not authenticate(driver):
+                return None
 
-        # 7. Save results
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_keyword = re.sub(r'[^\w\-]', '_', keyword)  # sanitize keyword for filename
-        filename = f"{timestamp}_{safe_keyword}.csv"
-        print(f"--- 7. Saving to {filename} ---")
-        
-        with open(filename, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=["libraryID", "startDate", "Duplicates"])
-            writer.writeheader()
-            writer.writerows(scraped_data)
+        network = AdsNetworkCapture(driver) if capture else None
+        if network is not None and not network.start():
+            network = None
 
-        end_time = datetime.datetime.now()
-        elapsed = end_time - start_time
-        elapsed_seconds = int(elapsed.total_seconds())
-        minutes, seconds = divmod(elapsed_seconds, 60)
-        print(f"--- Processing and CSV creation took: {elapsed_seconds} seconds ({minutes}m {seconds}s) ---")
+        # 2. Navigate to URL
+        target_url = search_url(keyword, country)
+        print(f"--- 2. Navigating to: {target_url} ---")
+        driver.get(target_url)
 
-        return filename
+        # 3. Wait until it loads completely
+        print("--- 3. Waiting for page load ---")
+        page = KeywordScrape(driver, keyword, country, depth=depth, known=known,
+                             known_run=known_run, network=network)
+        if not page.wait_first_ads():
+            # An empty result page is not a failure of the browser or the account
+            print(f"No ads loaded for '{keyword}'; returning no records.")
+            return []
+
+        # 4. Scroll Loop (Optimized)
+        page.start_scrolling()
+        while not page.done:
+            page.begin_step()
+            page.finish_step()
+
+        return page.result(seen_index)
 
     except Exception as e:
         print(f"Critical Error: {e}")
         return None
 
     finally:
+        if seen_index is not None:
+            seen_index.close()
         # 8. Close browser, reset memory, print message
-        print("--- 8. Cleaning up ---")
-        driver.quit()
-        gc.collect()
+        if owns_driver:
+            print("--- 8. Cleaning up ---")
+            driver.quit()
+            gc.collect()
         print("End of process message: Scraping Completed Successfully.")
 
+def scrape_many(keywords, country="ALL", driver=None, known_run=INCREMENTAL_KNOWN_RUN, depths=None):
+    """
+    Scrapes several keywords at once, one tab each in the same logged-in
+    browser. Scroll steps are interleaved: every tab is scrolled, then
+    each one's new ads are collected, so their page loads overlap.
+    Returns {keyword: records or None}.
+
+    `driver` must already be authenticated; extra tabs are opened with
+    FacebookAuth.open_new_tab_for_scraping and closed at the end. Network
+    capture is not used here (the performance log is per browser, not per
+    tab), so records always come from the DOM.
+    """
+    depths = depths or {}
+    results = {keyword: None for keyword in keywords}
+    seen_index = SeenIdIndex(SEEN_IDS_FILE) if known_run and SEEN_IDS_FILE else None
+    auth = FacebookAuth(driver)
+    original_handle = driver.current_window_handle
+    pages = []
+
+    try:
+        # Open one search per tab; the first one reuses the current tab
+        for keyword in keywords:
+            url = search_url(keyword, country)
+            if not pages:
+                print(f"--- 2. Navigating to: {url} ---")
+                driver.get(url)
+                handle = original_handle
+            else:
+                driver.switch_to.window(original_handle)
+                # Not waiting for the load: wait_first_ads does, while the other tabs load too
+                handle = auth.open_new_tab_for_scraping(driver, url, wait_loaded=False)
+                if handle is None:
+                    continue
+            known = seen_index.known(keyword, country) if seen_index is not None else set()
+            pages.append(KeywordScrape(
+                driver, keyword, country, depth=depths.get(keyword, SCRAPE_DEPTH),
+                known=known, known_run=known_run, handle=handle,
+            ))
+
+        print(f"--- 3. Waiting for page load in {len(pages)} tabs ---")
+        active = []
+        for page in pages:
+            page.activate()
+            if page.wait_first_ads():
+                page.start_scrolling()
+                active.append(page)
+        started = list(active)
+
+        # 4. Interleaved scroll loop: later tabs load while earlier ones are harvested
+        while active:
+            for page in active:
+                page.activate()
+                page.begin_step()
+            for page in active:
+                page.activate()
+                page.finish_step()
+            active = [page for page in active if not page.done]
+
+        for page in pages:
+            if page not in started:
+                # No ads loaded: an empty result, not a failure
+                results[page.keyword] = []
+                continue
+            page.activate()
+            results[page.keyword] = page.result(seen_index)
+
+    except Exception as e:
+        print(f"Critical Error: {e}")
+
+    finally:
+        if seen_index is not None:
+            seen_index.close()
+        for page in pages:
+            if page.handle != original_handle:
+                try:
+                    driver.switch_to.window(page.handle)
+                    driver.close()
+                except Exception as e:
+                    print(f"Could not close tab for '{page.keyword}': {e}")
+        try:
+            driver.switch_to.window(original_handle)
+        except Exception:
+            pass
+
+    return results
+
+def save_csv(records, keyword):
+    """Writes scraped records to YYYYMMDD_HHMMSS_<keyword>.csv and returns the filename."""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_keyword = re.sub(r'[^\w\-]', '_', keyword)  # sanitize keyword for filename
+    filename = f"{timestamp}_{safe_keyword}.csv"
+    print(f"--- 7. Saving to {filename} ---")
+    
+    with open(filename, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=SCRAPED_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(records)
+    return filename
+
+def main(keyword, country="ALL", driver=None, depth=SCRAPE_DEPTH):
+    """Scrapes `keyword` and saves the records as a CSV checkpoint. Returns the filename."""
+    start_time = datetime.datetime.now()
+
+    scraped_data = scrape(keyword, country=country, driver=driver, depth=depth)
+    if scraped_data is None:
+        return None
+
+    # 7. Save results
+    try:
+        filename = save_csv(scraped_data, keyword)
+    except Exception as e:
+        print(f"Critical Error: {e}")
+        return None
+
+    end_time = datetime.datetime.now()
+    elapsed = end_time - start_time
+    elapsed_seconds = int(elapsed.total_seconds())
+    minutes, seconds = divmod(elapsed_seconds, 60)
+    print(f"--- Processing and CSV creation took: {elapsed_seconds} seconds ({minutes}m {seconds}s) ---")
+    metrics.export(entrypoint="flashScraperGemini", keyword=keyword)
+
+    return filename
+
 if __name__ == "__main__":
     csv_file = "ads_keywords.csv"
     
@@ -0,0 +1,19 @@
+"""Shared keep-alive HTTP client setup for the external endpoints."""
+import requests
+from requests.adapters import HTTPAdapter
+
+# Seconds to wait for connect / read on every external call
+DEFAULT_TIMEOUT = (10, 60)
+
+
+def create_session(pool_size=10):
+    """
+    Returns a requests.Session whose connection pool can keep `pool_size`
+    connections per host alive, so concurrent workers reuse TLS sockets
+    instead of opening a new one per call.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
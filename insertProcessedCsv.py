@@ -1,7 +1,17 @@
-import csv
+import atexit
 import pymysql
 import os
-import json
+import tempfile
+import threading
+import time
+from functools import partial
+from itertools import chain
+
+import metrics
+from record_stream import iter_csv, chunked
+from run_journal import RunJournal, batch_key
+from db_pool import ConnectionPool
+from schema import ADSDOMAINS_COLUMNS, ADSDOMAINS_PLAN, DB_FIELDS, Column, compile_converter
 
 # --- DATABASE CONFIGURATION ---
 DB_CONFIG = {
@@ -13,117 +23,93 @@ DB_CONFIG = {
     'cursorclass': pymysql.cursors.DictCursor
 }
 
+# Connections kept open and shared across keywords/files
+DB_POOL_SIZE = 4
+
+# --- INSERT MODE ---
+# "batch":     SELECT + INSERT per 10 rows (two round trips per 10 rows)
+# "bulk":      multi-row INSERT statements sized by the server's max_allowed_packet
+# "load_data": LOAD DATA LOCAL INFILE from a temporary file (server needs local_infile=ON)
+INSERT_MODE = "bulk"
+# Rows per committed (and journaled) chunk in the bulk modes
+BULK_CHUNK_ROWS = 2000
+LOAD_DATA_CHUNK_ROWS = 50000
+# How rows whose LibraryID already exists are handled in the bulk modes:
+# "check":  one SELECT ... IN per chunk, then a plain INSERT of the new rows
+# "ignore": INSERT IGNORE (needs a UNIQUE key on LibraryID)
+# "update": ON DUPLICATE KEY UPDATE of BULK_UPDATE_FIELDS (needs a UNIQUE key on LibraryID)
+BULK_DUPLICATES = "check"
+# Columns refreshed on an existing ad when BULK_DUPLICATES = "update"
+BULK_UPDATE_FIELDS = ['Active', 'Estatus', 'endDate', 'daysSincePublication', 'duplicates', 'updatedAt']
+# Used when max_allowed_packet cannot be read from the server
+DEFAULT_MAX_PACKET = 4 * 1024 * 1024
+# Share of max_allowed_packet a single INSERT statement may use
+PACKET_FILL_RATIO = 0.9
+
 # --- CSV TO DB FIELD MAPPING ---
+# Columns, their processed CSV source and type conversions live in schema.py
 # Maps CSV column names to DB column names where they differ
-FIELD_MAPPING = {
-    'libraryID': 'LibraryID',
-    'Keyword': 'keywords',
-    'Duplicates': 'duplicates',
-}
-
-# All DB fields in correct order (excluding generated columns)
-DB_FIELDS = [
-    'cta_text', 'cta_type', '__html', 'page_profile_uri', 'publisherPlatform',
-    'URLCreative', 'url_preview_creative', 'AdCreative', 'AdMedia', 'profilePict',
-    'page_profile_picture_url', 'Active', 'Estatus', 'CollectionCount', 'CollationID',
-    'startDate', 'endDate', 'LibraryID', 'ahref', 'pageName', 'pageID', 'AdDescription',
-    'AdTitle', 'age', 'gender', 'languages', 'countries', 'daysSincePublication',
-    'lazy_load', 'contains_details', 'domain', 'codeBelongs', 'keywords', 'duplicates',
-    'createdAt', 'updatedAt'
-    # Removed: 'AdDescription_plain', 'AdTitle_plain' - these are GENERATED columns
-]
+FIELD_MAPPING = {c.source: c.name for c in ADSDOMAINS_COLUMNS if c.source != c.name}
 
 # Fields that should be integers
-INT_FIELDS = {'CollectionCount', 'CollationID', 'startDate', 'endDate', 'daysSincePublication', 'duplicates'}
+INT_FIELDS = {c.name for c in ADSDOMAINS_COLUMNS if c.kind == "int"}
 
 # Fields that should be booleans (stored as TINYINT)
-BOOL_FIELDS = {'Active', 'Estatus', 'lazy_load', 'contains_details'}
+BOOL_FIELDS = {c.name for c in ADSDOMAINS_COLUMNS if c.kind == "bool"}
 
 # Fields that require valid JSON
-JSON_FIELDS = {'publisherPlatform', 'AdDescription', 'AdTitle', 'age', 'languages', 'countries'}
+JSON_FIELDS = {c.name for c in ADSDOMAINS_COLUMNS if c.kind == "json"}
+
+
+def connect_db(**overrides):
+    """Establish database connection. `overrides` replace DB_CONFIG entries."""
+    return pymysql.connect(**{**DB_CONFIG, **overrides})
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_db_pool(local_infile: bool = False) -> ConnectionPool:
+    """Shared connection pool; LOAD DATA connections (local_infile) get their own."""
+    with _pools_lock:
+        pool = _pools.get(local_infile)
+        if pool is None:
+            connect = partial(connect_db, local_infile=True) if local_infile else connect_db
+            pool = ConnectionPool(connect, size=DB_POOL_SIZE)
+            _pools[local_infile] = pool
+        return pool
+
 
+def close_db_pools():
+    """Close every pooled connection; runs once at process exit."""
+    with _pools_lock:
+        for pool in _pools.values():
+            print(pool.stats_line())
+            pool.close()
+        _pools.clear()
 
-def connect_db():
-    """Establish database connection."""
-    return pymysql.connect(**DB_CONFIG)
+
+# Pools outlive each main()/insert_records call, so later calls reuse their connections
+atexit.register(close_db_pools)
 
 
 def read_csv(filepath: str) -> list:
     """Read CSV file and return list of rows as dictionaries."""
-    rows = []
-    with open(filepath, mode='r', encoding='utf-8-sig') as csvfile:
-        reader = csv.DictReader(csvfile)
-        rows = list(reader)
-    return rows
+    return list(iter_csv(filepath))
 
 
 def convert_value(value, field_name: str):
     """Convert value to appropriate type for database insertion."""
-    
-    # Handle JSON fields - must be valid JSON or NULL
-    if field_name in JSON_FIELDS:
-        if value == '' or value is None:
-            # Return JSON array with default value based on field
-            if field_name == 'publisherPlatform':
-                return '["facebook"]'
-            elif field_name in ('AdTitle', 'AdDescription'):
-                return '["Sin titulo"]'
-            elif field_name in ('age', 'languages', 'countries'):
-                return '[]'
-            return None
-        
-        # If already valid JSON, return as-is
-        try:
-            json.loads(value)
-            return value
-        except (json.JSONDecodeError, TypeError):
-            # Wrap the value in a JSON array
-            return json.dumps([str(value)])
-    
-    # Handle empty strings as NULL
-    if value == '' or value is None:
-        return None
-    
-    # Handle integer fields
-    if field_name in INT_FIELDS:
-        try:
-            return int(float(value))
-        except (ValueError, TypeError):
-            return None
-    
-    # Handle boolean fields
-    if field_name in BOOL_FIELDS:
-        if isinstance(value, bool):
-            return 1 if value else 0
-        if str(value).lower() in ('true', '1', 'yes'):
-            return 1
-        if str(value).lower() in ('false', '0', 'no'):
-            return 0
-        return None
-    
-    return str(value)
+    converter = ADSDOMAINS_PLAN.converters.get(field_name)
+    if converter is None:
+        converter = compile_converter(Column(field_name, field_name))
+    return converter(value)
 
 
 def map_row_to_db(csv_row: dict) -> dict:
     """Map CSV row fields to database fields."""
-    db_row = {}
-    
-    for db_field in DB_FIELDS:
-        # Check if there's a mapping, otherwise use the same name
-        csv_field = None
-        for csv_key, db_key in FIELD_MAPPING.items():
-            if db_key == db_field:
-                csv_field = csv_key
-                break
-        
-        if csv_field is None:
-            csv_field = db_field
-        
-        # Get value from CSV row
-        raw_value = csv_row.get(csv_field, None)
-        db_row[db_field] = convert_value(raw_value, db_field)
-    
-    return db_row
+    return dict(zip(DB_FIELDS, ADSDOMAINS_PLAN.convert(csv_row)))
 
 
 def get_existing_library_ids(cursor, library_ids: list) -> set:
@@ -170,71 +156,271 @@ def insert_batch(cursor, batch: list):
     sql = f"INSERT INTO adsdomains ({columns}) VALUES ({placeholders})"
     
     # Prepare values
-    values_list = []
-    for row in new_rows:
-        db_row = map_row_to_db(row)
-        values = tuple(db_row[field] for field in DB_FIELDS)
-        values_list.append(values)
+    values_list = ADSDOMAINS_PLAN.convert_batch(new_rows)
     
     # Execute batch insert
     cursor.executemany(sql, values_list)
     return len(values_list), skipped
 
 
-def main(csv_filepath: str = None):
-    """Main function to process CSV and insert into database."""
-    if csv_filepath is None:
-        csv_filepath = "processed_20260204_172139_truque.csv"
-    
-    print(f"Reading CSV: {csv_filepath}")
-    
-    # Read CSV
+def get_max_allowed_packet(cursor) -> int:
+    """Read max_allowed_packet from the server, falling back to DEFAULT_MAX_PACKET."""
     try:
-        rows = read_csv(csv_filepath)
-    except FileNotFoundError:
-        print(f"Error: File '{csv_filepath}' not found.")
-        return
-    
-    total_rows = len(rows)
-    print(f"Found {total_rows} rows to process.")
-    
-    if total_rows == 0:
+        cursor.execute("SELECT @@max_allowed_packet AS max_packet")
+        row = cursor.fetchone()
+        return int(row['max_packet'])
+    except Exception as e:
+        print(f"Could not read max_allowed_packet ({e}), assuming {DEFAULT_MAX_PACKET} bytes.")
+        return DEFAULT_MAX_PACKET
+
+
+def _filter_new_rows(cursor, chunk: list):
+    """Drop rows whose LibraryID already exists, with one SELECT for the whole chunk."""
+    library_ids = [row.get('libraryID') or row.get('LibraryID') for row in chunk]
+    existing_ids = get_existing_library_ids(cursor, [lid for lid in library_ids if lid])
+    new_rows = [
+        row for row in chunk
+        if str(row.get('libraryID') or row.get('LibraryID') or '') not in existing_ids
+    ]
+    return new_rows, len(chunk) - len(new_rows)
+
+
+def build_insert_statements(literal, values_list, max_packet: int, duplicates: str = "check"):
+    """
+    Yields (sql, row_count) multi-row INSERT statements over `values_list`,
+    each kept under PACKET_FILL_RATIO of `max_packet` bytes. `literal`
+    escapes a single value, e.g. the connection's `literal` method.
+    """
+    columns = ', '.join([f'`{f}`' for f in DB_FIELDS])
+    verb = "INSERT IGNORE" if duplicates == "ignore" else "INSERT"
+    head = f"{verb} INTO adsdomains ({columns}) VALUES "
+    tail = ""
+    if duplicates == "update":
+        tail = " ON DUPLICATE KEY UPDATE " + ', '.join(
+            f'`{f}` = VALUES(`{f}`)' for f in BULK_UPDATE_FIELDS
+        )
+
+    budget = int(max_packet * PACKET_FILL_RATIO) - len(head) - len(tail)
+    parts = []
+    size = 0
+    for values in values_list:
+        row_sql = '(' + ','.join(map(literal, values)) + ')'
+        row_size = len(row_sql.encode('utf-8')) + 1
+        if parts and size + row_size > budget:
+            yield head + ','.join(parts) + tail, len(parts)
+            parts = []
+            size = 0
+        # A single row larger than the budget still goes out on its own
+        parts.append(row_sql)
+        size += row_size
+    if parts:
+        yield head + ','.join(parts) + tail, len(parts)
+
+
+def bulk_insert_chunk(cursor, chunk: list, max_packet: int, duplicates: str = BULK_DUPLICATES):
+    """
+    Insert a chunk of rows with as few multi-row INSERT statements as the
+    packet limit allows. Returns (inserted, skipped); with "update",
+    refreshed existing ads count as inserted.
+    """
+    if not chunk:
+        return 0, 0
+
+    skipped = 0
+    if duplicates == "check":
+        chunk, skipped = _filter_new_rows(cursor, chunk)
+        if not chunk:
+            return 0, skipped
+
+    values_list = ADSDOMAINS_PLAN.convert_batch(chunk)
+    literal = cursor.connection.literal
+    inserted = 0
+    for sql, row_count in build_insert_statements(literal, values_list, max_packet, duplicates):
+        affected = cursor.execute(sql)
+        if duplicates == "ignore":
+            # INSERT IGNORE reports only the rows it actually added
+            inserted += affected
+            skipped += row_count - affected
+        else:
+            inserted += row_count
+    return inserted, skipped
+
+
+def bulk_insert_isolating(cursor, chunk: list, max_packet: int, duplicates: str = BULK_DUPLICATES):
+    """
+    bulk_insert_chunk inside a savepoint. When the chunk fails, its
+    statements are rolled back and it is retried in halves until the bad
+    rows are isolated, so one bad row only loses itself. Connection errors
+    are raised (retrying on a dead connection is pointless). Returns
+    (inserted, skipped, failed).
+    """
+    cursor.execute("SAVEPOINT bulk_chunk")
+    try:
+        inserted, skipped = bulk_insert_chunk(cursor, chunk, max_packet, duplicates)
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+        raise
+    except Exception as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT bulk_chunk")
+        if len(chunk) == 1:
+            row = chunk[0]
+            print(f"Row {row.get('libraryID') or row.get('LibraryID')} failed: {e}")
+            return 0, 0, 1
+        print(f"Chunk of {len(chunk)} rows failed ({e}); retrying in halves.")
+        middle = len(chunk) // 2
+        inserted, skipped, failed = bulk_insert_isolating(cursor, chunk[:middle], max_packet, duplicates)
+        more = bulk_insert_isolating(cursor, chunk[middle:], max_packet, duplicates)
+        return inserted + more[0], skipped + more[1], failed + more[2]
+    # The savepoint goes away with the next commit; releasing it would cost a round trip
+    return inserted, skipped, 0
+
+
+def _load_data_field(value) -> str:
+    """Format a value for LOAD DATA's default tab-separated text format."""
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def load_data_chunk(cursor, chunk: list, duplicates: str = BULK_DUPLICATES):
+    """
+    Insert a chunk of rows with LOAD DATA LOCAL INFILE from a temporary
+    file. The connection must be opened with local_infile=True. Returns
+    (inserted, skipped); "update" maps to LOAD DATA REPLACE, which deletes
+    and re-inserts existing ads.
+    """
+    if not chunk:
+        return 0, 0
+
+    skipped = 0
+    if duplicates == "check":
+        chunk, skipped = _filter_new_rows(cursor, chunk)
+        if not chunk:
+            return 0, skipped
+
+    with tempfile.NamedTemporaryFile(
+        mode='w', encoding='utf-8', newline='', suffix='.tsv', delete=False
+    ) as tmp:
+        for values in ADSDOMAINS_PLAN.convert_batch(chunk):
+            tmp.write('\t'.join(map(_load_data_field, values)) + '\n')
+        tmp_path = tmp.name
+
+    columns = ', '.join([f'`{f}`' for f in DB_FIELDS])
+    modifier = {"ignore": "IGNORE", "update": "REPLACE"}.get(duplicates, "")
+    sql = (
+        f"LOAD DATA LOCAL INFILE %s {modifier} INTO TABLE adsdomains CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columns})"
+    )
+    try:
+        affected = cursor.execute(sql, (tmp_path,))
+    finally:
+        os.remove(tmp_path)
+
+    if duplicates == "ignore":
+        return affected, skipped + len(chunk) - affected
+    return len(chunk), skipped
+
+
+def insert_records(rows, journal=None, scope=None, mode=None, pool=None) -> tuple:
+    """
+    Insert an iterable of processed rows, consuming it in batches as rows
+    arrive. Returns (inserted, skipped), or None if the database work did
+    not complete.
+
+    `mode` (default INSERT_MODE) picks how a batch is written: "batch"
+    inserts 10 rows at a time, "bulk" writes BULK_CHUNK_ROWS rows with
+    packet-sized multi-row INSERTs (a failing chunk is rolled back and
+    bisected down to its bad rows), "load_data" uses LOAD DATA LOCAL
+    INFILE on LOAD_DATA_CHUNK_ROWS rows.
+
+    With a RunJournal and a `scope`, every batch is committed on its own
+    and journaled, so a restart skips the batches that already landed.
+
+    The connection is borrowed from `pool` (default: the shared pool from
+    get_db_pool) and returned afterwards, so consecutive calls reuse it.
+    """
+    mode = mode or INSERT_MODE
+    if mode not in ("batch", "bulk", "load_data"):
+        raise ValueError(f"Unknown insert mode: {mode}")
+
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
         print("No rows to insert.")
-        return
-    
-    # Connect to database
-    print("Connecting to database...")
+        return 0, 0
+    rows = chain([first_row], rows)
+
+    if pool is None:
+        pool = get_db_pool(local_infile=mode == "load_data")
     try:
-        connection = connect_db()
+        connection = pool.acquire()
     except Exception as e:
         print(f"Database connection failed: {e}")
-        return
-    
-    print("Connected successfully.")
+        return None
     
-    # Process in batches of 10
-    batch_size = 10
+    use_journal = journal is not None and scope is not None
+    done_batches = journal.completed_batches(scope) if use_journal else set()
+    if done_batches:
+        print(f"Resuming insert: {len(done_batches)} batches already committed.")
+
+    if mode == "bulk":
+        batch_size = BULK_CHUNK_ROWS
+    elif mode == "load_data":
+        batch_size = LOAD_DATA_CHUNK_ROWS
+    else:
+        batch_size = 10
     inserted_count = 0
     skipped_count = 0
+    completed = False
     
     try:
         with connection.cursor() as cursor:
-            for i in range(0, total_rows, batch_size):
-                batch = rows[i:i + batch_size]
-                batch_num = (i // batch_size) + 1
-                
+            if mode == "bulk":
+                max_packet = get_max_allowed_packet(cursor)
+            for batch_num, batch in enumerate(chunked(rows, batch_size), start=1):
+                key = None
+                if use_journal:
+                    key = batch_key(row.get('libraryID') or row.get('LibraryID') for row in batch)
+                    if key in done_batches:
+                        print(f"Batch {batch_num}: already committed in an earlier run")
+                        continue
                 try:
-                    count, skipped = insert_batch(cursor, batch)
+                    batch_started = time.perf_counter()
+                    failed = 0
+                    if mode == "bulk":
+                        count, skipped, failed = bulk_insert_isolating(cursor, batch, max_packet)
+                    elif mode == "load_data":
+                        count, skipped = load_data_chunk(cursor, batch)
+                    else:
+                        count, skipped = insert_batch(cursor, batch)
+                    if use_journal:
+                        connection.commit()
+                        journal.mark_batches(scope, [key])
                     inserted_count += count
                     skipped_count += skipped
-                    print(f"Batch {batch_num}: Inserted {count}, Skipped {skipped} (Total: {inserted_count} inserted, {skipped_count} skipped)")
+                    metrics.observe("db_insert_batch_seconds", time.perf_counter() - batch_started, mode=mode)
+                    metrics.inc("db_rows_total", count, mode=mode, result="inserted")
+                    metrics.inc("db_rows_total", skipped, mode=mode, result="duplicate")
+                    metrics.inc("db_rows_total", failed, mode=mode, result="failed")
+                    failed_note = f", Failed {failed}" if failed else ""
+                    print(f"Batch {batch_num}: Inserted {count}, Skipped {skipped}{failed_note} (Total: {inserted_count} inserted, {skipped_count} skipped)")
+                except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+                    # Lost connection: stop here; unjournaled batches are redone on resume
+                    raise
                 except Exception as e:
+                    metrics.inc("db_rows_total", len(batch), mode=mode, result="failed")
                     print(f"Batch {batch_num} failed: {e}")
                     # Continue with next batch
                     continue
             
             # Commit all changes
             connection.commit()
+            completed = True
             print(f"\nDone! Inserted {inserted_count} rows, Skipped {skipped_count} duplicates.")
     
     except Exception as e:
@@ -242,15 +428,49 @@ def main(csv_filepath: str = None):
         connection.rollback()
     
     finally:
-        connection.close()
-        print("Database connection closed.")
+        # A connection that hit an error is closed rather than reused
+        pool.release(connection, failed=not completed)
+
+    if not completed:
+        return None
+    if use_journal:
+        journal.clear_scope(scope)
+
+    return inserted_count, skipped_count
+
+
+def main(csv_filepath: str = None, resume: bool = True, mode: str = None):
+    """Main function to process CSV and insert into database."""
+    if csv_filepath is None:
+        csv_filepath = "processed_20260204_172139_truque.csv"
+    
+    print(f"Reading CSV: {csv_filepath}")
+    
+    if not os.path.exists(csv_filepath):
+        print(f"Error: File '{csv_filepath}' not found.")
+        return
+    
+    journal = RunJournal() if resume else None
+    try:
+        insert_records(
+            iter_csv(csv_filepath),
+            journal=journal,
+            scope=f"insert:{os.path.abspath(csv_filepath)}",
+            mode=mode,
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+        metrics.export(entrypoint="insertProcessedCsv", file=csv_filepath)
 
 
 if __name__ == "__main__":
     import sys
     
-    # Allow passing CSV filename as argument
-    if len(sys.argv) > 1:
+    # Allow passing CSV filename (and insert mode) as arguments
+    if len(sys.argv) > 2:
+        main(sys.argv[1], mode=sys.argv[2])
+    elif len(sys.argv) > 1:
         main(sys.argv[1])
     else:
         main()
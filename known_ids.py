@@ -0,0 +1,160 @@
+"""Snapshot of adsdomains.LibraryID used to skip ads that are already stored."""
+import json
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from ttl_cache import CACHE_DIR
+
+KNOWN_IDS_FILE = CACHE_DIR / "known_library_ids.bin"
+
+# Recently added IDs are merged into the sorted array past this many
+_MERGE_THRESHOLD = 10_000
+
+
+def _to_int(library_id):
+    """LibraryIDs are numeric; anything else can never be 'known'."""
+    text = str(library_id or "").strip()
+    if not text.isdigit():
+        return None
+    value = int(text)
+    return value if value < 2 ** 64 else None
+
+
+class KnownIdIndex:
+    """
+    Sorted array of every LibraryID already in adsdomains, persisted next
+    to a small JSON file with the createdAt watermark of the last refresh.
+    Refreshes only pull rows created since that watermark.
+    """
+
+    def __init__(self, path=KNOWN_IDS_FILE):
+        self.path = Path(path)
+        self.meta_path = self.path.with_suffix(".json")
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self._ids = array("Q")
+        self._recent = set()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path.exists() or not self.meta_path.exists():
+            return
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            ids = array("Q")
+            with open(self.path, "rb") as f:
+                ids.frombytes(f.read())
+        except Exception as e:
+            print(f"Warning: could not load known-ID snapshot ({e}); starting empty.")
+            return
+        self._ids = ids
+        self.watermark = meta.get("watermark")
+        self.refreshed_at = meta.get("refreshed_at", 0.0)
+
+    def save(self):
+        """Writes the snapshot atomically."""
+        with self._lock:
+            self._merge()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".bin.tmp")
+            with open(tmp_path, "wb") as f:
+                self._ids.tofile(f)
+            os.replace(tmp_path, self.path)
+
+            tmp_meta = self.meta_path.with_suffix(".json.tmp")
+            with open(tmp_meta, "w") as f:
+                json.dump({"watermark": self.watermark, "refreshed_at": self.refreshed_at}, f)
+            os.replace(tmp_meta, self.meta_path)
+
+    def _merge(self):
+        if not self._recent:
+            return
+        merged = set(self._ids)
+        merged.update(self._recent)
+        self._ids = array("Q", sorted(merged))
+        self._recent = set()
+
+    def add_many(self, library_ids):
+        with self._lock:
+            for library_id in library_ids:
+                value = _to_int(library_id)
+                if value is not None:
+                    self._recent.add(value)
+            if len(self._recent) > _MERGE_THRESHOLD:
+                self._merge()
+
+    def __contains__(self, library_id):
+        value = _to_int(library_id)
+        if value is None:
+            return False
+        with self._lock:
+            if value in self._recent:
+                return True
+            i = bisect_left(self._ids, value)
+            return i < len(self._ids) and self._ids[i] == value
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids) + len(self._recent)
+
+    def refresh(self, connection, chunk_size=50_000):
+        """
+        Pulls LibraryIDs created since the last watermark (everything on
+        the first run) and saves the snapshot. Returns the rows read.
+        """
+        if self.watermark:
+            sql = "SELECT LibraryID, createdAt FROM adsdomains WHERE createdAt >= %s"
+            params = (self.watermark,)
+        else:
+            sql = "SELECT LibraryID, createdAt FROM adsdomains"
+            params = None
+
+        read = 0
+        watermark = self.watermark
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                read += len(rows)
+                self.add_many(row['LibraryID'] for row in rows)
+                for row in rows:
+                    created_at = row.get('createdAt')
+                    if created_at is not None:
+                        created_at = str(created_at)
+                        if watermark is None or created_at > watermark:
+                            watermark = created_at
+
+        self.watermark = watermark
+        self.refreshed_at = time.time()
+        self.save()
+        return read
+
+    def refresh_if_stale(self, pool, max_age):
+        """
+        Refreshes when the snapshot is older than `max_age` seconds, with a
+        connection borrowed from `pool`. DB errors keep the old snapshot.
+        """
+        if time.time() - self.refreshed_at < max_age:
+            return 0
+        try:
+            connection = pool.acquire()
+        except Exception as e:
+            print(f"Known-ID refresh skipped, database unavailable: {e}")
+            return 0
+        failed = False
+        try:
+            return self.refresh(connection)
+        except Exception as e:
+            failed = True
+            print(f"Known-ID refresh failed: {e}")
+            return 0
+        finally:
+            pool.release(connection, failed=failed)
@@ -0,0 +1,176 @@
+"""Local manifest of creatives already uploaded to S3 through the cloud function."""
+import hashlib
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from ttl_cache import CACHE_DIR
+
+MANIFEST_FILE = CACHE_DIR / "media_manifest.sqlite3"
+
+# Marker of URLs returned by the cloud function (used when importing)
+S3_URL_MARKER = "amazonaws.com"
+
+
+def creative_url_hash(url_src):
+    """
+    Hash of a source creative URL. Facebook CDN links carry expiring
+    signature params (oh=, oe=, ...), so only scheme, host and path count.
+    """
+    parts = urlsplit(str(url_src or "").strip())
+    stable = f"{parts.scheme}://{parts.netloc.lower()}{parts.path}"
+    return hashlib.sha1(stable.encode("utf-8")).hexdigest()
+
+
+class MediaManifest:
+    """
+    Maps LibraryID and source creative URL hash to the S3 URL returned by
+    the upload, so the same creative is never uploaded twice.
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " library_id TEXT,"
+            " url_hash TEXT,"
+            " s3_url TEXT NOT NULL,"
+            " uploaded_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_lib ON uploads(library_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_hash ON uploads(url_hash)")
+        self._conn.commit()
+
+    def lookup(self, library_id=None, url_src=None):
+        """Returns the S3 URL for this creative, matching by URL hash first, then LibraryID."""
+        with self._lock:
+            row = None
+            if url_src:
+                row = self._conn.execute(
+                    "SELECT s3_url FROM uploads WHERE url_hash = ? ORDER BY uploaded_at DESC LIMIT 1",
+                    (creative_url_hash(url_src),),
+                ).fetchone()
+            if row is None and library_id:
+                row = self._conn.execute(
+                    "SELECT s3_url FROM uploads WHERE library_id = ? ORDER BY uploaded_at DESC LIMIT 1",
+                    (str(library_id),),
+                ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def record(self, library_id, url_src, s3_url):
+        """Stores a successful upload."""
+        if not s3_url:
+            return
+        url_hash = creative_url_hash(url_src) if url_src else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (library_id, url_hash, s3_url, uploaded_at) VALUES (?, ?, ?, ?)",
+                (str(library_id) if library_id else None, url_hash, s3_url, time.time()),
+            )
+            self._conn.commit()
+
+    def compact(self):
+        """
+        Keeps only the newest entry per LibraryID and per URL hash, then
+        reclaims disk space. Returns the number of entries removed.
+        """
+        with self._lock:
+            before = self._conn.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+            self._conn.execute(
+                "DELETE FROM uploads WHERE rowid NOT IN ("
+                " SELECT MAX(rowid) FROM uploads WHERE library_id IS NOT NULL GROUP BY library_id"
+                " UNION"
+                " SELECT MAX(rowid) FROM uploads WHERE url_hash IS NOT NULL GROUP BY url_hash)"
+            )
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            after = self._conn.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+        return before - after
+
+    def import_from_db(self, connection, chunk_size=5000):
+        """
+        Seeds the manifest from adsdomains.AdCreative values that already
+        point at S3. Only the LibraryID is known for these rows.
+        Returns the number of entries imported.
+        """
+        known = set()
+        with self._lock:
+            for (library_id,) in self._conn.execute(
+                "SELECT library_id FROM uploads WHERE library_id IS NOT NULL"
+            ):
+                known.add(library_id)
+
+        imported = 0
+        now = time.time()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT LibraryID, AdCreative FROM adsdomains WHERE AdCreative LIKE %s",
+                (f"%{S3_URL_MARKER}%",),
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                entries = []
+                for row in rows:
+                    library_id = str(row['LibraryID'])
+                    if library_id in known:
+                        continue
+                    known.add(library_id)
+                    entries.append((library_id, None, row['AdCreative'], now))
+                with self._lock:
+                    self._conn.executemany(
+                        "INSERT INTO uploads (library_id, url_hash, s3_url, uploaded_at) VALUES (?, ?, ?, ?)",
+                        entries,
+                    )
+                    self._conn.commit()
+                imported += len(entries)
+        return imported
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+
+    def stats_line(self):
+        return f"Media manifest: {self.hits} reused, {self.misses} new uploads, {len(self)} entries"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    # Usage: python media_manifest.py [import|compact]
+    command = sys.argv[1] if len(sys.argv) > 1 else "compact"
+    manifest = MediaManifest()
+
+    if command == "import":
+        from insertProcessedCsv import connect_db
+
+        connection = connect_db()
+        try:
+            count = manifest.import_from_db(connection)
+        finally:
+            connection.close()
+        print(f"Imported {count} uploads from adsdomains.")
+    elif command == "compact":
+        removed = manifest.compact()
+        print(f"Compacted manifest: removed {removed} entries, {len(manifest)} left.")
+    else:
+        print(f"Unknown command: {command}")
+
+    manifest.close()
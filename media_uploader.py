@@ -0,0 +1,126 @@
+"""Bounded worker pool for creative uploads through the cloud function."""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+from http_client import create_session
+
+# Concurrent uploads to CLOUD_FUNCTION_URL
+DEFAULT_UPLOAD_WORKERS = 8
+# Rows allowed to wait on their upload before the producer blocks
+DEFAULT_MAX_PENDING = 64
+
+
+class MediaUploader:
+    """
+    Runs `upload_func(url_src, file_type, file_name, session=...)` on a
+    thread pool sharing one keep-alive session, and records per-upload
+    latency and failures.
+
+    With a `manifest` (see media_manifest.MediaManifest) creatives that were
+    uploaded before are reused instead of being sent again.
+    """
+
+    def __init__(self, upload_func, workers=DEFAULT_UPLOAD_WORKERS, manifest=None):
+        self.upload_func = upload_func
+        self.manifest = manifest
+        self.workers = max(1, int(workers))
+        self.session = create_session(pool_size=self.workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="media-upload"
+        )
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.failures = 0
+
+    def _upload(self, url_src, file_type, file_name, library_id):
+        started = time.time()
+        s3_url = None
+        try:
+            s3_url = self.upload_func(url_src, file_type, file_name, session=self.session)
+        finally:
+            elapsed = time.time() - started
+            with self._lock:
+                self.latencies.append(elapsed)
+                if not s3_url:
+                    self.failures += 1
+            metrics.observe("upload_seconds", elapsed)
+            metrics.inc("uploads_total", result="ok" if s3_url else "failed")
+        if s3_url and self.manifest is not None:
+            self.manifest.record(library_id, url_src, s3_url)
+        return s3_url
+
+    def submit(self, url_src, file_type, file_name, library_id=None):
+        """Schedules an upload and returns a Future resolving to the s3_url (or None)."""
+        if self.manifest is not None:
+            s3_url = self.manifest.lookup(library_id, url_src)
+            if s3_url:
+                metrics.inc("uploads_total", result="reused")
+                future = Future()
+                future.set_result(s3_url)
+                return future
+        return self._executor.submit(self._upload, url_src, file_type, file_name, library_id)
+
+    def print_stats(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            failures = self.failures
+
+        total = len(latencies)
+        if not total:
+            print("Media uploads: none")
+            return
+
+        def percentile(p):
+            return latencies[min(total - 1, int(p * total))]
+
+        print(
+            f"Media uploads: {total} total, {failures} failed | latency "
+            f"avg {sum(latencies) / total:.2f}s, p50 {percentile(0.5):.2f}s, "
+            f"p95 {percentile(0.95):.2f}s, max {latencies[-1]:.2f}s"
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+class OrderedUploadWriter:
+    """
+    Holds processed rows until their upload future resolves, then hands
+    them to `write_row` in the order they were added.
+    """
+
+    def __init__(self, write_row, max_pending=DEFAULT_MAX_PENDING):
+        self.write_row = write_row
+        self.max_pending = max(1, int(max_pending))
+        self._pending = deque()
+
+    def add(self, row, future, finish):
+        """
+        Queues `row`; once `future` is done, `finish(row, result)` fills in
+        the upload fields and the row is written.
+        """
+        self._pending.append((row, future, finish))
+        # Backpressure: never keep more than max_pending rows in memory
+        while len(self._pending) > self.max_pending:
+            self._write_next()
+        self.drain_ready()
+
+    def _write_next(self):
+        row, future, finish = self._pending.popleft()
+        result = future.result() if future is not None else None
+        finish(row, result)
+        self.write_row(row)
+
+    def drain_ready(self):
+        """Writes every leading row whose upload already finished."""
+        while self._pending and (self._pending[0][1] is None or self._pending[0][1].done()):
+            self._write_next()
+
+    def flush(self):
+        """Blocks until every queued row has been written."""
+        while self._pending:
+            self._write_next()
@@ -0,0 +1,224 @@
+"""
+Process-wide counters and latency histograms for the scraper, processor,
+uploader and inserter, exported as JSON lines and a Prometheus textfile.
+
+    metrics.inc("rows_inserted_total", 10, mode="bulk")
+    metrics.observe("external_request_seconds", 0.42, endpoint="getAdDetailsVirginia")
+    with metrics.timed("scrape_seconds"):
+        ...
+    metrics.export()
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+from run_journal import STATE_DIR
+
+# Where export() writes; None disables that output
+METRICS_DIR = STATE_DIR / "metrics"
+METRICS_JSONL_FILE = METRICS_DIR / "metrics.jsonl"
+# Point node_exporter's --collector.textfile.directory at METRICS_DIR to scrape it
+PROMETHEUS_TEXTFILE = METRICS_DIR / "adscraper.prom"
+# Prefix of every exported Prometheus metric name
+METRIC_PREFIX = "adscraper_"
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style) plus count, sum and max."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (max for the overflow bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        """Drops every metric, e.g. between benchmark stages."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """Observes the block's duration in `name`, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        """Returns {"counters": [...], "histograms": [...]} with one entry per name/labels."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.snapshot()}
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def write_jsonl(self, path, **context):
+        """Appends one line with the current snapshot (and `context`, e.g. the run)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        line = {"time": time.time(), "uptime": round(time.time() - self.started, 3), **context}
+        line.update(self.snapshot())
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line) + "\n")
+
+    def prometheus_text(self, prefix=METRIC_PREFIX):
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (
+                k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+                for k, v in pairs
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = prefix + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{label_text(labels)} {value}")
+
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = prefix + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{label_text(labels, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{metric}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{metric}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the textfile atomically, so a collector never reads half of it."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def summary_lines(self):
+        """Human-readable lines: every counter, then histogram count/avg/p95/max."""
+        snap = self.snapshot()
+        lines = []
+        for c in snap["counters"]:
+            lines.append(f"  {c['name']}{_label_suffix(c['labels'])}: {c['value']}")
+        for h in snap["histograms"]:
+            average = h["sum"] / h["count"] if h["count"] else 0.0
+            lines.append(
+                f"  {h['name']}{_label_suffix(h['labels'])}: {h['count']} obs, avg {average:.3f}s, "
+                f"p95 <= {h['p95']}s, max {h['max']:.3f}s"
+            )
+        return lines
+
+
+def _label_suffix(labels):
+    return "{" + ",".join(f"{k}={v}" for k, v in labels.items()) + "}" if labels else ""
+
+
+# Registry shared by every module of the process
+REGISTRY = MetricsRegistry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timed = REGISTRY.timed
+
+
+def export(jsonl_file=None, prometheus_file=None, **context):
+    """
+    Writes the shared registry to the JSON lines file and the Prometheus
+    textfile (default METRICS_JSONL_FILE and PROMETHEUS_TEXTFILE).
+    """
+    jsonl_file = jsonl_file or METRICS_JSONL_FILE
+    prometheus_file = prometheus_file or PROMETHEUS_TEXTFILE
+    try:
+        if jsonl_file:
+            REGISTRY.write_jsonl(jsonl_file, **context)
+        if prometheus_file:
+            REGISTRY.write_prometheus(prometheus_file)
+    except OSError as e:
+        print(f"Could not export metrics: {e}")
+        return
+    print("Metrics:")
+    for line in REGISTRY.summary_lines():
+        print(line)
@@ -0,0 +1,143 @@
+"""Pipelined orchestration: stages connected by bounded queues.
+
+Each stage runs its own pool of worker threads. Items flow from one stage to
+the next through a bounded queue, so while keyword N+1 is being scraped,
+keyword N can be processed and keyword N-1 inserted.
+"""
+import queue
+import threading
+import time
+
+import metrics
+
+# Default capacity of the queue between two stages
+DEFAULT_QUEUE_SIZE = 2
+
+# Marker pushed downstream once every worker of a stage has finished
+_DONE = object()
+
+
+class Stage:
+    """A named pipeline step backed by `workers` threads running `func`."""
+
+    def __init__(self, name, func, workers=1, fan_out=False):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        # With fan_out, func returns several items for the next stage
+        self.fan_out = fan_out
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+        self._remaining = self.workers
+
+    def _record(self, elapsed, ok):
+        metrics.observe("pipeline_stage_seconds", elapsed, stage=self.name)
+        metrics.inc("pipeline_items_total", stage=self.name, result="ok" if ok else "failed")
+        with self._lock:
+            self.busy_seconds += elapsed
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+    def _worker_finished(self):
+        """Returns True for the last worker of the stage to finish."""
+        with self._lock:
+            self._remaining -= 1
+            return self._remaining == 0
+
+
+class Pipeline:
+    """
+    Runs items through a chain of stages.
+
+    A stage function receives one item and returns the item for the next
+    stage. Returning None drops the item (e.g. scraping failed), and an
+    exception is logged and counts as a failure without stopping the run.
+    A stage added with fan_out=True returns an iterable instead, and each
+    of its non-None items is passed on separately.
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+        self.queue_size = max(1, int(queue_size))
+        self.stages = []
+
+    def add_stage(self, name, func, workers=1, fan_out=False):
+        self.stages.append(Stage(name, func, workers, fan_out))
+        return self
+
+    def _run_worker(self, stage, inbox, outbox, downstream_workers):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+
+            started = time.time()
+            try:
+                result = stage.func(item)
+                stage._record(time.time() - started, ok=True)
+            except Exception as e:
+                print(f"[{stage.name}] Failed on {repr(item)[:80]}: {e}")
+                stage._record(time.time() - started, ok=False)
+                continue
+
+            if result is None or outbox is None:
+                continue
+            for output in (result if stage.fan_out else (result,)):
+                if output is not None:
+                    outbox.put(output)
+
+        # The last worker of this stage closes the downstream queue
+        if stage._worker_finished() and outbox is not None:
+            for _ in range(downstream_workers):
+                outbox.put(_DONE)
+
+    def run(self, items):
+        """Feed `items` into the first stage and block until all stages drain."""
+        if not self.stages:
+            return
+
+        start_time = time.time()
+
+        # One queue in front of every stage; the first one is fed by us
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            inbox = queues[index]
+            is_last = index == len(self.stages) - 1
+            outbox = None if is_last else queues[index + 1]
+            downstream_workers = 0 if is_last else self.stages[index + 1].workers
+
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=self._run_worker,
+                    args=(stage, inbox, outbox, downstream_workers),
+                    name=f"{stage.name}-{n + 1}",
+                    daemon=True,
+                )
+                t.start()
+                threads.append(t)
+
+        # Feed the first stage (blocks when it is saturated)
+        for item in items:
+            queues[0].put(item)
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+
+        for t in threads:
+            t.join()
+
+        self.print_summary(time.time() - start_time)
+
+    def print_summary(self, elapsed):
+        print(f"\n{'='*50}")
+        print(f"Pipeline finished in {elapsed:.2f} seconds")
+        for stage in self.stages:
+            print(
+                f"  {stage.name}: {stage.processed} ok, {stage.failed} failed, "
+                f"{stage.workers} worker(s), busy {stage.busy_seconds:.2f}s"
+            )
+        print(f"{'='*50}")
@@ -0,0 +1,169 @@
+"""Adaptive per-endpoint rate limiting with jittered retries for the external APIs."""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+
+# Requests/sec a limiter starts at, and the range it adapts within
+DEFAULT_RATE = 10.0
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_RATE = 50.0
+# Tokens that may be spent at once after an idle period
+DEFAULT_BURST = 5
+# Rate added per second of error-free traffic, and factor applied on throttling
+RATE_INCREASE = 0.5
+RATE_DECREASE = 0.5
+
+# HTTP statuses that mean "slow down / try again"
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.5  # seconds
+RETRY_MAX_DELAY = 30.0  # seconds
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate follows the provider's signals.
+
+    `acquire` blocks until a request may start. Throttling (429/5xx) cuts
+    the rate by RATE_DECREASE, at most once per second. Latency is only
+    tracked for stats_line: it follows the payload (file size, IDs per
+    request) more than the provider's load. Successful traffic adds
+    RATE_INCREASE per second back, up to `max_rate` (AIMD), so the rate
+    settles just under what the endpoint accepts.
+    """
+
+    def __init__(self, name, rate=DEFAULT_RATE, min_rate=DEFAULT_MIN_RATE,
+                 max_rate=DEFAULT_MAX_RATE, burst=DEFAULT_BURST):
+        self.name = name
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._latency = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.requests += 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def _decrease(self, now):
+        # One cut per second, however many in-flight requests report the same storm
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+        self._tokens = min(self._tokens, 1.0)
+
+    def on_success(self, latency):
+        with self._lock:
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE / max(self.rate, 1.0))
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            self._decrease(time.monotonic())
+
+    def count(self, counter):
+        """Bumps the `retries` or `failures` counter."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats_line(self):
+        with self._lock:
+            latency = f"{self._latency:.2f}s" if self._latency is not None else "n/a"
+            return (
+                f"Rate limiter {self.name}: {self.requests} requests, {self.throttled} throttled, "
+                f"{self.retries} retries, {self.failures} gave up | rate {self.rate:.1f}/s, latency {latency}"
+            )
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(url, **params):
+    """
+    Returns the limiter shared by every caller of the endpoint (scheme,
+    host and path of `url`). `params` only apply when it is created.
+    """
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveRateLimiter(parts.path.rsplit("/", 1)[-1] or key, **params)
+        return limiter
+
+
+def retry_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, or the server's Retry-After when it sent one."""
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def request_with_retry(session, url, limiter, max_retries=MAX_RETRIES, method="GET", **kwargs):
+    """
+    Sends a request paced by `limiter`, retrying throttled (RETRY_STATUSES)
+    and failed (connection error, timeout) attempts with jittered backoff.
+    Returns the last response; raises the last exception if no attempt got one.
+    Every attempt is recorded in the external_request_seconds metric.
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        started = time.time()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            metrics.observe("external_request_seconds", time.time() - started, endpoint=limiter.name)
+            metrics.inc("external_requests_total", endpoint=limiter.name, status="error")
+            limiter.on_throttle()
+            if attempt == max_retries:
+                limiter.count("failures")
+                raise
+            limiter.count("retries")
+            time.sleep(retry_delay(attempt))
+            continue
+
+        metrics.observe("external_request_seconds", time.time() - started, endpoint=limiter.name)
+        metrics.inc("external_requests_total", endpoint=limiter.name, status=response.status_code)
+        if response.status_code in RETRY_STATUSES:
+            limiter.on_throttle()
+            if attempt == max_retries:
+                limiter.count("failures")
+                return response
+            limiter.count("retries")
+            time.sleep(retry_delay(attempt, response.headers.get("Retry-After")))
+            continue
+
+        limiter.on_success(time.time() - started)
+        return response
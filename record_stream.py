@@ -0,0 +1,90 @@
+"""Helpers for streaming records between the scraper, processor and inserter."""
+import csv
+import queue
+import threading
+from itertools import islice
+
+from durable_writer import GroupCommitCsvWriter
+
+# Marker closing a BackgroundIterator's queue
+_END = object()
+
+
+def iter_csv(filepath):
+    """Yields the rows of a CSV file as dictionaries, one at a time."""
+    with open(filepath, mode='r', encoding='utf-8-sig') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            yield row
+
+
+def chunked(iterable, size):
+    """Yields lists of up to `size` items without materializing the input."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def tee_to_csv(records, filepath, fieldnames, durable=False, resume=False, on_commit=None):
+    """
+    Optional CSV checkpoint sink: writes every record to `filepath` as it
+    passes through and yields it unchanged. With `durable`, rows go through
+    a GroupCommitCsvWriter (journaled, fsync per group of rows); `resume`
+    and `on_commit` are passed on to it.
+    """
+    if durable:
+        with GroupCommitCsvWriter(filepath, fieldnames, resume=resume, on_commit=on_commit) as writer:
+            for record in records:
+                writer.writerow(record)
+                yield record
+        return
+
+    with open(filepath, mode='w', newline='', encoding='utf-8') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            yield record
+
+
+class BackgroundIterator:
+    """
+    Runs `iterable` on its own thread and exposes its items through a
+    bounded queue, so the producer keeps working while the consumer is
+    busy. Exceptions raised by the producer are re-raised to the consumer.
+    `on_finish` is called on the producer thread once it stops.
+    """
+
+    def __init__(self, iterable, maxsize=100, on_finish=None, name="background-iterator"):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._on_finish = on_finish
+        self._error = None
+        self._finished = False
+        self._thread = threading.Thread(target=self._produce, args=(iterable,), name=name, daemon=True)
+        self._thread.start()
+
+    def _produce(self, iterable):
+        try:
+            for item in iterable:
+                self._queue.put(item)
+        except Exception as e:
+            self._error = e
+        finally:
+            if self._on_finish is not None:
+                self._on_finish()
+            self._queue.put(_END)
+
+    def __iter__(self):
+        # Iterating again after the end (e.g. to drain) yields nothing
+        while not self._finished:
+            item = self._queue.get()
+            if item is _END:
+                self._finished = True
+                self._thread.join()
+                if self._error is not None:
+                    raise self._error
+                break
+            yield item
@@ -0,0 +1,141 @@
+"""Run journal: completed stages per keyword and completed batches per file, for resuming."""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+STATE_DIR = Path(__file__).parent / "state"
+JOURNAL_FILE = STATE_DIR / "run_journal.sqlite3"
+
+
+def batch_key(library_ids):
+    """
+    Identifies a batch by its LibraryIDs. Keys only match on resume if the
+    batches are cut the same way, e.g. by position in the same input file.
+    """
+    joined = ",".join(str(lib_id) for lib_id in library_ids)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """
+    Records progress so a restart resumes where the last run stopped.
+
+    - Runs: one per keywords file; an unfinished run is resumed.
+    - Stages: (run, keyword, stage) -> detail, e.g. the scraped CSV filename.
+    - Batches: keys completed inside a scope (a processed file, an insert).
+      A scope is cleared once its work completes, so a later run over the
+      same file starts fresh.
+    """
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " started_at REAL NOT NULL,"
+            " finished_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stages ("
+            " run_id TEXT NOT NULL,"
+            " keyword TEXT NOT NULL,"
+            " stage TEXT NOT NULL,"
+            " detail TEXT,"
+            " completed_at REAL NOT NULL,"
+            " PRIMARY KEY (run_id, keyword, stage))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS batches ("
+            " scope TEXT NOT NULL,"
+            " batch_key TEXT NOT NULL,"
+            " completed_at REAL NOT NULL,"
+            " PRIMARY KEY (scope, batch_key))"
+        )
+        self._conn.commit()
+
+    # --- Runs ---
+
+    def start_run(self, name):
+        """Returns the unfinished run for `name`, or starts a new one."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id FROM runs WHERE name = ? AND finished_at IS NULL"
+                " ORDER BY started_at DESC LIMIT 1",
+                (name,),
+            ).fetchone()
+            if row:
+                print(f"Resuming run {row[0]}")
+                return row[0]
+
+            run_id = f"{name}@{time.strftime('%Y%m%d_%H%M%S')}"
+            self._conn.execute(
+                "INSERT INTO runs (run_id, name, started_at) VALUES (?, ?, ?)",
+                (run_id, name, time.time()),
+            )
+            self._conn.commit()
+            return run_id
+
+    def finish_run(self, run_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id)
+            )
+            self._conn.commit()
+
+    # --- Stages per keyword ---
+
+    def mark_stage(self, run_id, keyword, stage, detail=""):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stages (run_id, keyword, stage, detail, completed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (run_id, keyword, stage, detail, time.time()),
+            )
+            self._conn.commit()
+
+    def stage_detail(self, run_id, keyword, stage):
+        """Returns the detail stored for a completed stage, or None if it did not complete."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT detail FROM stages WHERE run_id = ? AND keyword = ? AND stage = ?",
+                (run_id, keyword, stage),
+            ).fetchone()
+        return None if row is None else (row[0] or "")
+
+    # --- Batches per scope ---
+
+    def completed_batches(self, scope):
+        with self._lock:
+            return {
+                key for (key,) in self._conn.execute(
+                    "SELECT batch_key FROM batches WHERE scope = ?", (scope,)
+                )
+            }
+
+    def mark_batches(self, scope, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO batches (scope, batch_key, completed_at) VALUES (?, ?, ?)",
+                [(scope, key, now) for key in keys],
+            )
+            self._conn.commit()
+
+    def clear_scope(self, scope):
+        with self._lock:
+            self._conn.execute("DELETE FROM batches WHERE scope = ?", (scope,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
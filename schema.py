@@ -0,0 +1,175 @@
+"""Column schema of processed rows and adsdomains, compiled into a row-conversion plan."""
+import json
+from typing import NamedTuple
+
+
+class Column(NamedTuple):
+    name: str                 # adsdomains column
+    source: str               # processed CSV column it is read from
+    kind: str = "text"        # text | int | bool | json
+    empty_json: str = None    # stored for an empty json column
+
+
+def _col(name, kind="text", source=None, empty_json=None):
+    return Column(name, source or name, kind, empty_json)
+
+
+# adsdomains columns in INSERT order (AdDescription_plain/AdTitle_plain are
+# GENERATED columns and never inserted)
+ADSDOMAINS_COLUMNS = [
+    _col('cta_text'),
+    _col('cta_type'),
+    _col('__html'),
+    _col('page_profile_uri'),
+    _col('publisherPlatform', 'json', empty_json='["facebook"]'),
+    _col('URLCreative'),
+    _col('url_preview_creative'),
+    _col('AdCreative'),
+    _col('AdMedia'),
+    _col('profilePict'),
+    _col('page_profile_picture_url'),
+    _col('Active', 'bool'),
+    _col('Estatus', 'bool'),
+    _col('CollectionCount', 'int'),
+    _col('CollationID', 'int'),
+    _col('startDate', 'int'),
+    _col('endDate', 'int'),
+    _col('LibraryID', source='libraryID'),
+    _col('ahref'),
+    _col('pageName'),
+    _col('pageID'),
+    _col('AdDescription', 'json', empty_json='["Sin titulo"]'),
+    _col('AdTitle', 'json', empty_json='["Sin titulo"]'),
+    _col('age', 'json', empty_json='[]'),
+    _col('gender'),
+    _col('languages', 'json', empty_json='[]'),
+    _col('countries', 'json', empty_json='[]'),
+    _col('daysSincePublication', 'int'),
+    _col('lazy_load', 'bool'),
+    _col('contains_details', 'bool'),
+    _col('domain'),
+    _col('codeBelongs'),
+    _col('keywords', source='Keyword'),
+    _col('duplicates', 'int', source='Duplicates'),
+    _col('createdAt'),
+    _col('updatedAt'),
+]
+
+# Columns of the processed_*.csv files written by ads_processor, in file order
+PROCESSED_FIELDNAMES = [
+    # Original
+    "libraryID", "startDate", "Duplicates", "Keyword",
+    # New
+    "cta_text", "cta_type", "__html", "page_profile_uri", "publisherPlatform",
+    "URLCreative", "url_preview_creative", "AdCreative", "AdMedia",
+    "profilePict", "page_profile_picture_url", "Active", "Estatus",
+    "CollectionCount", "CollationID", "endDate", "LibraryID", "ahref",
+    "pageName", "pageID", "AdDescription", "AdTitle", "age", "gender",
+    "languages", "countries", "lazy_load", "contains_details", "domain",
+    "createdAt", "updatedAt", "AdDescription_plain", "AdTitle_plain",
+    "daysSincePublication", "codeBelongs"
+]
+
+_unmapped = [c.source for c in ADSDOMAINS_COLUMNS if c.source not in PROCESSED_FIELDNAMES]
+if _unmapped:
+    raise ValueError(f"adsdomains columns without a processed CSV column: {_unmapped}")
+
+DB_FIELDS = [c.name for c in ADSDOMAINS_COLUMNS]
+
+# --- Converters (one per column kind) ---
+
+_BOOL_WORDS = {'true': 1, '1': 1, 'yes': 1, 'false': 0, '0': 0, 'no': 0}
+# First characters a JSON document can start with; anything else is plain text
+_JSON_STARTS = frozenset('[{"-0123456789tfn \t\r\n')
+
+
+# Streamed rows keep their Python types while rows read back from a CSV
+# checkpoint are all strings; non-str values are converted through str()
+# (what csv.writer writes) so both give the same DB values.
+
+def _text(value):
+    if value == '' or value is None:
+        return None
+    return value if type(value) is str else str(value)
+
+
+def _int(value):
+    if value == '' or value is None:
+        return None
+    if type(value) is int:
+        return value
+    if type(value) is not str:
+        value = str(value)
+    if len(value) < 16 and value.isascii() and value.isdigit():
+        # Exact for every value float() would also represent exactly
+        return int(value)
+    try:
+        return int(float(value))
+    except (ValueError, TypeError):
+        return None
+
+
+def _bool(value):
+    if value == '' or value is None:
+        return None
+    if isinstance(value, bool):
+        return 1 if value else 0
+    return _BOOL_WORDS.get(str(value).lower())
+
+
+def _json(empty_json):
+    def convert(value):
+        if value == '' or value is None:
+            return empty_json
+        if type(value) is not str:
+            value = str(value)
+        # Only parse values that could be JSON; plain text is wrapped directly
+        if value[:1] in _JSON_STARTS:
+            try:
+                json.loads(value)
+                return value
+            except ValueError:
+                pass
+        return json.dumps([value])
+    return convert
+
+
+def compile_converter(column):
+    if column.kind == "int":
+        return _int
+    if column.kind == "bool":
+        return _bool
+    if column.kind == "json":
+        return _json(column.empty_json)
+    return _text
+
+
+class RowPlan:
+    """
+    Conversion plan compiled once from a column list: for every column, the
+    source key to read and the converter to apply. Converts one row
+    (`convert`) or a whole batch column by column (`convert_batch`) into
+    value tuples in column order.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.names = [c.name for c in self.columns]
+        self.steps = [(c.source, compile_converter(c)) for c in self.columns]
+        self.converters = {c.name: conv for c, (_, conv) in zip(self.columns, self.steps)}
+
+    def convert(self, row):
+        return tuple([convert(row.get(source)) for source, convert in self.steps])
+
+    def convert_batch(self, rows):
+        rows = rows if isinstance(rows, list) else list(rows)
+        if not rows:
+            return []
+        converted = [
+            list(map(convert, [row.get(source) for row in rows]))
+            for source, convert in self.steps
+        ]
+        return list(zip(*converted))
+
+
+ADSDOMAINS_PLAN = RowPlan(ADSDOMAINS_COLUMNS)
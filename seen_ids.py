@@ -0,0 +1,75 @@
+"""Per keyword/country index of LibraryIDs the scraper has already seen."""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from ttl_cache import CACHE_DIR
+
+SEEN_IDS_FILE = CACHE_DIR / "seen_library_ids.sqlite3"
+
+# IDs not seen again for this long are forgotten
+SEEN_IDS_MAX_AGE = 30 * 24 * 3600  # seconds
+
+
+class SeenIdIndex:
+    """
+    LibraryIDs extracted by earlier scrapes, kept per (keyword, country)
+    with the time they were first and last seen. Lets an incremental
+    scrape stop scrolling once it only finds ads it already knows.
+    """
+
+    def __init__(self, path=SEEN_IDS_FILE, max_age=SEEN_IDS_MAX_AGE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " keyword TEXT NOT NULL,"
+            " country TEXT NOT NULL,"
+            " library_id TEXT NOT NULL,"
+            " first_seen REAL NOT NULL,"
+            " last_seen REAL NOT NULL,"
+            " PRIMARY KEY (keyword, country, library_id))"
+        )
+        self._conn.commit()
+
+    def known(self, keyword, country):
+        """Returns the set of LibraryIDs seen for this keyword/country within max_age."""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            return {
+                library_id for (library_id,) in self._conn.execute(
+                    "SELECT library_id FROM seen WHERE keyword = ? AND country = ? AND last_seen >= ?",
+                    (keyword, country, cutoff),
+                )
+            }
+
+    def record(self, keyword, country, library_ids):
+        """Marks IDs as seen now and forgets this scope's IDs older than max_age."""
+        now = time.time()
+        rows = [
+            (keyword, country, str(library_id), now, now)
+            for library_id in library_ids
+            if library_id and library_id != "N/A"
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO seen (keyword, country, library_id, first_seen, last_seen)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (keyword, country, library_id) DO UPDATE SET last_seen = excluded.last_seen",
+                rows,
+            )
+            self._conn.execute(
+                "DELETE FROM seen WHERE keyword = ? AND country = ? AND last_seen < ?",
+                (keyword, country, now - self.max_age),
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,208 @@
+"""Pool of Facebook accounts (credentials + cookie file) shared by the scraper browsers."""
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from facebook_auth import FacebookAuth, COOKIES_DIR, COOKIES_FILE
+
+# JSON list of accounts: [{"email": ..., "password": ..., "cookies": "fb_cookies_2.json"}, ...]
+# (cookie paths are relative to COOKIES_DIR). Without it, the .env account is used alone.
+ACCOUNTS_FILE = COOKIES_DIR / "accounts.json"
+
+# Scrapes one account may start per SESSION_RATE_WINDOW (None = no cap, only used for ranking)
+SESSION_MAX_RATE = None
+SESSION_RATE_WINDOW = 3600  # seconds
+# Browsers logged into the same account at the same time
+SESSION_MAX_CONCURRENT = 1
+# Consecutive failures after which an account is paused, and the pause (doubling per extra failure)
+SESSION_FAILURES_BEFORE_COOLDOWN = 2
+SESSION_COOLDOWN = 300  # seconds
+SESSION_MAX_COOLDOWN = 3600  # seconds
+
+
+class FacebookSession:
+    """One account: its credentials, cookie file and usage bookkeeping."""
+
+    def __init__(self, label, email=None, password=None, cookies_file=COOKIES_FILE):
+        self.label = label
+        self.email = email
+        self.password = password
+        self.cookies_file = Path(cookies_file)
+        self.in_use = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self.total_uses = 0
+        self._starts = deque()
+
+    def auth(self, driver=None):
+        return FacebookAuth(driver, email=self.email, password=self.password, cookies_file=self.cookies_file)
+
+    def recent_uses(self, window, now=None):
+        """Scrapes started within the last `window` seconds."""
+        cutoff = (now or time.time()) - window
+        while self._starts and self._starts[0] < cutoff:
+            self._starts.popleft()
+        return len(self._starts)
+
+    def __repr__(self):
+        return f"FacebookSession({self.label!r})"
+
+
+def load_accounts(path=ACCOUNTS_FILE):
+    """Returns the configured sessions; falls back to the single .env account."""
+    path = Path(path)
+    if not path.exists():
+        return [FacebookSession("default", os.getenv("FB_EMAIL"), os.getenv("FB_PASSWORD"), COOKIES_FILE)]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    sessions = []
+    for index, entry in enumerate(entries, start=1):
+        cookies = entry.get("cookies") or f"fb_cookies_{index}.json"
+        sessions.append(FacebookSession(
+            entry.get("label") or entry.get("email") or f"account-{index}",
+            entry.get("email"),
+            entry.get("password"),
+            COOKIES_DIR / cookies,
+        ))
+    if not sessions:
+        raise ValueError(f"No accounts listed in {path}")
+    return sessions
+
+
+class SessionPool:
+    """
+    Hands each browser the least-loaded healthy account.
+
+    An account is available while it is under `max_concurrent` browsers,
+    under `max_rate` scrapes per `window` and not cooling down. Cooldowns
+    start after `failures_before_cooldown` consecutive failed scrapes (or
+    a reported throttle) and double with every further failure, unless no
+    other account is usable (then the account keeps scraping). Among the
+    available accounts, the one with the fewest recent scrapes wins.
+    """
+
+    def __init__(self, sessions=None, max_rate=SESSION_MAX_RATE, window=SESSION_RATE_WINDOW,
+                 max_concurrent=SESSION_MAX_CONCURRENT,
+                 failures_before_cooldown=SESSION_FAILURES_BEFORE_COOLDOWN,
+                 cooldown=SESSION_COOLDOWN, max_cooldown=SESSION_MAX_COOLDOWN):
+        self.sessions = list(sessions) if sessions is not None else load_accounts()
+        self.max_rate = max_rate
+        self.window = window
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.failures_before_cooldown = max(1, int(failures_before_cooldown))
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._cond = threading.Condition()
+
+    def _usable(self, session, now):
+        if session.cooldown_until > now:
+            return False
+        if self.max_rate and session.recent_uses(self.window, now) >= self.max_rate:
+            return False
+        return True
+
+    def _available_at(self, session, now):
+        """Earliest time the session could be handed out again (ignoring concurrency)."""
+        at = session.cooldown_until
+        if self.max_rate and session.recent_uses(self.window, now) >= self.max_rate:
+            at = max(at, session._starts[0] + self.window)
+        return at
+
+    def capacity(self):
+        """Browsers the accounts can serve at the same time."""
+        return len(self.sessions) * self.max_concurrent
+
+    def usable(self, session):
+        """True if a browser holding `session` may start another scrape now."""
+        with self._cond:
+            return self._usable(session, time.time())
+
+    def acquire(self, timeout=None):
+        """Returns the least-loaded available session, waiting for one; None on timeout."""
+        deadline = time.time() + timeout if timeout is not None else None
+        announced = False
+        with self._cond:
+            while True:
+                now = time.time()
+                candidates = [
+                    s for s in self.sessions
+                    if s.in_use < self.max_concurrent and self._usable(s, now)
+                ]
+                if candidates:
+                    session = min(
+                        candidates,
+                        key=lambda s: (s.in_use, s.recent_uses(self.window, now), s.failures),
+                    )
+                    session.in_use += 1
+                    return session
+
+                free = [s for s in self.sessions if s.in_use < self.max_concurrent]
+                wake_at = min((self._available_at(s, now) for s in free), default=None)
+                if deadline is not None:
+                    wake_at = deadline if wake_at is None else min(wake_at, deadline)
+                    if now >= deadline:
+                        return None
+                if not announced:
+                    print(f"SessionPool: every account is busy, rate-limited or cooling down; waiting. {self.stats_line()}")
+                    announced = True
+                self._cond.wait(None if wake_at is None else max(0.1, wake_at - now))
+
+    def record_use(self, session, failed=False):
+        """Counts one scrape on the session; consecutive failures start a cooldown."""
+        with self._cond:
+            session._starts.append(time.time())
+            session.total_uses += 1
+            if failed:
+                session.failures += 1
+                if session.failures >= self.failures_before_cooldown:
+                    self._start_cooldown(session)
+            else:
+                session.failures = 0
+            self._cond.notify_all()
+
+    def report_throttled(self, session):
+        """Pauses the session right away (login checkpoint, rate-limit page, ...)."""
+        with self._cond:
+            session.failures = max(session.failures + 1, self.failures_before_cooldown)
+            self._start_cooldown(session)
+            self._cond.notify_all()
+
+    def _start_cooldown(self, session):
+        now = time.time()
+        if not any(s is not session and self._usable(s, now) for s in self.sessions):
+            # Pausing the last usable account would stop every scrape; keep it going
+            print(f"SessionPool: account {session.label} failed {session.failures} time(s), "
+                  f"but no other account is usable; not cooling it down.")
+            return
+        extra = session.failures - self.failures_before_cooldown
+        pause = min(self.cooldown * (2 ** extra), self.max_cooldown)
+        session.cooldown_until = now + pause
+        print(f"SessionPool: account {session.label} cooling down for {pause:.0f}s "
+              f"after {session.failures} failure(s).")
+
+    def release(self, session):
+        """Gives the session back once its browser is gone."""
+        if session is None:
+            return
+        with self._cond:
+            session.in_use = max(0, session.in_use - 1)
+            self._cond.notify_all()
+
+    def stats_line(self):
+        now = time.time()
+        with self._cond:
+            parts = []
+            for s in self.sessions:
+                recent = s.recent_uses(self.window, now)
+                if s.cooldown_until > now:
+                    state = f"cooldown {s.cooldown_until - now:.0f}s"
+                elif self.max_rate and recent >= self.max_rate:
+                    state = "rate-limited"
+                else:
+                    state = "ok"
+                parts.append(f"{s.label}: {recent} recent, {s.in_use} in use, {state}")
+        return "Sessions: " + "; ".join(parts)
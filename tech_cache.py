@@ -0,0 +1,118 @@
+"""Two-level cache (in-memory LRU + persistent TTL store) for technology detection."""
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Landing pages kept in memory per detector
+DEFAULT_MEMORY_SIZE = 2048
+
+
+def normalize_landing_url(url):
+    """
+    Returns the cache key for a landing URL: lowercase host without
+    'www.' or port, plus the path without trailing slash. Query strings
+    and fragments (utm_*, fbclid, ...) are dropped. The path is kept
+    because shared hosts (checkout platforms, link-in-bio pages, site
+    builders) serve many sellers with different stacks under one domain.
+    """
+    url = str(url or "").strip()
+    if not url:
+        return ""
+    if "://" not in url:
+        url = "http://" + url
+
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/")
+    return f"{host}{path}"
+
+
+class CachedTechnologyDetector:
+    """
+    Wraps a TechnologyDetector so each landing page is fingerprinted once.
+
+    Lookups go to an in-memory LRU first, then to the optional persistent
+    cache (ttl_cache.PersistentTTLCache), whose TTL controls invalidation.
+    Failed detections are not cached. Empty results (often a transient
+    fetch miss) and the output of a detector with `persist_results = False`
+    (e.g. a placeholder) only go to the in-memory level, so they do not
+    hide a site for the whole TTL.
+    """
+
+    def __init__(self, detector, persistent_cache=None, memory_size=DEFAULT_MEMORY_SIZE):
+        self.detector = detector
+        self.persist_results = getattr(detector, "persist_results", True)
+        self.persistent_cache = persistent_cache
+        self.memory_size = max(1, int(memory_size))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.detections = 0
+
+    def _remember(self, key, technologies):
+        with self._lock:
+            self._memory[key] = technologies
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _from_memory(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+        return None
+
+    def detect_technologies(self, url):
+        """Same contract as TechnologyDetector.detect_technologies, but cached."""
+        key = normalize_landing_url(url)
+        if not key:
+            return self.detector.detect_technologies(url)
+
+        technologies = self._from_memory(key)
+        if technologies is not None:
+            return technologies
+
+        if self.persistent_cache is not None:
+            technologies = self.persistent_cache.get(key)
+            if technologies is not None:
+                self._remember(key, technologies)
+                return technologies
+
+        technologies = list(self.detector.detect_technologies(url) or [])
+        self.detections += 1
+        self._remember(key, technologies)
+        if self.persistent_cache is not None and self.persist_results and technologies:
+            self.persistent_cache.set(key, technologies)
+        return technologies
+
+    def detect_many(self, urls):
+        """
+        Detects a group of URLs, running the detector once per normalized
+        landing page. Returns {url: technologies}; URLs whose detection
+        failed are left out.
+        """
+        by_key = OrderedDict()
+        for url in urls:
+            if url:
+                by_key.setdefault(normalize_landing_url(url), []).append(url)
+
+        results = {}
+        for key, group in by_key.items():
+            try:
+                technologies = self.detect_technologies(group[0])
+            except Exception as e:
+                print(f"Tech detection failed for {group[0]}: {e}")
+                continue
+            for url in group:
+                results[url] = technologies
+        return results
+
+    def stats_line(self):
+        line = f"Tech detection: {self.detections} detected, {self.memory_hits} memory hits"
+        if self.persistent_cache is not None:
+            line += f" | {self.persistent_cache.stats_line('persistent')}"
+        return line
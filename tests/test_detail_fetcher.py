@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+import rate_limiter
+from detail_fetcher import BatchSizeController, DetailFetcher
+from fixtures.external_apis import DETAIL_PATH, make_detail, start_server
+
+
+@pytest.fixture(autouse=True)
+def no_retry_wait(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "RETRY_BASE_DELAY", 0)
+
+
+def make_fetcher(detail_latency=0.0, batch_size=5, **server_options):
+    server, base = start_server(detail_latency=detail_latency, detail_latency_per_id=0, **server_options)
+    url = base + DETAIL_PATH
+    fetcher = DetailFetcher(
+        url, concurrency=4,
+        limiter=rate_limiter.AdaptiveRateLimiter(url, rate=1000, max_rate=1000, burst=100),
+        batcher=BatchSizeController(url, initial=batch_size, max_size=batch_size),
+    )
+    return server, fetcher
+
+
+def id_batches(count, per_batch=3):
+    ids = [str(2000000000000000 + i) for i in range(count)]
+    return [(n, ids[i:i + per_batch]) for n, i in enumerate(range(0, count, per_batch))]
+
+
+def test_iter_lookups_keeps_order_and_yields_before_input_ends():
+    server, fetcher = make_fetcher(detail_latency=0.05)
+    batches = id_batches(60)
+    first_yield = []
+
+    def slow_input():
+        for batch in batches:
+            yield batch
+            time.sleep(0.02)
+
+    try:
+        started = time.perf_counter()
+        results = []
+        for result in fetcher.iter_lookups(slow_input()):
+            first_yield.append(time.perf_counter() - started)
+            results.append(result)
+    finally:
+        fetcher.close()
+        server.shutdown()
+
+    assert [tag for tag, _, _ in results] == [tag for tag, _ in batches]
+    for (_, ids_list), (_, lookup, failed) in zip(batches, results):
+        assert lookup == {lib_id: make_detail(lib_id) for lib_id in ids_list}
+        assert failed == set()
+    # Reading the whole input takes about 0.4s; the first lookup must not wait for it
+    assert first_yield[0] < 0.3
+
+
+def test_iter_lookups_reports_failed_ids_without_splitting():
+    server, fetcher = make_fetcher(error_rate=1.0)
+    batches = id_batches(12)
+    try:
+        results = list(fetcher.iter_lookups(batches))
+    finally:
+        fetcher.close()
+        server.shutdown()
+
+    assert [tag for tag, _, _ in results] == [tag for tag, _ in batches]
+    for (_, ids_list), (_, lookup, failed) in zip(batches, results):
+        assert lookup == {}
+        assert failed == set(ids_list)
+    # Every request was retried, but none was split into smaller ones
+    assert server.stats["detail_502"] == fetcher.batcher.failures * (rate_limiter.MAX_RETRIES + 1)
+
+
+def test_iter_lookups_isolates_an_id_the_api_rejects():
+    batches = id_batches(12)
+    bad_id = batches[1][1][1]
+    server, fetcher = make_fetcher(bad_ids=[bad_id])
+    try:
+        results = list(fetcher.iter_lookups(batches))
+    finally:
+        fetcher.close()
+        server.shutdown()
+
+    for (_, ids_list), (_, lookup, failed) in zip(batches, results):
+        assert lookup == {lib_id: make_detail(lib_id) for lib_id in ids_list if lib_id != bad_id}
+        assert failed == ({bad_id} & set(ids_list))
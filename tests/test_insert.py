@@ -0,0 +1,67 @@
+from collections import Counter
+
+import pymysql
+import pytest
+
+import insertProcessedCsv
+from db_pool import ConnectionPool
+from fixtures.db_standin import StandInConnection
+from run_journal import RunJournal
+from test_schema import make_streamed_row
+
+BAD_ID = str(1000000000000000 + 37)
+
+
+def reject_bad_row(sql):
+    if sql.startswith("INSERT") and f"'{BAD_ID}'" in sql:
+        return pymysql.err.DataError(1366, "Incorrect integer value")
+    return None
+
+
+def test_bulk_insert_isolating_loses_only_the_bad_row():
+    connection = StandInConnection(store=True, fail_on=reject_bad_row)
+    rows = [make_streamed_row(i) for i in range(100)]
+    with connection.cursor() as cursor:
+        # A small packet spreads the chunk over several statements
+        inserted, skipped, failed = insertProcessedCsv.bulk_insert_isolating(cursor, rows, max_packet=8000)
+    connection.commit()
+
+    assert (inserted, skipped, failed) == (99, 0, 1)
+    assert sum(sql.startswith("INSERT") and "),(" in sql for sql in connection.statements) > 1
+    assert sorted(connection.committed) == sorted(r["libraryID"] for r in rows if r["libraryID"] != BAD_ID)
+
+
+def test_bulk_insert_isolating_raises_connection_errors():
+    connection = StandInConnection(
+        store=True, fail_on=lambda sql: pymysql.err.OperationalError(2013, "Lost connection")
+        if sql.startswith("INSERT") else None
+    )
+    with connection.cursor() as cursor, pytest.raises(pymysql.err.OperationalError):
+        insertProcessedCsv.bulk_insert_isolating(cursor, [make_streamed_row(0)], max_packet=8000)
+
+
+def test_insert_records_resumes_from_journal_after_connection_loss(tmp_path, monkeypatch):
+    monkeypatch.setattr(insertProcessedCsv, "BULK_CHUNK_ROWS", 10)
+    rows = [make_streamed_row(i) for i in range(50)]
+    connection = StandInConnection(store=True)
+    inserts = []
+
+    def drop_third_insert(sql):
+        if sql.startswith("INSERT"):
+            inserts.append(sql)
+            if len(inserts) == 3:
+                return pymysql.err.OperationalError(2013, "Lost connection")
+        return None
+
+    connection.fail_on = drop_third_insert
+    pool = ConnectionPool(lambda: connection)
+    journal = RunJournal(tmp_path / "journal.sqlite3")
+    try:
+        assert insertProcessedCsv.insert_records(rows, journal, "processed_truque.csv", "bulk", pool) is None
+        assert len(connection.committed) == 20
+
+        assert insertProcessedCsv.insert_records(rows, journal, "processed_truque.csv", "bulk", pool) == (30, 0)
+        assert Counter(connection.committed) == Counter(r["libraryID"] for r in rows)
+        assert journal.completed_batches("processed_truque.csv") == set()
+    finally:
+        journal.close()
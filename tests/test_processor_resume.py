@@ -0,0 +1,67 @@
+import time
+from collections import Counter
+
+import pytest
+
+import ads_processor
+import rate_limiter
+from fixtures.external_apis import DETAIL_PATH, UPLOAD_PATH, FixtureTechnologyDetector, start_server
+from record_stream import iter_csv
+from run_journal import RunJournal
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    server, base = start_server(detail_latency=0.0, detail_latency_per_id=0, upload_latency=0.0)
+    monkeypatch.setattr(ads_processor, "API_URL", base + DETAIL_PATH)
+    monkeypatch.setattr(ads_processor, "CLOUD_FUNCTION_URL", base + UPLOAD_PATH)
+    monkeypatch.setattr(ads_processor, "TechnologyDetector", FixtureTechnologyDetector)
+    for name in ("DETAIL_CACHE_FILE", "TECH_CACHE_FILE", "UPLOAD_MANIFEST_FILE", "KNOWN_IDS_SNAPSHOT_FILE"):
+        monkeypatch.setattr(ads_processor, name, None)
+    for name in ("API_RATE", "API_MAX_RATE", "UPLOAD_RATE", "UPLOAD_MAX_RATE"):
+        monkeypatch.setattr(ads_processor, name, 1000.0)
+    monkeypatch.setattr(rate_limiter, "RETRY_BASE_DELAY", 0)
+    yield server
+    server.shutdown()
+
+
+def make_records(count, crash_after=None, delay=0.0):
+    """Scraped records; with `crash_after` the scraper dies after that many."""
+    for i in range(count):
+        if i == crash_after:
+            raise Crash("scraper died")
+        time.sleep(delay)
+        yield {"libraryID": str(3000000000000000 + i), "startDate": "2024-12-12", "Duplicates": "1"}
+
+
+def test_process_to_checkpoint_resumes_after_a_crash(processor, tmp_path, capsys):
+    output_file = str(tmp_path / "processed_truque.csv")
+    journal = RunJournal(tmp_path / "journal.sqlite3")
+    try:
+        # A slow scraper lets some group commits land before it dies
+        with pytest.raises(Crash):
+            for _ in ads_processor.process_to_checkpoint(make_records(200, crash_after=120, delay=0.01),
+                                                         "truque", output_file, journal):
+                pass
+        partial = [row["libraryID"] for row in iter_csv(output_file)]
+        assert partial
+
+        capsys.readouterr()
+        rows = list(ads_processor.process_to_checkpoint(make_records(200), "truque", output_file, journal))
+        assert f"Resuming {output_file}" in capsys.readouterr().out
+    finally:
+        journal.close()
+
+    written = [row["libraryID"] for row in iter_csv(output_file)]
+    assert Counter(written) == Counter(row["libraryID"] for row in rows)
+    assert max(Counter(written).values()) == 1
+    assert set(partial) < set(written)
+
+    # A run that never crashed keeps the same rows
+    fresh_file = str(tmp_path / "processed_fresh.csv")
+    fresh = [row["libraryID"] for row in ads_processor.process_to_checkpoint(make_records(200), "truque", fresh_file)]
+    assert sorted(written) == sorted(fresh)
@@ -0,0 +1,54 @@
+import csv
+
+from record_stream import iter_csv
+from schema import ADSDOMAINS_PLAN, PROCESSED_FIELDNAMES
+
+
+def make_streamed_row(i):
+    """A processed row as ads_processor yields it, with native Python types."""
+    row = {name: "" for name in PROCESSED_FIELDNAMES}
+    row.update({
+        "libraryID": str(1000000000000000 + i),
+        "LibraryID": str(1000000000000000 + i),
+        "startDate": 1733961600 + i,
+        "endDate": None,
+        "Duplicates": i % 3,
+        "Keyword": "truque",
+        "publisherPlatform": ["facebook", "instagram"],
+        "AdTitle": ["Oferta"],
+        "AdDescription": "Texto sin JSON",
+        "age": 0,
+        "languages": 1.5,
+        "countries": {"BR": True},
+        "Active": True,
+        "Estatus": False,
+        "CollectionCount": 2.0,
+        "CollationID": True,
+        "lazy_load": 1,
+        "contains_details": 0,
+        "daysSincePublication": i,
+        "pageID": 123456,
+        "codeBelongs": "Shopify,Hotmart",
+    })
+    return row
+
+
+def test_streamed_and_csv_rows_convert_identically(tmp_path):
+    streamed = [make_streamed_row(i) for i in range(5)]
+    path = tmp_path / "processed_truque.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=PROCESSED_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(streamed)
+    loaded = list(iter_csv(path))
+
+    assert [ADSDOMAINS_PLAN.convert(r) for r in streamed] == [ADSDOMAINS_PLAN.convert(r) for r in loaded]
+    assert ADSDOMAINS_PLAN.convert_batch(streamed) == ADSDOMAINS_PLAN.convert_batch(loaded)
+
+
+def test_json_column_keeps_json_text_and_wraps_plain_text():
+    convert = ADSDOMAINS_PLAN.converters["age"]
+    assert convert(0) == convert("0") == "0"
+    assert convert("") == "[]"
+    assert convert('["18-24"]') == '["18-24"]'
+    assert convert("Sin edad") == '["Sin edad"]'
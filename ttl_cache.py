@@ -0,0 +1,133 @@
+"""Persistent key/value cache with TTL and size-bounded eviction (SQLite backed)."""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Directory for every on-disk cache of the pipeline
+CACHE_DIR = Path(__file__).parent / "cache"
+
+# Number of entries removed past max_entries in one eviction pass
+_EVICT_SLACK = 0.1
+
+
+class PersistentTTLCache:
+    """
+    JSON values stored in a SQLite table keyed by string.
+
+    Entries older than `ttl_seconds` are treated as misses. When the table
+    grows past `max_entries`, the least recently used entries are evicted.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path, ttl_seconds, max_entries=100_000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries(accessed_at)")
+        self._conn.commit()
+
+    def _is_fresh(self, stored_at, now):
+        return self.ttl_seconds is None or now - stored_at < self.ttl_seconds
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        """Returns {key: value} for the keys that are cached and not stale."""
+        keys = [str(k) for k in keys]
+        if not keys:
+            return {}
+
+        now = time.time()
+        found = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor = self._conn.execute(
+                    f"SELECT key, value, stored_at FROM entries WHERE key IN ({placeholders})",
+                    chunk,
+                )
+                for key, value, stored_at in cursor:
+                    if self._is_fresh(stored_at, now):
+                        found[key] = json.loads(value)
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE entries SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        """Stores every {key: value} pair, then evicts if over capacity."""
+        if not items:
+            return
+
+        now = time.time()
+        rows = [(str(k), json.dumps(v), now, now) for k, v in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - self.max_entries + int(self.max_entries * _EVICT_SLACK)
+        self._conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            " SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+            (excess,),
+        )
+
+    def purge_expired(self):
+        """Deletes stale entries. Returns the number removed."""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM entries WHERE stored_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats_line(self, name="cache"):
+        total = self.hits + self.misses
+        ratio = (self.hits / total * 100) if total else 0.0
+        return f"{name}: {self.hits} hits, {self.misses} misses ({ratio:.1f}% hit rate)"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()